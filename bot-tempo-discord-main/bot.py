@@ -277,6 +277,7 @@ async def init_db():
         await db.execute("""CREATE TABLE IF NOT EXISTS total_times (
             user_id INTEGER, guild_id INTEGER, total_seconds INTEGER,
             PRIMARY KEY(user_id,guild_id) )""")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_total_times_guild_seconds ON total_times (guild_id, total_seconds DESC)")
         await db.execute("""CREATE TABLE IF NOT EXISTS log_channels (
             guild_id INTEGER, channel_type TEXT, channel_id INTEGER,
             PRIMARY KEY(guild_id,channel_type) )""")
@@ -870,12 +871,17 @@ async def update_call_cards():
 
 
 async def get_rank(user_id, guild_id):
+    # Conta quem está na frente usando o índice (guild_id, total_seconds) em vez de ler a guilda inteira
     async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT user_id FROM total_times WHERE guild_id=? ORDER BY total_seconds DESC", (guild_id,))
-        rows = await cur.fetchall()
-        for i, r in enumerate(rows, start=1):
-            if r[0] == user_id: return i
-        return None
+        cur = await db.execute("SELECT total_seconds FROM total_times WHERE user_id=? AND guild_id=?", (user_id, guild_id))
+        row = await cur.fetchone()
+        if not row: return None
+        seconds = int(row[0] or 0)
+        cur = await db.execute(
+            "SELECT (SELECT COUNT(*) FROM total_times WHERE guild_id=? AND total_seconds > ?) + "
+            "(SELECT COUNT(*) FROM total_times WHERE guild_id=? AND total_seconds = ? AND user_id < ?)",
+            (guild_id, seconds, guild_id, seconds, user_id))
+        return int((await cur.fetchone())[0]) + 1
 
 # ===================================================================================
 # COMANDOS DO BOT
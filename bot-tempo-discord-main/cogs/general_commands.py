@@ -1,15 +1,18 @@
 import discord
 from discord.ext import commands
-import asyncio
-import aiosqlite
+import traceback
 
 from core.database import (
-    total_time, current_session_time, get_rank, list_goals, has_awarded, get_last_week_ranking
+    get_user_stats, get_last_week_ranking, get_leaderboard, get_activity_leaderboard
 )
-from utils.helpers import fetch_avatar_bytes
-from utils.image_generator import gerar_stats_card, gerar_leaderboard_card
+from core.activity_rollup import last_days_window
+from core.outbound import reply
+from utils.helpers import now_epoch
+from utils.avatar_cache import avatar_cache
+from utils.image_generator import gerar_stats_card, renderizar_leaderboard
+from utils.render_pool import render
 from utils.views import RankingView
-from config import DB_PATH, BOT_PREFIX
+from config import BOT_PREFIX
 
 class GeneralCommands(commands.Cog):
     def __init__(self, bot):
@@ -20,45 +23,28 @@ class GeneralCommands(commands.Cog):
         """Mostra o cartão de estatísticas de tempo para um usuário."""
         user = user or ctx.author
         try:
-            total = await total_time(user.id, ctx.guild.id)
-            current = await current_session_time(user.id, ctx.guild.id)
-            rank = await get_rank(user.id, ctx.guild.id)
+            # Tempo, ranking e metas numa única ida ao banco
+            stats = await get_user_stats(user.id, ctx.guild.id)
+            total, current, rank, goals = stats['total'], stats['current'], stats['rank'], stats['goals']
 
-            # --- LÓGICA DE METAS ADICIONADA AQUI ---
-            goals_rows = await list_goals(ctx.guild.id)
-            goals = []
-            if goals_rows:
-                effective_time = total + current
-                for r in goals_rows:
-                    gid, gname, greq, _, _, _, _ = r
-                    awarded = await has_awarded(user.id, ctx.guild.id, gid)
-                    greq_i = int(greq or 0)
-                    prog = min(1.0, effective_time / greq_i) if greq_i > 0 else 0.0
-                    goals.append({'id': gid, 'name': gname, 'required': greq_i, 'awarded': bool(awarded), 'progress': prog})
-            
-            avatar_bytes = await fetch_avatar_bytes(str(user.display_avatar.url))
-            
-            loop = asyncio.get_running_loop()
-            buf = await loop.run_in_executor(None, gerar_stats_card,
-                user.display_name, total, current, avatar_bytes, rank, goals
-            )
-            await ctx.reply(file=discord.File(fp=buf, filename=f"tempo_{user.id}.png"), mention_author=True)
+            avatar_bytes = await avatar_cache.get_for(self.bot.http_session, user)
+            buf = await render(gerar_stats_card,
+                user.display_name, total, current, avatar_bytes, rank, goals)
+            await reply(ctx, file=discord.File(fp=buf, filename=f"tempo_{user.id}.png"), mention_author=True)
 
         except Exception as e:
-            await ctx.reply("❌ Erro ao gerar o cartão de tempo.", mention_author=True)
+            await reply(ctx, "❌ Erro ao gerar o cartão de tempo.", mention_author=True)
             print(f"Erro no !tempo: {e}")
             traceback.print_exc()
 
     @commands.command(name="top_tempo", aliases=['top_time', 'top_ranking', 'top'])
     async def top_tempo_cmd(self, ctx):
         """Exibe o ranking de tempo em chamada do servidor."""
-        # Conecta ao DB para buscar os dados do ranking
-        async with aiosqlite.connect(DB_PATH) as db:
-            cur = await db.execute("SELECT user_id, total_seconds FROM total_times WHERE guild_id=? ORDER BY total_seconds DESC", (ctx.guild.id,))
-            rows = await cur.fetchall()
+        # Busca os dados do ranking (já incluindo o tempo que ainda não foi gravado)
+        rows = await get_leaderboard(ctx.guild.id)
         
         if not rows:
-            await ctx.reply("Ainda não há ninguém no ranking.", mention_author=True)
+            await reply(ctx, "Ainda não há ninguém no ranking.", mention_author=True)
             return
         
         # Calcula o número total de páginas para a navegação
@@ -69,12 +55,34 @@ class GeneralCommands(commands.Cog):
             total_pages = 1 + (len(rows) - 9 + PER_PAGE - 1) // PER_PAGE
         
         # Gera a imagem da primeira página do ranking
-        loop = asyncio.get_running_loop()
-        buf = await loop.run_in_executor(None, gerar_leaderboard_card, rows, ctx.guild, 1)
+        buf = await renderizar_leaderboard(self.bot.http_session, rows, ctx.guild, 1)
         
         # Cria a View com os botões e a envia junto com a imagem
         view = RankingView(ctx=ctx, rows=rows, total_pages=total_pages)
-        message = await ctx.reply(f"🏆 **Ranking de Tempo em Chamada**", file=discord.File(fp=buf, filename="ranking_pagina_1.png"), view=view, mention_author=True)
+        message = await reply(ctx, f"🏆 **Ranking de Tempo em Chamada**", file=discord.File(fp=buf, filename="ranking_pagina_1.png"), view=view, mention_author=True)
+        view.message = message
+
+    @commands.command(name="top_periodo", aliases=['top_dias'])
+    async def top_period_cmd(self, ctx, dias: int = 7):
+        """Exibe o ranking de tempo em chamada dos últimos N dias (não é zerado pelo reset semanal)."""
+        dias = max(1, min(dias, 366))
+        start_ts, end_ts = last_days_window(dias, now_epoch())
+        rows = await get_activity_leaderboard(ctx.guild.id, start_ts, end_ts)
+
+        if not rows:
+            await reply(ctx, f"Ninguém ficou em call nos últimos {dias} dia(s).", mention_author=True)
+            return
+
+        PER_PAGE = 20
+        if len(rows) <= 9:
+            total_pages = 1
+        else:
+            total_pages = 1 + (len(rows) - 9 + PER_PAGE - 1) // PER_PAGE
+
+        buf = await renderizar_leaderboard(self.bot.http_session, rows, ctx.guild, 1)
+
+        view = RankingView(ctx=ctx, rows=rows, total_pages=total_pages)
+        message = await reply(ctx, f"🏆 **Ranking dos últimos {dias} dia(s)**", file=discord.File(fp=buf, filename="ranking_pagina_1.png"), view=view, mention_author=True)
         view.message = message
 
     @commands.command(name="ajuda")
@@ -87,7 +95,8 @@ class GeneralCommands(commands.Cog):
             name="--- 📊 Comandos Gerais ---",
             value=(
                 f"`{p}tempo [@usuário]` - Mostra seu cartão de estatísticas.\n"
-                f"`{p}top_tempo` - Exibe o ranking do servidor (use as setas para navegar)."
+                f"`{p}top_tempo` - Exibe o ranking do servidor (use as setas para navegar).\n"
+                f"`{p}top_periodo [dias]` - Ranking dos últimos dias (padrão: 7)."
             ),
             inline=False
         )
@@ -102,7 +111,7 @@ class GeneralCommands(commands.Cog):
         )
         
         embed.set_footer(text=f"Para ver os comandos de administrador, use {p}ajuda_adm")
-        await ctx.reply(embed=embed, mention_author=True)
+        await reply(ctx, embed=embed, mention_author=True)
 
     @commands.command(name="help")
     async def help_cmd(self, ctx):
@@ -117,13 +126,12 @@ class GeneralCommands(commands.Cog):
         rows = await get_last_week_ranking(ctx.guild.id)
         
         if not rows:
-            await ctx.reply("O ranking da semana passada ainda não está disponível.", mention_author=True)
+            await reply(ctx, "O ranking da semana passada ainda não está disponível.", mention_author=True)
             return
             
-        loop = asyncio.get_running_loop()
-        buf = await loop.run_in_executor(None, gerar_leaderboard_card, rows, ctx.guild, 1)
+        buf = await renderizar_leaderboard(self.bot.http_session, rows, ctx.guild, 1)
         
-        await ctx.reply(
+        await reply(ctx,
             content="🏆 **Ranking Semanal** 🏆",
             file=discord.File(fp=buf, filename="ranking_semanal_passado.png"),
             mention_author=True
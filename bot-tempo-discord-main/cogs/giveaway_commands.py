@@ -9,6 +9,7 @@ from core.database import (
     add_giveaway, remove_giveaway, add_giveaway_participant,
     get_giveaway_participants, get_finished_giveaways
 )
+from core.outbound import outbound, reply, send, PRIORITY_INTERACTIVE, PRIORITY_NOTIFY
 
 # Função para converter tempo como "10m", "1h", "2d" para um objeto timedelta
 def parse_duration(duration_str: str) -> timedelta:
@@ -52,8 +53,12 @@ class GiveawayView(discord.ui.View):
         embed = interaction.message.embeds[0]
         embed.set_field_at(1, name="Participantes", value=f"**{len(participants)}**", inline=True)
         
-        await interaction.message.edit(embed=embed)
+        # Responde primeiro (a interação expira em 3s); a edição do embed vai pela fila de saída,
+        # e vários cliques seguidos viram uma única edição com a contagem mais recente
         await interaction.response.send_message("✅ Você entrou no sorteio!", ephemeral=True)
+        message = interaction.message
+        await outbound.run(message.channel.id, lambda: message.edit(embed=embed),
+                           priority=PRIORITY_INTERACTIVE, coalesce_key=("edit", message.id))
 
 class GiveawayCommands(commands.Cog):
     def __init__(self, bot):
@@ -70,11 +75,11 @@ class GiveawayCommands(commands.Cog):
         try:
             delta = parse_duration(duration)
         except ValueError as e:
-            await ctx.reply(f"Erro no formato de tempo: {e}", mention_author=True)
+            await reply(ctx, f"Erro no formato de tempo: {e}", mention_author=True)
             return
 
         if winners < 1:
-            await ctx.reply("O número de vencedores deve ser pelo menos 1.", mention_author=True)
+            await reply(ctx, "O número de vencedores deve ser pelo menos 1.", mention_author=True)
             return
 
         # Separa o prêmio dos cargos
@@ -93,7 +98,7 @@ class GiveawayCommands(commands.Cog):
         
         prize = " ".join(prize_words)
         if not prize:
-            await ctx.reply("Você precisa especificar um prêmio para o sorteio.", mention_author=True)
+            await reply(ctx, "Você precisa especificar um prêmio para o sorteio.", mention_author=True)
             return
 
         end_time = datetime.now(timezone.utc) + delta
@@ -114,7 +119,7 @@ class GiveawayCommands(commands.Cog):
         embed.set_footer(text=f"Sorteio iniciado por {ctx.author.display_name}")
 
         view = GiveawayView(required_roles)
-        giveaway_message = await ctx.send(embed=embed, view=view)
+        giveaway_message = await send(ctx, embed=embed, view=view)
 
         await add_giveaway(giveaway_message.id, ctx.guild.id, ctx.channel.id, end_time, winners, prize, required_roles_csv)
         # Apaga o comando original para manter o chat limpo
@@ -124,7 +129,7 @@ class GiveawayCommands(commands.Cog):
     async def giveaway_end_checker(self):
         finished_giveaways = await get_finished_giveaways()
         for g in finished_giveaways:
-            message_id, guild_id, channel_id, end_time_str, winner_count, prize, roles_csv = g
+            message_id, guild_id, channel_id, end_ts, winner_count, prize, roles_csv = g
             
             guild = self.bot.get_guild(guild_id)
             if not guild:
@@ -151,10 +156,9 @@ class GiveawayCommands(commands.Cog):
                 winners = [f"<@{user_id}>" for user_id in winner_ids]
 
             # Edita a mensagem original do sorteio
-            end_time_obj = datetime.fromisoformat(end_time_str)
             embed = message.embeds[0]
             embed.color = discord.Color.dark_red()
-            embed.description = f"Sorteio finalizado em <t:{int(end_time_obj.timestamp())}:f>"
+            embed.description = f"Sorteio finalizado em <t:{int(end_ts)}:f>"
             
             if not winners:
                 result_description = "Não houve participantes suficientes!"
@@ -169,10 +173,15 @@ class GiveawayCommands(commands.Cog):
             if entry_button:
                 entry_button.disabled = True
             
-            await message.edit(embed=embed, view=view)
+            # Chave própria: uma contagem de participantes atrasada nunca substitui o resultado
+            # (uma contagem ainda na fila é mais urgente e sai antes desta edição)
+            await outbound.run(channel.id, lambda: message.edit(embed=embed, view=view),
+                               priority=PRIORITY_NOTIFY, coalesce_key=("end", message.id))
 
             # Envia uma nova mensagem anunciando os vencedores
-            await message.reply(f"🎉 O sorteio de **{prize}** acabou! Parabéns {', '.join(winners)}!")
+            await outbound.run(channel.id,
+                lambda: message.reply(f"🎉 O sorteio de **{prize}** acabou! Parabéns {', '.join(winners)}!"),
+                priority=PRIORITY_NOTIFY)
 
             # Remove o sorteio do banco de dados de "ativos"
             await remove_giveaway(message_id)
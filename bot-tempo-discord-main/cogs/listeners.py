@@ -5,85 +5,115 @@ from discord.ext import commands, tasks
 import asyncio
 import traceback
 
-from config import CALLCARD_UPDATE_INTERVAL
+from config import (
+    CALLCARD_UPDATE_INTERVAL, CALLCARD_MAX_CONCURRENCY, CALLCARD_GUILD_CONCURRENCY,
+    CALLCARD_TICK_TIMEOUT, CALLCARD_TIME_STEP, CALLCARD_PROGRESS_STEP, VOICE_EVENT_COALESCE_MS
+)
 from core.database import (
-    start_session, end_session, get_log_channel, total_time,
-    current_session_time, get_rank, list_goals, has_awarded
+    get_log_channel, total_time, get_rank, get_user_stats,
+    get_call_cards, save_call_card, delete_call_cards, list_excluded_voice_channels
 )
-from core.logic import check_and_award_goals_for_user
-from utils.helpers import fetch_avatar_bytes, fmt_hms, now_iso_utc
+from core.outbound import outbound, PRIORITY_NOTIFY, PRIORITY_BACKGROUND
+from core.voice_coalescer import VoiceEventCoalescer
+from core.voice_accounting import voice_accountant, voice_slot
+from core.card_state import CardStateTracker
+from core.logic import check_and_award_goals_for_user, check_and_award_goals_for_guild
+from utils.helpers import fmt_hms, now_epoch
+from utils.avatar_cache import avatar_cache
 from utils.image_generator import gerar_stats_card
+from utils.render_pool import render
 
 class Listeners(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # guild_id -> {user_id: (channel_id, message_id)}; espelho da tabela call_card_messages,
+        # carregado por guilda no primeiro uso. As mensagens são usadas como PartialMessage (sem fetch)
         self.active_call_messages = {}
+        # Junta as mudanças rápidas de estado de voz de cada membro e processa só o estado final
+        self.voice_events = VoiceEventCoalescer(VOICE_EVENT_COALESCE_MS, self._apply_voice_transition)
+        # Limite global de cards sendo atualizados ao mesmo tempo (todas as guildas juntas)
+        self._card_slots = asyncio.Semaphore(CALLCARD_MAX_CONCURRENCY)
+        # Lembra o que cada card mostra para não redesenhar cards que não mudaram
+        self.card_states = CardStateTracker(CALLCARD_TIME_STEP, CALLCARD_PROGRESS_STEP)
         self.update_call_cards.start()
 
-    def cog_unload(self):
+    async def cog_unload(self):
         self.update_call_cards.cancel()
+        # Não perde as entradas/saídas que ainda estavam na janela
+        await self.voice_events.flush()
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
         if member.bot:
             return
 
-        guild = member.guild
-        now = now_iso_utc()
+        # (canal, conta tempo): surdo, canal AFK e canais excluídos não contam
+        excluded = await list_excluded_voice_channels(member.guild.id)
+        before_slot = voice_slot(before, member.guild, excluded)
+        after_slot = voice_slot(after, member.guild, excluded)
+        # Stream, câmera etc. não mudam nada na contagem
+        if before_slot == after_slot:
+            return
 
-        is_join = before.channel is None and after.channel is not None
-        is_leave = before.channel is not None and after.channel is None
-        is_switch = before.channel is not None and after.channel is not None and before.channel.id != after.channel.id
+        self.voice_events.submit((member.guild.id, member.id), before_slot, after_slot, now_epoch(), member)
+
+    async def _apply_voice_transition(self, key, before, after, now, member):
+        """Aplica o resultado de um lote de eventos de voz: do estado inicial ao estado final."""
+        guild = member.guild
+        before_id, after_id = before[0], after[0]
 
         try:
-            if is_leave or is_switch:
-                start_iso = await end_session(member.id, guild.id, now)
-                
+            # Fecha/abre os segmentos creditados (só memória)
+            tally = await voice_accountant.apply(guild.id, member.id, before, after, now)
+
+            if tally is not None:
                 # --- CORREÇÃO 2: Verificação de metas ao sair ---
                 await check_and_award_goals_for_user(self.bot, member.id, guild.id)
 
-                if start_iso:
-                    duration = 0
-                    try:
-                        duration = int((datetime.fromisoformat(now.replace('Z', '+00:00')) - datetime.fromisoformat(start_iso.replace('Z', '+00:00'))).total_seconds())
-                    except:
-                        pass
-                    total_after = await total_time(member.id, guild.id)
-                    await self._mark_user_exit_and_cleanup(guild, member, duration, total_after)
-
-            if is_join or is_switch:
-                await start_session(member.id, guild.id, after.channel.id, now)
+                total_after = await total_time(member.id, guild.id)
+                await self._mark_user_exit_and_cleanup(guild, member, tally.credited, total_after, tally.idle)
+
+            if before_id is None and after_id is not None:
                 await self._ensure_user_call_message(member)
 
         except Exception as e:
             print(f"!!! ERRO em on_voice_state_update: {e}")
             traceback.print_exc()
 
+    async def _call_cards(self, guild):
+        """Registro de cards de chamada da guilda, lido do banco só na primeira vez."""
+        gmap = self.active_call_messages.get(guild.id)
+        if gmap is None:
+            gmap = self.active_call_messages.setdefault(guild.id, await get_call_cards(guild.id))
+        return gmap
+
+    @staticmethod
+    def _card_message(guild, ref):
+        """Transforma (channel_id, message_id) numa PartialMessage, sem nenhuma chamada à API."""
+        if not ref:
+            return None
+        channel = guild.get_channel_or_thread(ref[0])
+        return channel.get_partial_message(ref[1]) if channel else None
+
     async def _ensure_user_call_message(self, user: discord.Member):
         guild = user.guild
-        gmap = self.active_call_messages.setdefault(guild.id, {})
-        existing = gmap.get(user.id)
+        gmap = await self._call_cards(guild)
+        ref = gmap.get(user.id)
+        existing = self._card_message(guild, ref)
 
         try:
-            total = await total_time(user.id, guild.id)
-            current = await current_session_time(user.id, guild.id)
-            rank = await get_rank(user.id, guild.id)
-
-            # --- CORREÇÃO 1: Lógica de metas para o card ---
-            goals_rows = await list_goals(guild.id)
-            goals = []
-            if goals_rows:
-                effective_time = total + current
-                for r in goals_rows:
-                    gid, gname, greq, _, _, _, _ = r
-                    awarded = await has_awarded(user.id, guild.id, gid)
-                    greq_i = int(greq or 0)
-                    prog = min(1.0, effective_time / greq_i) if greq_i > 0 else 0.0
-                    goals.append({'id': gid, 'name': gname, 'required': greq_i, 'awarded': bool(awarded), 'progress': prog})
-
-            avatar_bytes = await fetch_avatar_bytes(str(user.display_avatar.url))
-            loop = asyncio.get_running_loop()
-            buf = await loop.run_in_executor(None, gerar_stats_card,
+            # Tempo, ranking e metas do card numa única ida ao banco
+            stats = await get_user_stats(user.id, guild.id)
+            total, current, rank, goals = stats['total'], stats['current'], stats['rank'], stats['goals']
+
+            # Se nada visível mudou desde o último envio, não redesenha nem reenvia o card
+            card_key = (guild.id, user.id)
+            signature = self.card_states.signature(user.display_name, str(user.display_avatar.url), stats)
+            if existing and self.card_states.is_current(card_key, signature):
+                return
+
+            avatar_bytes = await avatar_cache.get_for(self.bot.http_session, user)
+            buf = await render(gerar_stats_card,
                 user.display_name, total, current, avatar_bytes, rank, goals)
 
             ch_id = await get_log_channel(guild.id, "calllog")
@@ -92,35 +122,69 @@ class Listeners(commands.Cog):
             if not ch: return
 
             if existing:
+                async def edit_card():
+                    # O membro saiu enquanto a edição esperava na fila: não cobre o card de saída
+                    if gmap.get(user.id) != ref:
+                        return None
+                    return await existing.edit(attachments=[discord.File(fp=buf, filename="stats.png")])
+
                 try:
-                    await existing.edit(attachments=[discord.File(fp=buf, filename="stats.png")])
+                    # Edições do mesmo card ainda na fila viram uma só
+                    await outbound.run(existing.channel.id, edit_card,
+                        priority=PRIORITY_BACKGROUND, coalesce_key=("edit", existing.id))
+                    self.card_states.mark(card_key, signature)
                 except discord.NotFound:
+                    # A mensagem foi apagada: esquece o registro e manda um card novo
                     gmap.pop(user.id, None)
+                    await delete_call_cards(guild.id, [user.id])
                     await self._ensure_user_call_message(user)
             else:
                 content = f"👋 **{user.display_name}** entrou na chamada."
-                newmsg = await ch.send(content=content, file=discord.File(fp=buf, filename="stats.png"))
-                self.active_call_messages[guild.id][user.id] = newmsg
+
+                async def send_and_register():
+                    try:
+                        newmsg = await outbound.run(ch.id,
+                            lambda: ch.send(content=content, file=discord.File(fp=buf, filename="stats.png")),
+                            priority=PRIORITY_BACKGROUND)
+                        gmap[user.id] = (ch.id, newmsg.id)
+                        self.card_states.mark(card_key, signature)
+                        await save_call_card(guild.id, user.id, ch.id, newmsg.id)
+                    except Exception as e:
+                        print(f"Erro ao enviar o card de chamada de {user.id}: {e}")
+                        traceback.print_exc()
+
+                # Envio e registro são uma unidade só: se o tempo da rodada acabar no meio,
+                # a mensagem enviada ainda é registrada (senão a próxima rodada mandaria um card duplicado)
+                await asyncio.shield(send_and_register())
 
         except Exception as e:
             print(f"Erro em _ensure_user_call_message: {e}")
             traceback.print_exc()
 
-    async def _mark_user_exit_and_cleanup(self, guild, user, duration_seconds, total_after):
-        gmap = self.active_call_messages.get(guild.id, {})
-        msgobj = gmap.pop(user.id, None)
+    async def _mark_user_exit_and_cleanup(self, guild, user, duration_seconds, total_after, idle_seconds=0):
+        gmap = await self._call_cards(guild)
+        ref = gmap.pop(user.id, None)
+        self.card_states.forget((guild.id, user.id))
+        if not ref: return
+        await delete_call_cards(guild.id, [user.id])
+        msgobj = self._card_message(guild, ref)
         if not msgobj: return
         
         try:
             rank = await get_rank(user.id, guild.id)
-            avatar_bytes = await fetch_avatar_bytes(str(user.display_avatar.url))
+            avatar_bytes = await avatar_cache.get_for(self.bot.http_session, user)
 
-            loop = asyncio.get_running_loop()
-            buf = await loop.run_in_executor(None, gerar_stats_card,
+            buf = await render(gerar_stats_card,
                 user.display_name, total_after, 0, avatar_bytes, rank, []) # Mostra card zerado ao sair
 
             content = f"⏱️ **{user.display_name}** saiu — Duração: **{fmt_hms(duration_seconds)}**"
-            await msgobj.edit(content=content, attachments=[discord.File(fp=buf, filename="exit.png")])
+            if idle_seconds:
+                content += f" (+{fmt_hms(idle_seconds)} sem contar)"
+            # Chave própria: o card de saída nunca é substituído por um refresh (que, se ainda estiver
+            # na fila, vê que o card saiu do registro e não edita nada)
+            await outbound.run(msgobj.channel.id,
+                lambda: msgobj.edit(content=content, attachments=[discord.File(fp=buf, filename="exit.png")]),
+                priority=PRIORITY_NOTIFY, coalesce_key=("exit", msgobj.id))
         except Exception as e:
             print(f"Erro em _mark_user_exit_and_cleanup: {e}")
             traceback.print_exc()
@@ -129,28 +193,49 @@ class Listeners(commands.Cog):
     async def update_call_cards(self):
         await self.bot.wait_until_ready()
         try:
-            for guild in self.bot.guilds:
-                call_log_id = await get_log_channel(guild.id, "calllog")
-                if not call_log_id: continue
-                
-                current_voice_ids = {m.id for vc in guild.voice_channels for m in vc.members if not m.bot}
-                for user_id in current_voice_ids:
-                    member = guild.get_member(user_id)
-                    if member:
-                        # A verificação periódica de metas já acontece aqui
-                        await check_and_award_goals_for_user(self.bot, user_id, guild.id)
-                        await self._ensure_user_call_message(member)
-                
-                guild_map = self.active_call_messages.get(guild.id, {})
-                stale_ids = set(guild_map.keys()) - current_voice_ids
-                for uid in stale_ids:
-                    msgobj = guild_map.pop(uid, None)
-                    if msgobj:
-                        try: await msgobj.delete()
-                        except: pass
+            # Todas as guildas são atualizadas em paralelo, e a rodada inteira tem um tempo máximo:
+            # uma guilda enorme não atrasa as outras, e o que não terminar a tempo fica para a próxima rodada
+            await asyncio.wait_for(
+                asyncio.gather(*(self._refresh_guild_cards(guild) for guild in self.bot.guilds)),
+                timeout=CALLCARD_TICK_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"[callcards] A rodada de atualização passou de {CALLCARD_TICK_TIMEOUT:.0f}s; o restante fica para a próxima.")
         except Exception as e:
             print(f"Erro no loop de update_call_cards: {e}")
             traceback.print_exc()
 
+    async def _refresh_guild_cards(self, guild):
+        """Atualiza os cards de chamada de uma guilda, com no máximo CALLCARD_GUILD_CONCURRENCY ao mesmo tempo."""
+        try:
+            call_log_id = await get_log_channel(guild.id, "calllog")
+            if not call_log_id: return
+
+            current_voice_ids = {m.id for vc in guild.voice_channels for m in vc.members if not m.bot}
+            # A verificação periódica de metas de quem está em call é feita em lote, numa única consulta
+            if current_voice_ids:
+                await check_and_award_goals_for_guild(self.bot, guild.id, current_voice_ids)
+
+            guild_slots = asyncio.Semaphore(CALLCARD_GUILD_CONCURRENCY)
+            async def refresh(member):
+                # Primeiro a vaga da guilda, depois a global: quem espera a global já está na vez da sua guilda
+                async with guild_slots, self._card_slots:
+                    await self._ensure_user_call_message(member)
+
+            members = [m for m in map(guild.get_member, current_voice_ids) if m]
+            await asyncio.gather(*(refresh(member) for member in members))
+
+            guild_map = await self._call_cards(guild)
+            stale_ids = set(guild_map.keys()) - current_voice_ids
+            for uid in stale_ids:
+                msgobj = self._card_message(guild, guild_map.pop(uid, None))
+                self.card_states.forget((guild.id, uid))
+                if msgobj:
+                    try: await outbound.run(msgobj.channel.id, msgobj.delete, priority=PRIORITY_BACKGROUND)
+                    except: pass
+            await delete_call_cards(guild.id, stale_ids)
+        except Exception as e:
+            print(f"Erro ao atualizar os cards da guilda {guild.id}: {e}")
+            traceback.print_exc()
+
 async def setup(bot):
     await bot.add_cog(Listeners(bot))
\ No newline at end of file
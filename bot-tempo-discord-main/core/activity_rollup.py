@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from config import LOCAL_TZ
+
+# Tabelas de atividade por período: (tabela, coluna do início do período)
+HOURLY = ("voice_activity_hourly", "hour_start")
+DAILY = ("voice_activity_daily", "day_start")
+WEEKLY = ("voice_activity_weekly", "week_start")
+
+def split_hours(start_ts: int, end_ts: int):
+    """Divide o intervalo [start_ts, end_ts) em pedaços por hora cheia: [(hour_start, segundos), ...]."""
+    pieces = []
+    cursor = int(start_ts)
+    end_ts = int(end_ts)
+    while cursor < end_ts:
+        hour_start = cursor - cursor % 3600
+        piece_end = min(end_ts, hour_start + 3600)
+        pieces.append((hour_start, piece_end - cursor))
+        cursor = piece_end
+    return pieces
+
+@lru_cache(maxsize=4096)
+def day_start(ts: int) -> int:
+    """Epoch da meia-noite (fuso local) do dia de 'ts'."""
+    local = datetime.fromtimestamp(ts, LOCAL_TZ)
+    return int(local.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+@lru_cache(maxsize=1024)
+def week_start(ts: int) -> int:
+    """Epoch da meia-noite (fuso local) da segunda-feira da semana de 'ts'."""
+    local = datetime.fromtimestamp(day_start(ts), LOCAL_TZ)
+    return int((local - timedelta(days=local.weekday())).timestamp())
+
+def last_days_window(days: int, now: int):
+    """Janela [início, fim) dos últimos 'days' dias locais, contando o dia de hoje inteiro."""
+    today = datetime.fromtimestamp(day_start(now), LOCAL_TZ)
+    start = today - timedelta(days=days - 1)
+    end = today + timedelta(days=1)
+    return int(start.timestamp()), int(end.timestamp())
+
+def rollup(hourly: dict):
+    """
+    A partir de {(guild_id, user_id, channel_id, hour_start): segundos}, monta as linhas
+    (guild_id, user_id, channel_id, início, segundos) das três tabelas: por hora, por dia e por semana.
+    """
+    daily, weekly = {}, {}
+    for (guild_id, user_id, channel_id, hour_start), seconds in hourly.items():
+        day_key = (guild_id, user_id, channel_id, day_start(hour_start))
+        daily[day_key] = daily.get(day_key, 0) + seconds
+        week_key = (guild_id, user_id, channel_id, week_start(hour_start))
+        weekly[week_key] = weekly.get(week_key, 0) + seconds
+    as_rows = lambda buckets: [(*key, seconds) for key, seconds in buckets.items()]
+    return as_rows(hourly), as_rows(daily), as_rows(weekly)
+
+def table_for_window(start_ts: int, end_ts: int):
+    """Escolhe a tabela mais grossa cujos períodos cabem exatamente em [start_ts, end_ts)."""
+    if week_start(start_ts) == start_ts and week_start(end_ts) == end_ts:
+        return WEEKLY
+    if day_start(start_ts) == start_ts and day_start(end_ts) == end_ts:
+        return DAILY
+    return HOURLY
@@ -1,11 +1,15 @@
 import discord
 from discord.ext import commands
 import os
+import asyncio
 import traceback
 
 from config import TOKEN, BOT_PREFIX
-from core.database import init_db, is_channel_prohibited
+from core.database import is_channel_prohibited
 from core.scheduler import weekly_reset_scheduler
+from core.reconcile import reconcile_all_guilds
+from core.outbound import reply
+from utils.helpers import now_epoch
 
 class BotInitializer:
     """
@@ -23,23 +27,61 @@ class BotInitializer:
             help_command=None # Desativa o comando de ajuda padrão para usarmos o nosso
         )
         
-        # Anexa a sessão HTTP e o dicionário de mensagens ao bot para acesso em outros módulos
+        # Anexa a sessão HTTP ao bot para acesso em outros módulos
         self.bot.http_session = http_session
-        self.bot.active_call_messages = {}
+
+        # A reconciliação das sessões com o estado real das calls roda no primeiro on_ready (contra o heartbeat)
+        # e depois de cada reconexão (contra o momento em que a conexão caiu)
+        self._sessions_reconciled = False
+        # Epoch da primeira queda desde a última ressincronização (None = conectado e em dia)
+        self._disconnected_at = None
+        self._resync_lock = asyncio.Lock()
 
         # Chama o método que adiciona todos os eventos
         self._add_events()
 
+    async def _resync_after_gap(self, cut: bool):
+        """
+        Depois de uma reconexão, compara as sessões com quem está em call agora.
+        Num RESUME o Discord reenvia os eventos perdidos: só quem está diferente do registrado muda
+        (quem saiu tem a sessão fechada no momento da queda). Numa sessão nova do gateway ('cut'),
+        os eventos do intervalo se perderam: as sessões são cortadas no momento da queda e reabertas
+        agora para quem continua em call, e o tempo sem conexão não conta.
+        """
+        async with self._resync_lock:
+            if self._disconnected_at is None:
+                return
+            closed_at, self._disconnected_at = self._disconnected_at, None
+            print(f"[reconcile] Reconectado; ressincronizando as calls desde {closed_at}.")
+            await reconcile_all_guilds(self.bot, closed_at, cut)
+
     def _add_events(self):
         """Adiciona os handlers de eventos e verificadores globais ao bot."""
         @self.bot.event
         async def on_ready():
-            # Esta função é chamada uma vez quando o bot está online e pronto.
-            await init_db() # Garante que o banco de dados e as tabelas existam
+            # Esta função é chamada quando o bot está online e pronto.
+            # O esquema do banco já foi migrado em main.py, antes de conectar.
             print(f"{self.bot.user} está online!")
-            # Inicia o agendador de reset semanal em background
+            if self._sessions_reconciled:
+                # on_ready de novo = sessão nova do gateway depois de uma queda; o cache foi refeito
+                await self._resync_after_gap(cut=True)
+                return
+            # Fecha as sessões de quem saiu da call enquanto o bot estava fora e abre as de quem já estava em call
+            self._sessions_reconciled = True
+            await reconcile_all_guilds(self.bot)
+            # Inicia o agendador de reset semanal em background (uma vez só, mesmo com novos on_ready)
             self.bot.loop.create_task(weekly_reset_scheduler(self.bot))
 
+        @self.bot.event
+        async def on_disconnect():
+            # Guarda a primeira queda; os eventos de voz a partir daqui podem se perder
+            if self._sessions_reconciled and self._disconnected_at is None:
+                self._disconnected_at = now_epoch()
+
+        @self.bot.event
+        async def on_resumed():
+            await self._resync_after_gap(cut=False)
+
         @self.bot.event
         async def on_message(message: discord.Message):
             # Esta função é chamada para cada mensagem que o bot pode ver.
@@ -73,10 +115,10 @@ class BotInitializer:
         async def on_command_error(ctx, error):
             """Handler global que captura e trata erros de comandos."""
             if isinstance(error, commands.CheckFailure):
-                try: await ctx.reply("❌ Comandos estão proibidos neste canal.", mention_author=True, delete_after=10)
+                try: await reply(ctx, "❌ Comandos estão proibidos neste canal.", mention_author=True, delete_after=10)
                 except discord.HTTPException: pass
             elif isinstance(error, commands.MissingPermissions):
-                try: await ctx.reply("Você não tem permissão para usar este comando.", mention_author=True)
+                try: await reply(ctx, "Você não tem permissão para usar este comando.", mention_author=True)
                 except discord.HTTPException: pass
             elif isinstance(error, commands.CommandNotFound):
                 pass # Ignora silenciosamente comandos que não existem.
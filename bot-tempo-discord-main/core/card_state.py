@@ -0,0 +1,33 @@
+class CardStateTracker:
+    """
+    Guarda, por card de chamada, um resumo do que foi desenhado da última vez
+    (nome, avatar, rank, tempo total arredondado, próxima meta e % de progresso).
+    Um card só é redesenhado e reenviado quando esse resumo muda, ou seja, quando algum
+    campo visível passa de um degrau de 'time_step' segundos ou 'progress_step' pontos percentuais.
+    O tempo da sessão atual fica de fora: ele muda a cada rodada e, sozinho, não justifica um novo envio.
+    """
+    def __init__(self, time_step: int, progress_step: int):
+        self.time_step = max(1, int(time_step))
+        self.progress_step = max(1, int(progress_step))
+        # (guild_id, user_id) -> último resumo desenhado
+        self._rendered = {}
+
+    def signature(self, display_name, avatar_url, stats):
+        """Resumo dos campos visíveis de um card a partir do retorno de get_user_stats."""
+        next_goal = next((g for g in stats['goals'] if not g['awarded']), None)
+        goal_part = None
+        if next_goal:
+            goal_part = (next_goal['id'], next_goal['name'], next_goal['required'],
+                         int(next_goal['progress'] * 100) // self.progress_step)
+        return (display_name, avatar_url, stats['rank'], stats['total'] // self.time_step, goal_part)
+
+    def is_current(self, key, signature):
+        """True se o card já mostra exatamente este resumo (pode pular o render)."""
+        return self._rendered.get(key) == signature
+
+    def mark(self, key, signature):
+        """Registra o resumo de um card que acabou de ser desenhado e enviado."""
+        self._rendered[key] = signature
+
+    def forget(self, key):
+        self._rendered.pop(key, None)
@@ -1,274 +1,443 @@
-import aiosqlite
-from datetime import datetime, timezone, timedelta
-
-# Importa o caminho do banco de dados do nosso arquivo de configuração
-from config import DB_PATH
-# Importa a função helper para obter o tempo atual em UTC
-from utils.helpers import now_iso_utc
+from datetime import datetime
+
+# Importa o pool de conexões persistentes compartilhado por todas as funções
+from .db_pool import db_pool
+# Fila write-behind das sessões de voz
+from .write_behind import session_journal
+# Sessões de voz ativas mantidas em memória (fonte da verdade; o banco recebe checkpoints)
+from .session_store import session_store
+# Ranking em memória por guilda
+from .rank_engine import rank_engine
+# Cache em memória da configuração de cada guilda
+from .guild_config import GuildConfig, guild_config_cache
+from config import RANK_IN_MEMORY
+# Funções de data: o banco guarda epoch INTEGER; to_epoch/from_epoch ficam disponíveis
+# aqui como camada de compatibilidade para quem ainda passa datetime ou ISO
+from utils.helpers import now_epoch, to_epoch, from_epoch
+# Migrações versionadas do esquema
+from .migrations import apply_migrations
+# Tabelas de atividade por hora/dia/semana
+from .activity_rollup import table_for_window
 
 async def init_db():
-    """Cria todas as tabelas do banco de dados se elas ainda não existirem."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Tabela para rastrear sessões de voz ativas
-        await db.execute("""CREATE TABLE IF NOT EXISTS sessions (
-            user_id INTEGER, guild_id INTEGER, channel_id INTEGER, start_time TEXT,
-            PRIMARY KEY(user_id,guild_id) )""")
-        # Tabela para armazenar o tempo total acumulado de cada usuário
-        await db.execute("""CREATE TABLE IF NOT EXISTS total_times (
-            user_id INTEGER, guild_id INTEGER, total_seconds INTEGER,
-            PRIMARY KEY(user_id,guild_id) )""")
-        # Tabela para configurar canais de log (ex: logs de chamada, logs de metas)
-        await db.execute("""CREATE TABLE IF NOT EXISTS log_channels (
-            guild_id INTEGER, channel_type TEXT, channel_id INTEGER,
-            PRIMARY KEY(guild_id,channel_type) )""")
-        # Tabela para definir as metas do servidor
-        await db.execute("""CREATE TABLE IF NOT EXISTS goals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER, name TEXT, 
-            seconds_required INTEGER, role_id INTEGER, required_role_id INTEGER, 
-            reset_on_weekly INTEGER DEFAULT 1, required_role_ids TEXT )""")
-        # Tabela para registrar quais usuários já receberam a recompensa de cada meta
-        await db.execute("""CREATE TABLE IF NOT EXISTS awarded_goals (
-            user_id INTEGER, guild_id INTEGER, goal_id INTEGER, awarded_at TEXT,
-            PRIMARY KEY(user_id,guild_id,goal_id) )""")
-        # Tabela para a configuração do reset semanal de tempo
-        await db.execute("""CREATE TABLE IF NOT EXISTS weekly_reset_config (
-            guild_id INTEGER PRIMARY KEY, weekday INTEGER, hour INTEGER, minute INTEGER )""")
-        # Tabela para guardar o estado do último reset
-        await db.execute("""CREATE TABLE IF NOT EXISTS reset_state (
-            guild_id INTEGER PRIMARY KEY, last_reset TEXT )""")
-        # Tabela para listar canais onde os comandos do bot são proibidos
-        await db.execute("""CREATE TABLE IF NOT EXISTS prohibited_channels (
-            guild_id INTEGER, channel_id INTEGER, PRIMARY KEY(guild_id, channel_id) )""")
-        # Tabela para armazenar o histórico semanal de tempo 
-        await db.execute("""CREATE TABLE IF NOT EXISTS weekly_time_history (
-            guild_id INTEGER, user_id INTEGER, total_seconds INTEGER, reset_date TEXT, pinned INTEGER DEFAULT 0, PRIMARY KEY(guild_id, user_id, reset_date))""")
-        # Tabela para configurar canais de log de metas e retenção de histórico
-        await db.execute("""CREATE TABLE IF NOT EXISTS history_config (
-            guild_id INTEGER PRIMARY KEY, post_channel_id INTEGER, retention_days INTEGER DEFAULT 90)""")
-        # Tabela para armazenar os sorteios ativos
-        await db.execute("""CREATE TABLE IF NOT EXISTS giveaways (
-            message_id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL, channel_id INTEGER NOT NULL, end_time TEXT NOT NULL, winner_count INTEGER NOT NULL,
-            prize TEXT,required_roles TEXT)""")
-        # Tabela para armazenar os participantes de cada sorteio
-        await db.execute("""CREATE TABLE IF NOT EXISTS giveaway_participants (
-            message_id INTEGER, user_id INTEGER, PRIMARY KEY (message_id, user_id))""")
-        await db.commit()
-        #tabela de histórico
-        await db.execute("""CREATE TABLE IF NOT EXISTS weekly_time_history (
-            guild_id INTEGER, user_id INTEGER, total_seconds INTEGER, PRIMARY KEY(guild_id, user_id))""")
-        # Tenta adicionar uma nova coluna à tabela 'goals' para compatibilidade com versões antigas.
-        # Se a coluna já existir, a exceção será ignorada.
-        try:
-            await db.execute("ALTER TABLE goals ADD COLUMN required_role_ids TEXT")
-            await db.commit()
-        except:
-            pass
-
-async def start_session(user_id, guild_id, channel_id, start_time_iso):
-    """Inicia uma nova sessão de voz para um usuário."""
-    print(f"[DEBUG-TEMPO] start_session chamada para user: {user_id}") # DEBUG
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("INSERT OR REPLACE INTO sessions (user_id, guild_id, channel_id, start_time) VALUES (?, ?, ?, ?)",
-                         (user_id, guild_id, channel_id, start_time_iso))
-        await db.commit()
-    print(f"[DEBUG-TEMPO] Sessão para user {user_id} inserida no banco de dados.")
+    """Garante que o esquema do banco esteja na versão atual. Se já estiver, nenhum DDL é executado."""
+    async with db_pool.acquire() as db:
+        await apply_migrations(db, db_pool.dialect)
+
+async def start_session(user_id, guild_id, channel_id, start_time):
+    """Inicia uma nova sessão de voz para um usuário. 'start_time' é epoch (ISO/datetime também são aceitos)."""
+    # A sessão vive em memória; o journal grava o checkpoint em lote
+    start_ts = to_epoch(start_time)
+    session_store.start(user_id, guild_id, channel_id, start_ts)
+    session_journal.record_event(guild_id, user_id, channel_id, "join", start_ts)
+
+async def end_session(user_id, guild_id, end_time):
+    """Finaliza uma sessão, calcula a duração e a adiciona ao tempo total do usuário. Retorna o início (epoch)."""
+    session = session_store.end(user_id, guild_id)
+    if not session:
+        return None
 
-async def end_session(user_id, guild_id, end_time_iso):
-    """Finaliza uma sessão, calcula a duração e a adiciona ao tempo total do usuário."""
-    start_iso = None
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT start_time FROM sessions WHERE user_id=? AND guild_id=?", (user_id, guild_id))
-        row = await cur.fetchone()
-        if not row:
-            return None
-        
-        start_iso = row[0]
-        try:
-            # CORREÇÃO: Garante que a data/hora seja lida corretamente
-            start_dt = datetime.fromisoformat(start_iso.replace('Z', '+00:00'))
-            end_dt = datetime.fromisoformat(end_time_iso.replace('Z', '+00:00'))
-            duration = int((end_dt - start_dt).total_seconds())
-
-            if duration > 0:
-                # Busca o tempo total atual
-                cur2 = await db.execute("SELECT total_seconds FROM total_times WHERE user_id=? AND guild_id=?", (user_id, guild_id))
-                total_row = await cur2.fetchone()
-                current_total = total_row[0] if total_row else 0
-                
-                # Soma o novo tempo e salva
-                new_total = current_total + duration
-                await db.execute("INSERT OR REPLACE INTO total_times (user_id, guild_id, total_seconds) VALUES (?, ?, ?)",
-                                 (user_id, guild_id, new_total))
-        except (ValueError, TypeError) as e:
-            # Se houver um erro no cálculo, pelo menos não perdemos a sessão
-            print(f"AVISO: Não foi possível calcular a duração da sessão para {user_id}. Erro: {e}")
-
-        # Remove a sessão ativa, pois ela já foi processada
-        await db.execute("DELETE FROM sessions WHERE user_id=? AND guild_id=?", (user_id, guild_id))
-        await db.commit()
-            
-    return start_iso
+    start_ts = session[1]
+    duration = 0
+    try:
+        duration = to_epoch(end_time) - int(start_ts)
+    except (ValueError, TypeError) as e:
+        # Se houver um erro no cálculo, pelo menos não perdemos a sessão
+        print(f"AVISO: Não foi possível calcular a duração da sessão para {user_id}. Erro: {e}")
+
+    # Soma a duração ao total (gravada no próximo lote do journal, junto com a remoção da sessão)
+    session_journal.record_end(user_id, guild_id, duration)
+    session_journal.record_event(guild_id, user_id, session[0], "leave", int(start_ts) + duration, int(start_ts))
+    if duration > 0:
+        session_journal.record_activity(user_id, guild_id, session[0], int(start_ts), int(start_ts) + duration)
+    rank_engine.apply_delta(guild_id, user_id, duration)
+    return start_ts
 
 async def total_time(user_id, guild_id):
     """Retorna o tempo total acumulado de um usuário."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT total_seconds FROM total_times WHERE user_id=? AND guild_id=?", (user_id, guild_id))
-        row = await cur.fetchone()
-        return int(row[0]) if row else 0
+    if RANK_IN_MEMORY:
+        # Com o ranking da guilda carregado, o total já está em memória (atualizado a cada end_session)
+        index = rank_engine.get(guild_id)
+        if index is not None:
+            return index.total(user_id)
+    async with db_pool.acquire() as db:
+        async with session_journal.reading():
+            cur = await db.execute("SELECT total_seconds FROM total_times WHERE user_id=? AND guild_id=?", (user_id, guild_id))
+            row = await cur.fetchone()
+            pending = session_journal.pending_delta(user_id, guild_id)
+    return (int(row[0]) if row else 0) + pending
+
+def _live_seconds(start_ts, last_reset, now):
+    """Duração de uma sessão ativa, contando só a partir do último reset semanal."""
+    if start_ts is None:
+        return 0
+    start_ts = int(start_ts)
+    if last_reset and start_ts < last_reset:
+        start_ts = last_reset
+    return max(0, now - start_ts)
 
 async def current_session_time(user_id, guild_id):
     """Calcula a duração da sessão de voz ativa de um usuário."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT start_time FROM sessions WHERE user_id=? AND guild_id=?", (user_id, guild_id))
+    session = session_store.get(user_id, guild_id)
+    if not session: return 0
+    return _live_seconds(session[1], await _get_last_reset_epoch(guild_id), now_epoch())
+
+# --- Configuração por guilda (servida pelo cache em memória) ---
+
+_GOALS_COLUMNS = "id,name,seconds_required,role_id,required_role_id,reset_on_weekly,required_role_ids"
+
+async def _fetch_goals(db, guild_id):
+    cur = await db.execute(f"SELECT {_GOALS_COLUMNS} FROM goals WHERE guild_id=? ORDER BY seconds_required ASC", (guild_id,))
+    return [tuple(r) for r in await cur.fetchall()]
+
+async def _guild_config(guild_id):
+    """Retorna a configuração da guilda, lendo todas as tabelas de configuração numa única conexão na primeira vez."""
+    cfg = guild_config_cache.get(guild_id)
+    if cfg is not None:
+        return cfg
+
+    generation = guild_config_cache.generation(guild_id)
+    async with db_pool.acquire() as db:
+        cur = await db.execute("SELECT channel_type, channel_id FROM log_channels WHERE guild_id=?", (guild_id,))
+        log_channels = {t: int(c) for t, c in await cur.fetchall() if c is not None}
+        cur = await db.execute("SELECT channel_id FROM prohibited_channels WHERE guild_id=?", (guild_id,))
+        prohibited = {r[0] for r in await cur.fetchall()}
+        cur = await db.execute("SELECT weekday,hour,minute FROM weekly_reset_config WHERE guild_id=?", (guild_id,))
         row = await cur.fetchone()
-        if not row: return 0
-        
-        try:
-            start_time = datetime.fromisoformat(row[0])
-        except:
-            return 0
-        
-        last_reset = await get_last_reset(guild_id)
-        if last_reset and start_time < last_reset:
-            start_time = last_reset
-            
-        duration = int((datetime.now(timezone.utc) - start_time).total_seconds())
-        return max(0, duration)
+        reset_config = (int(row[0]), int(row[1]), int(row[2])) if row else None
+        cur = await db.execute("SELECT last_reset FROM reset_state WHERE guild_id=?", (guild_id,))
+        row = await cur.fetchone()
+        last_reset = int(row[0]) if row and row[0] is not None else None
+        cur = await db.execute("SELECT post_channel_id, retention_days FROM history_config WHERE guild_id=?", (guild_id,))
+        row = await cur.fetchone()
+        history_config = tuple(row) if row else None
+        goals = await _fetch_goals(db, guild_id)
+        cur = await db.execute("SELECT channel_id FROM excluded_voice_channels WHERE guild_id=?", (guild_id,))
+        excluded_voice = {r[0] for r in await cur.fetchall()}
+
+    cfg = GuildConfig(log_channels, prohibited, reset_config, last_reset, history_config, goals, excluded_voice)
+    return guild_config_cache.install(guild_id, cfg, generation)
+
+async def _refresh_cached_goals(db, guild_id):
+    """Depois de mexer na tabela 'goals', relê as metas da guilda na mesma conexão e atualiza o cache."""
+    cfg = guild_config_cache.touch(guild_id)
+    if cfg is not None:
+        cfg.goals = await _fetch_goals(db, guild_id)
 
 async def set_log_channel(guild_id: int, channel_id: int, channel_type: str):
     """Define um canal de log para uma função específica (ex: 'calllog')."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute("INSERT OR REPLACE INTO log_channels (guild_id, channel_type, channel_id) VALUES (?, ?, ?)",
                          (guild_id, channel_type, channel_id))
         await db.commit()
+    cfg = guild_config_cache.touch(guild_id)
+    if cfg is not None:
+        cfg.log_channels[channel_type] = int(channel_id)
 
 async def get_log_channel(guild_id: int, channel_type: str):
     """Obtém o ID de um canal de log configurado."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT channel_id FROM log_channels WHERE guild_id=? AND channel_type=?", (guild_id, channel_type))
-        row = await cur.fetchone()
-        return int(row[0]) if row and row[0] is not None else None
+    return (await _guild_config(guild_id)).log_channels.get(channel_type)
 
 async def add_prohibited_channel(guild_id: int, channel_id: int):
     """Adiciona um canal à lista de canais proibidos para comandos."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute("INSERT OR REPLACE INTO prohibited_channels (guild_id, channel_id) VALUES (?, ?)", (guild_id, channel_id))
         await db.commit()
+    cfg = guild_config_cache.touch(guild_id)
+    if cfg is not None:
+        cfg.prohibited_channels.add(channel_id)
 
 async def remove_prohibited_channel(guild_id: int, channel_id: int):
     """Remove um canal da lista de canais proibidos."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute("DELETE FROM prohibited_channels WHERE guild_id=? AND channel_id=?", (guild_id, channel_id))
         await db.commit()
+    cfg = guild_config_cache.touch(guild_id)
+    if cfg is not None:
+        cfg.prohibited_channels.discard(channel_id)
 
 async def list_prohibited_channels(guild_id: int):
     """Retorna uma lista de todos os canais proibidos em um servidor."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT channel_id FROM prohibited_channels WHERE guild_id=?", (guild_id,))
-        rows = await cur.fetchall()
-        return [r[0] for r in rows]
+    return list((await _guild_config(guild_id)).prohibited_channels)
 
 async def is_channel_prohibited(guild_id: int, channel_id: int):
     """Verifica se um canal específico está na lista de proibidos."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT 1 FROM prohibited_channels WHERE guild_id=? AND channel_id=?", (guild_id, channel_id))
-        return bool(await cur.fetchone())
+    return channel_id in (await _guild_config(guild_id)).prohibited_channels
+
+async def add_excluded_voice_channel(guild_id: int, channel_id: int):
+    """Marca um canal de voz como 'não conta tempo'."""
+    async with db_pool.acquire() as db:
+        await db.execute("INSERT OR REPLACE INTO excluded_voice_channels (guild_id, channel_id) VALUES (?, ?)", (guild_id, channel_id))
+        await db.commit()
+    cfg = guild_config_cache.touch(guild_id)
+    if cfg is not None:
+        cfg.excluded_voice_channels.add(channel_id)
+
+async def remove_excluded_voice_channel(guild_id: int, channel_id: int):
+    """Volta a contar o tempo em um canal de voz."""
+    async with db_pool.acquire() as db:
+        await db.execute("DELETE FROM excluded_voice_channels WHERE guild_id=? AND channel_id=?", (guild_id, channel_id))
+        await db.commit()
+    cfg = guild_config_cache.touch(guild_id)
+    if cfg is not None:
+        cfg.excluded_voice_channels.discard(channel_id)
+
+async def list_excluded_voice_channels(guild_id: int):
+    """Retorna o conjunto de canais de voz que não contam tempo na guilda."""
+    return set((await _guild_config(guild_id)).excluded_voice_channels)
 
 async def add_goal(guild_id, name, seconds_required, reward_role_id=None, required_role_ids_csv=None, reset_on_weekly=1):
     """Adiciona uma nova meta ao banco de dados."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute("INSERT INTO goals (guild_id, name, seconds_required, role_id, required_role_ids, reset_on_weekly) VALUES (?,?,?,?,?,?)",
                          (guild_id, name, int(seconds_required), reward_role_id, required_role_ids_csv, int(reset_on_weekly)))
         await db.commit()
+        await _refresh_cached_goals(db, guild_id)
 
 async def remove_goal(guild_id, goal_id):
     """Remove uma meta e todos os registros de premiação associados a ela."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute("DELETE FROM goals WHERE guild_id=? AND id=?", (guild_id, goal_id))
         await db.execute("DELETE FROM awarded_goals WHERE guild_id=? AND goal_id=?", (guild_id, goal_id))
         await db.commit()
+        await _refresh_cached_goals(db, guild_id)
 
 async def list_goals(guild_id):
     """Retorna uma lista de todas as metas de um servidor, ordenadas por tempo."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT id,name,seconds_required,role_id,required_role_id,reset_on_weekly,required_role_ids FROM goals WHERE guild_id=? ORDER BY seconds_required ASC",
-                               (guild_id,))
-        return await cur.fetchall()
+    return list((await _guild_config(guild_id)).goals)
 
 async def get_goal(guild_id, goal_id):
     """Obtém os dados de uma meta específica pelo seu ID."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT id,name,seconds_required,role_id,required_role_id,reset_on_weekly,required_role_ids FROM goals WHERE guild_id=? AND id=?",
-                               (guild_id, goal_id))
-        return await cur.fetchone()
+    goals = (await _guild_config(guild_id)).goals
+    return next((g for g in goals if g[0] == goal_id), None)
 
 async def mark_awarded(user_id, guild_id, goal_id):
     """Marca que um usuário completou e recebeu a recompensa de uma meta."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute("INSERT OR REPLACE INTO awarded_goals (user_id,guild_id,goal_id,awarded_at) VALUES (?,?,?,?)",
-                         (user_id, guild_id, goal_id, now_iso_utc()))
+                         (user_id, guild_id, goal_id, now_epoch()))
         await db.commit()
 
 async def has_awarded(user_id, guild_id, goal_id):
     """Verifica se um usuário já recebeu a recompensa de uma meta."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         cur = await db.execute("SELECT 1 FROM awarded_goals WHERE user_id=? AND guild_id=? AND goal_id=?", (user_id, guild_id, goal_id))
         return bool(await cur.fetchone())
 
 async def set_reset_config(guild_id, weekday, hour, minute):
     """Define a configuração (dia e hora) para o reset semanal de tempo."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute("INSERT OR REPLACE INTO weekly_reset_config (guild_id,weekday,hour,minute) VALUES (?,?,?,?)",
                          (guild_id, weekday, hour, minute))
         await db.commit()
+    cfg = guild_config_cache.touch(guild_id)
+    if cfg is not None:
+        cfg.reset_config = (int(weekday), int(hour), int(minute))
 
 async def get_reset_config(guild_id):
     """Obtém a configuração do reset semanal de um servidor."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT weekday,hour,minute FROM weekly_reset_config WHERE guild_id=?", (guild_id,))
-        row = await cur.fetchone()
-        return (int(row[0]), int(row[1]), int(row[2])) if row else (0, 0, 0)
+    return (await _guild_config(guild_id)).reset_config or (0, 0, 0)
+
+async def _get_last_reset_epoch(guild_id):
+    """Retorna o último reset semanal em epoch, ou None."""
+    return (await _guild_config(guild_id)).last_reset
 
 async def get_last_reset(guild_id):
     """Obtém a data e hora do último reset semanal executado."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT last_reset FROM reset_state WHERE guild_id=?", (guild_id,))
-        row = await cur.fetchone()
-        if row and row[0]:
-            try: return datetime.fromisoformat(row[0])
-            except: return None
-        return None
+    return from_epoch(await _get_last_reset_epoch(guild_id))
 
 async def set_last_reset(guild_id, dt: datetime):
     """Registra a data e hora de um reset semanal no banco de dados."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("INSERT OR REPLACE INTO reset_state (guild_id,last_reset) VALUES (?,?)", (guild_id, dt.isoformat()))
+    async with db_pool.acquire() as db:
+        await db.execute("INSERT OR REPLACE INTO reset_state (guild_id,last_reset) VALUES (?,?)", (guild_id, to_epoch(dt)))
         await db.commit()
+    cfg = guild_config_cache.touch(guild_id)
+    if cfg is not None:
+        cfg.last_reset = to_epoch(dt)
+
+async def _load_guild_totals(guild_id):
+    """Lê (user_id -> total_seconds) da guilda direto do banco, somando o que ainda está na fila."""
+    async with db_pool.acquire() as db:
+        async with session_journal.reading():
+            cur = await db.execute("SELECT user_id, total_seconds FROM total_times WHERE guild_id=?", (guild_id,))
+            rows = await cur.fetchall()
+            pending = session_journal.pending_deltas_for_guild(guild_id)
+    totals = {user_id: int(seconds or 0) for user_id, seconds in rows}
+    # Soma o tempo que ainda está na fila do journal
+    for user_id, seconds in pending.items():
+        totals[user_id] = totals.get(user_id, 0) + seconds
+    return totals
+
+async def _guild_rank_index(guild_id):
+    """Retorna o ranking em memória da guilda, carregando-o do banco na primeira vez."""
+    index = rank_engine.get(guild_id)
+    if index is None:
+        # Nada é aguardado entre o snapshot e o install, então nenhum end_session fica de fora
+        index = rank_engine.install(guild_id, await _load_guild_totals(guild_id))
+    return index
+
+async def get_leaderboard(guild_id):
+    """Retorna (user_id, total_seconds) de todos os usuários da guilda, do maior tempo para o menor."""
+    if RANK_IN_MEMORY:
+        return (await _guild_rank_index(guild_id)).ordered()
+    totals = await _load_guild_totals(guild_id)
+    return sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+
+async def get_activity_leaderboard(guild_id, start_ts: int, end_ts: int, channel_id=None):
+    """
+    Retorna (user_id, segundos) do período [start_ts, end_ts), do maior tempo para o menor, opcionalmente
+    só de um canal. Vem das tabelas de atividade (não são zeradas pelo reset semanal) e conta as sessões já encerradas.
+    """
+    table, column = table_for_window(start_ts, end_ts)
+    sql = f"SELECT user_id, SUM(seconds) FROM {table} WHERE guild_id=? AND {column} >= ? AND {column} < ?"
+    params = [guild_id, start_ts, end_ts]
+    if channel_id is not None:
+        sql += " AND channel_id=?"
+        params.append(channel_id)
+    async with db_pool.acquire() as db:
+        async with session_journal.reading():
+            cur = await db.execute(sql + " GROUP BY user_id", params)
+            rows = await cur.fetchall()
+            pending = session_journal.pending_activity(guild_id, start_ts, end_ts)
+    totals = {user_id: int(seconds or 0) for user_id, seconds in rows}
+    # Soma as horas que ainda estão na fila do journal
+    for user_id, channel, _, seconds in pending:
+        if channel_id is None or channel == channel_id:
+            totals[user_id] = totals.get(user_id, 0) + seconds
+    return sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+
+async def _count_rank(db, user_id, guild_id, seconds):
+    """Conta quantos estão na frente do usuário usando o índice (guild_id, total_seconds)."""
+    cur = await db.execute(
+        "SELECT (SELECT COUNT(*) FROM total_times WHERE guild_id=? AND total_seconds > ?) + "
+        "(SELECT COUNT(*) FROM total_times WHERE guild_id=? AND total_seconds = ? AND user_id < ?)",
+        (guild_id, seconds, guild_id, seconds, user_id))
+    ahead = (await cur.fetchone())[0]
+    return int(ahead) + 1
 
 async def get_rank(user_id, guild_id):
-    """Consulta o banco de dados para encontrar a posição (rank) de um usuário com base no tempo total."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Pede todos os usuários da guilda, ordenados do maior tempo para o menor
-        cur = await db.execute("SELECT user_id FROM total_times WHERE guild_id=? ORDER BY total_seconds DESC", (guild_id,))
-        rows = await cur.fetchall()
-        # Itera sobre os resultados para encontrar a posição do usuário solicitado
-        for i, r in enumerate(rows, start=1):
-            if r[0] == user_id:
-                return i # Retorna a posição (rank)
-    return None # Retorna None se o usuário não estiver no ranking
+    """Retorna a posição (rank) de um usuário com base no tempo total, ou None se ele não está no ranking."""
+    if RANK_IN_MEMORY:
+        # Busca binária no ranking em memória da guilda
+        return (await _guild_rank_index(guild_id)).rank(user_id)
+
+    # Sem o ranking em memória: conta quantos estão na frente direto no banco
+    async with db_pool.acquire() as db:
+        cur = await db.execute("SELECT total_seconds FROM total_times WHERE user_id=? AND guild_id=?", (user_id, guild_id))
+        row = await cur.fetchone()
+        if not row:
+            return None
+        return await _count_rank(db, user_id, guild_id, int(row[0] or 0))
+
+async def get_user_stats(user_id, guild_id):
+    """
+    Junta tudo o que o cartão de estatísticas precisa numa única consulta:
+    tempo total, tempo da sessão atual, posição no ranking e o progresso de cada meta.
+    Retorna {'total', 'current', 'rank', 'goals'}; cada meta é {'id', 'name', 'required', 'awarded', 'progress'}.
+    """
+    cfg = await _guild_config(guild_id)
+    # O ranking em memória é carregado antes de pegar a conexão (ele mesmo pode precisar de uma)
+    index = await _guild_rank_index(guild_id) if RANK_IN_MEMORY else None
+
+    async with db_pool.acquire() as db:
+        async with session_journal.reading():
+            cur = await db.execute(
+                "SELECT t.total_seconds, "
+                "(SELECT GROUP_CONCAT(a.goal_id) FROM awarded_goals a WHERE a.user_id=u.user_id AND a.guild_id=u.guild_id) "
+                "FROM (SELECT CAST(? AS BIGINT) AS user_id, CAST(? AS BIGINT) AS guild_id) u "
+                "LEFT JOIN total_times t ON t.user_id=u.user_id AND t.guild_id=u.guild_id",
+                (user_id, guild_id))
+            stored_total, awarded_csv = await cur.fetchone()
+            pending = session_journal.pending_delta(user_id, guild_id)
+        if index is not None:
+            rank = index.rank(user_id)
+        elif stored_total is not None:
+            rank = await _count_rank(db, user_id, guild_id, int(stored_total))
+        else:
+            rank = None
+
+    total = int(stored_total or 0) + pending
+    # A sessão atual vem da memória
+    session = session_store.get(user_id, guild_id)
+    current = _live_seconds(session[1], cfg.last_reset, now_epoch()) if session else 0
+
+    awarded = {int(g) for g in awarded_csv.split(",")} if awarded_csv else set()
+    effective_time = total + current
+    goals = []
+    for gid, gname, greq, *_ in cfg.goals:
+        greq_i = int(greq or 0)
+        prog = min(1.0, effective_time / greq_i) if greq_i > 0 else 0.0
+        goals.append({'id': gid, 'name': gname, 'required': greq_i, 'awarded': gid in awarded, 'progress': prog})
+
+    return {'total': total, 'current': current, 'rank': rank, 'goals': goals}
+
+async def evaluate_guild_goals(guild_id, goal_ids=None):
+    """
+    Avalia as metas de uma guilda para todos os usuários rastreados de uma vez.
+    Uma única consulta junta total_times e awarded_goals; o resultado é mesclado com a fila do journal
+    e com as sessões ativas em memória.
+    Retorna (effective, goals):
+      effective -> {user_id: tempo efetivo (total + sessão atual)}
+      goals     -> {goal_id: {'goal': linha da meta, 'completed': set, 'pending': set, 'awarded': set}}
+    Usuários que não aparecem em 'effective' têm tempo 0 e não estão em nenhum conjunto.
+    """
+    cfg = await _guild_config(guild_id)
+    goal_rows = [g for g in cfg.goals if goal_ids is None or g[0] in goal_ids]
+
+    async with db_pool.acquire() as db:
+        async with session_journal.reading():
+            cur = await db.execute(
+                "SELECT u.user_id, t.total_seconds, GROUP_CONCAT(a.goal_id) "
+                "FROM (SELECT user_id FROM total_times WHERE guild_id=? "
+                "      UNION SELECT user_id FROM awarded_goals WHERE guild_id=?) u "
+                "LEFT JOIN total_times t ON t.user_id=u.user_id AND t.guild_id=? "
+                "LEFT JOIN awarded_goals a ON a.user_id=u.user_id AND a.guild_id=? "
+                "GROUP BY u.user_id, t.total_seconds",
+                (guild_id,) * 4)
+            rows = await cur.fetchall()
+            pending_deltas = session_journal.pending_deltas_for_guild(guild_id)
+
+    totals, awarded_by_user = {}, {}
+    for user_id, seconds, awarded_csv in rows:
+        totals[user_id] = int(seconds or 0)
+        if awarded_csv:
+            awarded_by_user[user_id] = {int(g) for g in str(awarded_csv).split(",")}
+    # Soma o tempo que ainda está na fila do journal
+    for user_id, seconds in pending_deltas.items():
+        totals[user_id] = totals.get(user_id, 0) + seconds
+    # As sessões ativas vêm da memória
+    starts = {user_id: session[1] for user_id, session in session_store.for_guild(guild_id).items()}
+    for user_id in starts:
+        totals.setdefault(user_id, 0)
+
+    now = now_epoch()
+    effective = {user_id: total + _live_seconds(starts.get(user_id), cfg.last_reset, now) for user_id, total in totals.items()}
+
+    goals = {}
+    for goal in goal_rows:
+        goal_id, required = goal[0], int(goal[2] or 0)
+        completed = {u for u, secs in effective.items() if secs >= required}
+        goals[goal_id] = {
+            'goal': goal,
+            'completed': completed,
+            'pending': set(effective) - completed,
+            'awarded': {u for u, ids in awarded_by_user.items() if goal_id in ids},
+        }
+    return effective, goals
 
 async def update_goal_reset_flag(guild_id: int, goal_id: int, reset_flag: bool):
     """Atualiza a propriedade 'reset_on_weekly' de uma meta específica."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         # Converte o booleano (True/False) para inteiro (1/0) para salvar no DB
         flag_as_int = 1 if reset_flag else 0
         await db.execute("UPDATE goals SET reset_on_weekly=? WHERE guild_id=? AND id=?",
                          (flag_as_int, guild_id, goal_id))
         await db.commit()
+        await _refresh_cached_goals(db, guild_id)
 
 async def get_awarded_users(guild_id: int, goal_id: int):
     """Retorna uma lista de IDs de usuários que já receberam a recompensa de uma meta."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         cur = await db.execute("SELECT user_id FROM awarded_goals WHERE guild_id=? AND goal_id=?", (guild_id, goal_id))
         rows = await cur.fetchall()
         # Retorna uma lista de IDs, por exemplo: [12345, 67890]
@@ -276,135 +445,154 @@ async def get_awarded_users(guild_id: int, goal_id: int):
 
 
 async def save_last_week_ranking(guild_id: int):
-    """Salva o ranking atual como o ranking da última semana, apagando o anterior."""
-
-async def archive_weekly_times(guild_id, reset_date_iso):
-    """Copia os tempos atuais da tabela total_times para a tabela de histórico."""
+    """Salva o ranking atual como o ranking da última semana."""
+    await archive_weekly_times(guild_id, now_epoch())
+
+async def archive_weekly_times(guild_id, reset_date, db=None):
+    """
+    Copia os tempos atuais da tabela total_times para a tabela de histórico.
+    Com 'db', usa essa conexão sem dar commit (o reset semanal arquiva e zera numa transação só).
+    """
+    if db is None:
+        async with db_pool.acquire() as db:
+            await archive_weekly_times(guild_id, reset_date, db)
+            await db.commit()
+        return
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT user_id, total_seconds FROM total_times WHERE guild_id=?", (guild_id,))
-        rows = await cursor.fetchall()
+    reset_ts = to_epoch(reset_date)
+    cursor = await db.execute("SELECT user_id, total_seconds FROM total_times WHERE guild_id=?", (guild_id,))
+    rows = await cursor.fetchall()
+    if not rows:
+        return
 
-        # Limpa o histórico antigo e insere o novo de uma vez (transação)
-        await db.execute("DELETE FROM weekly_time_history WHERE guild_id=?", (guild_id,))
-        if rows:
-            to_insert = [(guild_id, user_id, total_seconds) for user_id, total_seconds in rows]
-            await db.executemany("INSERT INTO weekly_time_history (guild_id, user_id, total_seconds) VALUES (?, ?, ?)", to_insert)
-        await db.commit()
+    to_insert = [(guild_id, user_id, total_seconds, reset_ts) for user_id, total_seconds in rows]
+    await db.executemany("INSERT OR REPLACE INTO weekly_time_history (guild_id, user_id, total_seconds, reset_date) VALUES (?, ?, ?, ?)", to_insert)
 
 async def get_last_week_ranking(guild_id: int):
     """Busca o ranking da última semana salva."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT user_id, total_seconds FROM weekly_time_history WHERE guild_id=? ORDER BY total_seconds DESC", (guild_id,))
-        if not rows:
-            return
-
-        to_insert = [(guild_id, user_id, total_seconds, reset_date_iso) for user_id, total_seconds in rows]
-        await db.executemany("INSERT OR REPLACE INTO weekly_time_history (guild_id, user_id, total_seconds, reset_date) VALUES (?, ?, ?, ?)", to_insert)
-        await db.commit()
+    _, rows = await get_weekly_history(guild_id)
+    return rows
 
 async def get_weekly_history(guild_id):
     """Busca o ranking da última semana arquivada."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         cursor = await db.execute("SELECT MAX(reset_date) FROM weekly_time_history WHERE guild_id=?", (guild_id,))
         latest_date_row = await cursor.fetchone()
         
         if not latest_date_row or not latest_date_row[0]:
             return None, []
 
-        latest_date = latest_date_row[0]
+        latest_date = int(latest_date_row[0])
         cursor = await db.execute("SELECT user_id, total_seconds FROM weekly_time_history WHERE guild_id=? AND reset_date=? ORDER BY total_seconds DESC", (guild_id, latest_date))
         rows = await cursor.fetchall()
         return latest_date, rows
 
 async def set_history_config(guild_id: int, channel_id: int, retention_days: int):
     """Define ou atualiza as configurações do histórico semanal."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute("INSERT OR REPLACE INTO history_config (guild_id, post_channel_id, retention_days) VALUES (?, ?, ?)",
                          (guild_id, channel_id, retention_days))
         await db.commit()
+    cfg = guild_config_cache.touch(guild_id)
+    if cfg is not None:
+        cfg.history_config = (channel_id, retention_days)
 
 async def get_history_config(guild_id: int):
     """Busca as configurações do histórico semanal."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT post_channel_id, retention_days FROM history_config WHERE guild_id=?", (guild_id,))
-        return await cursor.fetchone()
+    return (await _guild_config(guild_id)).history_config
 
 async def get_all_history_dates(guild_id: int):
     """Retorna uma lista de todas as datas de reset arquivadas."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         cursor = await db.execute("SELECT DISTINCT reset_date FROM weekly_time_history WHERE guild_id=? ORDER BY reset_date DESC", (guild_id,))
         rows = await cursor.fetchall()
-        return [row[0] for row in rows]
+        return [int(row[0]) for row in rows]
 
-async def get_history_by_date(guild_id: int, reset_date_iso: str):
-    """Busca o ranking de uma data específica."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT user_id, total_seconds FROM weekly_time_history WHERE guild_id=? AND reset_date=? ORDER BY total_seconds DESC", (guild_id, reset_date_iso))
+async def get_history_by_date(guild_id: int, reset_date):
+    """Busca o ranking de uma data específica (epoch retornado por get_all_history_dates)."""
+    async with db_pool.acquire() as db:
+        cursor = await db.execute("SELECT user_id, total_seconds FROM weekly_time_history WHERE guild_id=? AND reset_date=? ORDER BY total_seconds DESC", (guild_id, to_epoch(reset_date)))
         return await cursor.fetchall()
 
-async def toggle_pin_history(guild_id: int, reset_date_iso: str, pin_status: bool):
+async def toggle_pin_history(guild_id: int, reset_date, pin_status: bool):
     """Fixa ou desafixa um registro de histórico semanal."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute("UPDATE weekly_time_history SET pinned = ? WHERE guild_id=? AND reset_date=?",
-                         (1 if pin_status else 0, guild_id, reset_date_iso))
+                         (1 if pin_status else 0, guild_id, to_epoch(reset_date)))
         await db.commit()
 
 async def cleanup_old_history(guild_id: int, retention_days: int):
     """Apaga registros de histórico mais antigos que o período de retenção que não estão fixados."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # A data limite é calculada em TEXT no formato ISO, que é comparável
-        limit_date = (datetime.now(timezone.utc) - timedelta(days=retention_days)).isoformat()
+    async with db_pool.acquire() as db:
+        # A data limite é um epoch, então a comparação usa o índice (guild_id, reset_date)
+        limit_date = now_epoch() - int(retention_days) * 86400
         await db.execute("DELETE FROM weekly_time_history WHERE guild_id=? AND reset_date < ? AND pinned = 0",
                          (guild_id, limit_date))
         await db.commit()
 
 async def get_active_sessions(guild_id: int):
     """Retorna todas as sessões de voz ativas para uma guilda."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT user_id FROM sessions WHERE guild_id=?", (guild_id,))
-        rows = await cursor.fetchall()
-        return [row[0] for row in rows]
+    return list(session_store.for_guild(guild_id))
     
 async def add_giveaway(message_id, guild_id, channel_id, end_time, winner_count, prize, required_roles_csv):
     """Adiciona um novo sorteio ao banco de dados."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute(
             "INSERT INTO giveaways (message_id, guild_id, channel_id, end_time, winner_count, prize, required_roles) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (message_id, guild_id, channel_id, end_time.isoformat(), winner_count, prize, required_roles_csv)
+            (message_id, guild_id, channel_id, to_epoch(end_time), winner_count, prize, required_roles_csv)
         )
         await db.commit()
 
 async def remove_giveaway(message_id):
     """Remove um sorteio e seus participantes do banco de dados."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute("DELETE FROM giveaways WHERE message_id=?", (message_id,))
         await db.execute("DELETE FROM giveaway_participants WHERE message_id=?", (message_id,))
         await db.commit()
 
 async def add_giveaway_participant(message_id, user_id):
     """Adiciona um participante a um sorteio."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         await db.execute("INSERT OR IGNORE INTO giveaway_participants (message_id, user_id) VALUES (?, ?)", (message_id, user_id))
         await db.commit()
 
 async def get_giveaway_participants(message_id):
     """Retorna uma lista de todos os participantes de um sorteio."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.acquire() as db:
         cursor = await db.execute("SELECT user_id FROM giveaway_participants WHERE message_id=?", (message_id,))
         rows = await cursor.fetchall()
         return [row[0] for row in rows]
 
 async def get_active_giveaways():
     """Retorna todos os sorteios que ainda não terminaram."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        now = datetime.now(timezone.utc).isoformat()
-        cursor = await db.execute("SELECT * FROM giveaways WHERE end_time > ?", (now,))
+    async with db_pool.acquire() as db:
+        cursor = await db.execute("SELECT * FROM giveaways WHERE end_time > ?", (now_epoch(),))
         return await cursor.fetchall()
 
 async def get_finished_giveaways():
     """Retorna todos os sorteios cujo tempo já acabou."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        now = datetime.now(timezone.utc).isoformat()
-        cursor = await db.execute("SELECT * FROM giveaways WHERE end_time <= ?", (now,))    
-        return await cursor.fetchall()
\ No newline at end of file
+    async with db_pool.acquire() as db:
+        cursor = await db.execute("SELECT * FROM giveaways WHERE end_time <= ?", (now_epoch(),))
+        return await cursor.fetchall()
+# --- Registro dos cards de chamada ---
+
+async def get_call_cards(guild_id):
+    """Retorna {user_id: (channel_id, message_id)} dos cards de chamada registrados na guilda."""
+    async with db_pool.acquire() as db:
+        cur = await db.execute("SELECT user_id, channel_id, message_id FROM call_card_messages WHERE guild_id=?", (guild_id,))
+        return {user_id: (channel_id, message_id) for user_id, channel_id, message_id in await cur.fetchall()}
+
+async def save_call_card(guild_id, user_id, channel_id, message_id):
+    """Registra (ou troca) a mensagem do card de chamada de um membro."""
+    async with db_pool.acquire() as db:
+        await db.execute("INSERT OR REPLACE INTO call_card_messages (guild_id, user_id, channel_id, message_id) VALUES (?, ?, ?, ?)",
+                         (guild_id, user_id, channel_id, message_id))
+        await db.commit()
+
+async def delete_call_cards(guild_id, user_ids):
+    """Remove do registro os cards de chamada dos membros informados."""
+    if not user_ids:
+        return
+    async with db_pool.acquire() as db:
+        await db.executemany("DELETE FROM call_card_messages WHERE guild_id=? AND user_id=?", [(guild_id, u) for u in user_ids])
+        await db.commit()
@@ -0,0 +1,110 @@
+import asyncio
+from contextlib import asynccontextmanager
+import aiosqlite
+
+# Importa as configurações do pool do nosso arquivo de configuração
+from config import DB_BACKEND, DB_PATH, DATABASE_URL, DB_POOL_SIZE, DB_STATEMENT_CACHE_SIZE
+
+# PRAGMAs aplicados a cada conexão assim que ela é aberta.
+# O WAL permite leituras concorrentes enquanto uma escrita acontece e
+# 'synchronous=NORMAL' é seguro em WAL (só perde o último commit numa queda de energia).
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",  # ~16 MB de cache de páginas por conexão
+    "PRAGMA mmap_size=134217728",  # 128 MB de leitura via mmap
+    "PRAGMA busy_timeout=5000",  # espera até 5s pelo lock de escrita em vez de falhar
+)
+
+class DatabasePool:
+    """
+    Mantém um pequeno conjunto de conexões aiosqlite abertas durante toda a vida do bot.
+    Cada conexão tem sua própria thread e seu próprio cache de prepared statements,
+    então reaproveitá-las evita abrir uma thread e um handle SQLite por consulta.
+
+    Todo backend de armazenamento segue esta mesma interface (open/close/is_open/acquire/dialect)
+    e entrega conexões com execute/executemany/commit/rollback/in_transaction;
+    o backend PostgreSQL está em core/pg_pool.py.
+    """
+    dialect = "sqlite"
+
+    def __init__(self, path: str, size: int, statement_cache_size: int):
+        self.path = path
+        self.size = max(1, int(size))
+        self.statement_cache_size = statement_cache_size
+        self._connections = []
+        self._idle = None
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self):
+        return self._idle is not None
+
+    async def _connect(self):
+        """Abre uma conexão nova e aplica os PRAGMAs de desempenho."""
+        # 'cached_statements' é repassado ao sqlite3 e define quantas consultas preparadas ficam em cache
+        conn = await aiosqlite.connect(self.path, cached_statements=self.statement_cache_size)
+        for pragma in _CONNECTION_PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def open(self):
+        """Abre todas as conexões do pool. Chamadas repetidas não fazem nada."""
+        async with self._open_lock:
+            if self.is_open:
+                return
+            idle = asyncio.Queue()
+            for _ in range(self.size):
+                conn = await self._connect()
+                self._connections.append(conn)
+                idle.put_nowait(conn)
+            self._idle = idle
+
+    async def close(self):
+        """Fecha todas as conexões. Deve ser chamado no desligamento do bot."""
+        async with self._open_lock:
+            if not self.is_open:
+                return
+            self._idle = None
+            connections, self._connections = self._connections, []
+            for conn in connections:
+                try:
+                    await conn.close()
+                except Exception as e:
+                    print(f"[db] Erro ao fechar conexão do pool: {e}")
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Empresta uma conexão do pool. Uso: 'async with db_pool.acquire() as db:'.
+        Se a função que usou a conexão falhar no meio de uma transação, ela é desfeita
+        para que a próxima função não herde escritas pela metade.
+        """
+        if not self.is_open:
+            # Permite o uso fora do bot (scripts, testes manuais) sem abrir o pool antes
+            await self.open()
+        idle = self._idle
+        conn = await idle.get()
+        try:
+            yield conn
+        finally:
+            try:
+                if conn.in_transaction:
+                    await conn.rollback()
+            except Exception as e:
+                print(f"[db] Erro ao desfazer transação pendente: {e}")
+            idle.put_nowait(conn)
+
+def create_pool():
+    """Cria o backend escolhido em DB_BACKEND ('sqlite' ou 'postgres')."""
+    if DB_BACKEND == "postgres":
+        # Importado só aqui para que o asyncpg continue opcional
+        from .pg_pool import PostgresPool
+        return PostgresPool(DATABASE_URL, DB_POOL_SIZE, DB_STATEMENT_CACHE_SIZE)
+    if DB_BACKEND != "sqlite":
+        raise ValueError(f"DB_BACKEND inválido: {DB_BACKEND!r} (use 'sqlite' ou 'postgres')")
+    return DatabasePool(DB_PATH, DB_POOL_SIZE, DB_STATEMENT_CACHE_SIZE)
+
+# Instância única usada por todo o projeto
+db_pool = create_pool()
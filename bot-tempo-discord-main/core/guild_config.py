@@ -0,0 +1,49 @@
+class GuildConfig:
+    """Configuração de uma guilda mantida em memória (espelho das tabelas de configuração)."""
+    __slots__ = ("log_channels", "prohibited_channels", "reset_config", "last_reset", "history_config", "goals", "excluded_voice_channels")
+
+    def __init__(self, log_channels, prohibited_channels, reset_config, last_reset, history_config, goals, excluded_voice_channels):
+        self.log_channels = log_channels              # {channel_type: channel_id}
+        self.prohibited_channels = prohibited_channels  # {channel_id, ...}
+        self.reset_config = reset_config              # (weekday, hour, minute) ou None
+        self.last_reset = last_reset                  # epoch do último reset ou None
+        self.history_config = history_config          # (post_channel_id, retention_days) ou None
+        self.goals = goals                            # linhas de 'goals' ordenadas por seconds_required
+        self.excluded_voice_channels = excluded_voice_channels  # {channel_id, ...} canais de voz que não contam tempo
+
+class GuildConfigCache:
+    """
+    Cache em processo da configuração de cada guilda.
+    Cada guilda é carregada do banco uma única vez; as funções que gravam configuração
+    atualizam o cache logo depois do commit (write-through), então as leituras nunca vão ao disco.
+    """
+    def __init__(self):
+        self._guilds = {}
+        # Incrementado a cada escrita; impede que um carregamento iniciado antes dela instale dados velhos
+        self._generations = {}
+
+    def get(self, guild_id):
+        """Retorna a configuração em cache da guilda ou None se ainda não foi carregada."""
+        return self._guilds.get(guild_id)
+
+    def generation(self, guild_id):
+        return self._generations.get(guild_id, 0)
+
+    def install(self, guild_id, config: GuildConfig, generation: int):
+        """Guarda uma configuração lida do banco, se nenhuma escrita aconteceu durante a leitura."""
+        if self.generation(guild_id) == generation:
+            self._guilds[guild_id] = config
+        return config
+
+    def touch(self, guild_id):
+        """Registra que uma escrita de configuração aconteceu e devolve o cache atual (ou None)."""
+        self._generations[guild_id] = self.generation(guild_id) + 1
+        return self._guilds.get(guild_id)
+
+    def invalidate(self, guild_id):
+        """Descarta a configuração em cache (ela será relida no próximo acesso)."""
+        self.touch(guild_id)
+        self._guilds.pop(guild_id, None)
+
+# Instância única usada por core/database.py
+guild_config_cache = GuildConfigCache()
@@ -1,15 +1,50 @@
 import traceback
 from datetime import datetime
+import discord
 
 # Importa as funções do banco de dados que serão necessárias
 from .database import (
     list_goals, has_awarded, mark_awarded, get_log_channel,
-    total_time, current_session_time
+    total_time, current_session_time, evaluate_guild_goals
 )
+from .outbound import outbound, PRIORITY_NOTIFY
 
 # Importa a função de formatação de tempo
 from utils.helpers import human_hours_minutes
 
+def _meets_required_roles(member, required_role_ids_csv):
+    """Verifica se o membro tem todos os cargos de requisito da meta."""
+    if not required_role_ids_csv:
+        return True
+    req_ids = {int(rid.strip()) for rid in required_role_ids_csv.split(',')}
+    member_role_ids = {role.id for role in member.roles}
+    return req_ids.issubset(member_role_ids)
+
+async def _award_goal(guild, member, goal_row):
+    """Marca a meta como concluída, entrega o cargo de recompensa e avisa no canal 'goallog'."""
+    goal_id, name, seconds_required, reward_role_id, _, _, _ = goal_row
+
+    # Marca como concluída e dá a recompensa
+    await mark_awarded(member.id, guild.id, goal_id)
+    if reward_role_id:
+        role = guild.get_role(reward_role_id)
+        if role:
+            await member.add_roles(role, reason="Meta de tempo atingida")
+
+    # Envia a notificação
+    goallog_id = await get_log_channel(guild.id, "goallog")
+    ch = guild.get_channel(goallog_id) if goallog_id else None
+    if ch:
+        role_txt = f"<@&{reward_role_id}>" if reward_role_id else "N/A"
+        time_txt = human_hours_minutes(seconds_required)
+        msg = (
+            f"🎉 **{member.mention}** acaba de concluir a meta **'{name}'**!\n"
+            f"Tempo necessário: **{time_txt}** | Recompensa: {role_txt}"
+        )
+        await outbound.run(ch.id,
+            lambda: ch.send(msg, allowed_mentions=discord.AllowedMentions(users=True, roles=False)),
+            priority=PRIORITY_NOTIFY)
+
 async def check_and_award_goals_for_user(bot, user_id: int, guild_id: int):
     """
     Verifica todas as metas para um usuário específico, calcula seu tempo total
@@ -36,38 +71,48 @@ async def check_and_award_goals_for_user(bot, user_id: int, guild_id: int):
             return
 
         for goal_row in all_goals:
-            goal_id, name, seconds_required, reward_role_id, _, _, required_role_ids_csv = goal_row
+            goal_id, _, seconds_required, _, _, _, required_role_ids_csv = goal_row
             
             if await has_awarded(user_id, guild_id, goal_id):
                 continue
 
             if effective_time >= seconds_required:
-                # Verifica se o membro tem os cargos de requisito
-                if required_role_ids_csv:
-                    req_ids = {int(rid.strip()) for rid in required_role_ids_csv.split(',')}
-                    member_role_ids = {role.id for role in member.roles}
-                    if not req_ids.issubset(member_role_ids):
-                        continue # Pula esta meta se não tiver os requisitos
-
-                # Marca como concluída e dá a recompensa
-                await mark_awarded(user_id, guild_id, goal_id)
-                if reward_role_id:
-                    role = guild.get_role(reward_role_id)
-                    if role:
-                        await member.add_roles(role, reason="Meta de tempo atingida")
-
-                # Envia a notificação
-                goallog_id = await get_log_channel(guild_id, "goallog")
-                ch = guild.get_channel(goallog_id) if goallog_id else None
-                if ch:
-                    role_txt = f"<@&{reward_role_id}>" if reward_role_id else "N/A"
-                    time_txt = human_hours_minutes(seconds_required)
-                    msg = (
-                        f"🎉 **{member.mention}** acaba de concluir a meta **'{name}'**!\n"
-                        f"Tempo necessário: **{time_txt}** | Recompensa: {role_txt}"
-                    )
-                    await ch.send(msg, allowed_mentions=discord.AllowedMentions(users=True, roles=False))
+                # Pula esta meta se não tiver os requisitos
+                if not _meets_required_roles(member, required_role_ids_csv):
+                    continue
+                await _award_goal(guild, member, goal_row)
 
     except Exception as e:
         print(f"!!! ERRO em check_and_award_goals_for_user: {e}")
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+
+async def check_and_award_goals_for_guild(bot, guild_id: int, user_ids=None):
+    """
+    Versão em lote da verificação de metas: avalia todos os usuários da guilda numa única
+    consulta e só entrega as metas de quem completou e ainda não foi premiado.
+    Se 'user_ids' for passado, só esses usuários podem receber metas (ex: quem está em call).
+    """
+    try:
+        guild = bot.get_guild(guild_id)
+        if not guild: return
+
+        _, results = await evaluate_guild_goals(guild_id)
+        for result in results.values():
+            goal_row = result['goal']
+            to_award = result['completed'] - result['awarded']
+            if user_ids is not None:
+                to_award &= set(user_ids)
+            for user_id in to_award:
+                member = guild.get_member(user_id)
+                if not member or member.bot:
+                    continue
+                if not _meets_required_roles(member, goal_row[6]):
+                    continue
+                try:
+                    await _award_goal(guild, member, goal_row)
+                except Exception as e:
+                    print(f"Erro ao entregar a meta {goal_row[0]} para {user_id}: {e}")
+
+    except Exception as e:
+        print(f"!!! ERRO em check_and_award_goals_for_guild: {e}")
+        traceback.print_exc()
@@ -0,0 +1,328 @@
+# Migrações versionadas do esquema do banco.
+# Cada passo tem um número de versão e roda uma única vez, dentro de uma transação.
+# A versão aplicada fica na tabela 'schema_version'; quando o banco já está na última
+# versão, a inicialização faz só uma consulta e nenhum DDL.
+# Para mudar o esquema, adicione um novo passo no FINAL de MIGRATIONS (nunca edite um passo já publicado).
+# O PostgreSQL tem sua própria lista (POSTGRES_MIGRATIONS) com os mesmos números de versão.
+from utils.helpers import now_epoch, to_epoch
+
+async def _columns(db, table):
+    """Retorna {nome_da_coluna: tipo_declarado} de uma tabela (vazio se ela não existir)."""
+    cur = await db.execute(f"PRAGMA table_info({table})")
+    return {row[1]: (row[2] or "").upper() for row in await cur.fetchall()}
+
+# --- v1: tabelas base ---
+
+async def _v1_base_tables(db):
+    # Tabela para rastrear sessões de voz ativas
+    await db.execute("""CREATE TABLE IF NOT EXISTS sessions (
+        user_id INTEGER, guild_id INTEGER, channel_id INTEGER, start_time INTEGER,
+        PRIMARY KEY(user_id,guild_id) )""")
+    # Tabela para armazenar o tempo total acumulado de cada usuário
+    await db.execute("""CREATE TABLE IF NOT EXISTS total_times (
+        user_id INTEGER, guild_id INTEGER, total_seconds INTEGER,
+        PRIMARY KEY(user_id,guild_id) )""")
+    # Tabela para configurar canais de log (ex: logs de chamada, logs de metas)
+    await db.execute("""CREATE TABLE IF NOT EXISTS log_channels (
+        guild_id INTEGER, channel_type TEXT, channel_id INTEGER,
+        PRIMARY KEY(guild_id,channel_type) )""")
+    # Tabela para definir as metas do servidor
+    await db.execute("""CREATE TABLE IF NOT EXISTS goals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER, name TEXT,
+        seconds_required INTEGER, role_id INTEGER, required_role_id INTEGER,
+        reset_on_weekly INTEGER DEFAULT 1, required_role_ids TEXT )""")
+    # Tabela para registrar quais usuários já receberam a recompensa de cada meta
+    await db.execute("""CREATE TABLE IF NOT EXISTS awarded_goals (
+        user_id INTEGER, guild_id INTEGER, goal_id INTEGER, awarded_at INTEGER,
+        PRIMARY KEY(user_id,guild_id,goal_id) )""")
+    # Tabela para a configuração do reset semanal de tempo
+    await db.execute("""CREATE TABLE IF NOT EXISTS weekly_reset_config (
+        guild_id INTEGER PRIMARY KEY, weekday INTEGER, hour INTEGER, minute INTEGER )""")
+    # Tabela para guardar o estado do último reset
+    await db.execute("""CREATE TABLE IF NOT EXISTS reset_state (
+        guild_id INTEGER PRIMARY KEY, last_reset INTEGER )""")
+    # Tabela para listar canais onde os comandos do bot são proibidos
+    await db.execute("""CREATE TABLE IF NOT EXISTS prohibited_channels (
+        guild_id INTEGER, channel_id INTEGER, PRIMARY KEY(guild_id, channel_id) )""")
+    # Tabela para armazenar o histórico semanal de tempo (um ranking por data de reset)
+    await db.execute("""CREATE TABLE IF NOT EXISTS weekly_time_history (
+        guild_id INTEGER, user_id INTEGER, total_seconds INTEGER, reset_date INTEGER, pinned INTEGER DEFAULT 0,
+        PRIMARY KEY(guild_id, user_id, reset_date))""")
+    # Tabela para configurar o canal de postagem e a retenção do histórico
+    await db.execute("""CREATE TABLE IF NOT EXISTS history_config (
+        guild_id INTEGER PRIMARY KEY, post_channel_id INTEGER, retention_days INTEGER DEFAULT 90)""")
+    # Tabela para armazenar os sorteios ativos
+    await db.execute("""CREATE TABLE IF NOT EXISTS giveaways (
+        message_id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL, channel_id INTEGER NOT NULL, end_time INTEGER NOT NULL,
+        winner_count INTEGER NOT NULL, prize TEXT, required_roles TEXT)""")
+    # Tabela para armazenar os participantes de cada sorteio
+    await db.execute("""CREATE TABLE IF NOT EXISTS giveaway_participants (
+        message_id INTEGER, user_id INTEGER, PRIMARY KEY (message_id, user_id))""")
+
+# --- v2: coluna de cargos requisitados das metas (bancos antigos não têm) ---
+
+async def _v2_goal_required_roles(db):
+    if "required_role_ids" not in await _columns(db, "goals"):
+        await db.execute("ALTER TABLE goals ADD COLUMN required_role_ids TEXT")
+
+# --- v3: datas em TEXT ISO -> epoch INTEGER ---
+
+# Tabelas que guardavam datas como TEXT ISO, com o DDL atual (coluna INTEGER)
+_EPOCH_TABLES = {
+    "sessions": ("start_time", """CREATE TABLE sessions (
+        user_id INTEGER, guild_id INTEGER, channel_id INTEGER, start_time INTEGER,
+        PRIMARY KEY(user_id,guild_id) )"""),
+    "awarded_goals": ("awarded_at", """CREATE TABLE awarded_goals (
+        user_id INTEGER, guild_id INTEGER, goal_id INTEGER, awarded_at INTEGER,
+        PRIMARY KEY(user_id,guild_id,goal_id) )"""),
+    "reset_state": ("last_reset", """CREATE TABLE reset_state (
+        guild_id INTEGER PRIMARY KEY, last_reset INTEGER )"""),
+    "weekly_time_history": ("reset_date", """CREATE TABLE weekly_time_history (
+        guild_id INTEGER, user_id INTEGER, total_seconds INTEGER, reset_date INTEGER, pinned INTEGER DEFAULT 0,
+        PRIMARY KEY(guild_id, user_id, reset_date))"""),
+    "giveaways": ("end_time", """CREATE TABLE giveaways (
+        message_id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL, channel_id INTEGER NOT NULL, end_time INTEGER NOT NULL,
+        winner_count INTEGER NOT NULL, prize TEXT, required_roles TEXT)"""),
+}
+# Nessas tabelas uma linha sem data válida não tem como ser usada e é descartada
+_DATE_REQUIRED = {"sessions", "giveaways"}
+
+async def _history_fallback_dates(db):
+    """
+    Data para as linhas do histórico sem reset_date válido (o esquema antigo nem tinha a coluna):
+    o último reset da guilda, já que o arquivamento acontecia logo antes do reset. {guild_id: epoch}
+    """
+    if "last_reset" not in await _columns(db, "reset_state"):
+        return {}
+    cur = await db.execute("SELECT guild_id, last_reset FROM reset_state")
+    dates = {}
+    for guild_id, last_reset in await cur.fetchall():
+        try:
+            dates[guild_id] = to_epoch(last_reset)
+        except (ValueError, TypeError):
+            pass
+    return dates
+
+async def _v3_epoch_columns(db):
+    """Reconstrói as tabelas que ainda têm a coluna de data como TEXT, convertendo os valores para epoch."""
+    for table, (column, ddl) in _EPOCH_TABLES.items():
+        declared = await _columns(db, table)
+        if declared.get(column) == "INTEGER":
+            continue
+
+        print(f"[db] Convertendo {table}.{column} para epoch INTEGER...")
+        if table == "weekly_time_history":
+            # Histórico sem data não é apagado: usa o último reset da guilda ou, sem ele, o momento da migração
+            fallback_dates, migrated_at = await _history_fallback_dates(db), now_epoch()
+        old_columns = list(declared.keys())
+        await db.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        await db.execute(ddl)
+        cur = await db.execute(f"SELECT {', '.join(old_columns)} FROM {table}_old")
+        converted = []
+        for row in await cur.fetchall():
+            values = dict(zip(old_columns, row))
+            try:
+                values[column] = to_epoch(values.get(column))
+            except (ValueError, TypeError):
+                values[column] = None
+            if values[column] is None and table == "weekly_time_history":
+                values[column] = fallback_dates.get(values.get("guild_id")) or migrated_at
+            if values[column] is None and table in _DATE_REQUIRED:
+                continue
+            converted.append(values)
+        if converted:
+            columns = list(converted[0].keys())
+            await db.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                [tuple(v[c] for c in columns) for v in converted])
+        await db.execute(f"DROP TABLE {table}_old")
+
+# --- v4: índices ---
+
+async def _v4_indexes(db):
+    # Ranking: contagem de quem está na frente e ordenação por tempo
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_total_times_guild_seconds ON total_times (guild_id, total_seconds DESC)")
+    # Consultas por guilda e por intervalo de tempo
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_sessions_guild ON sessions (guild_id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_giveaways_end_time ON giveaways (end_time)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_history_guild_date ON weekly_time_history (guild_id, reset_date)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_awarded_guild_goal ON awarded_goals (guild_id, goal_id)")
+
+# --- v5: registro persistente dos cards de chamada ---
+
+async def _v5_call_card_messages(db):
+    # Qual mensagem é o card de chamada de cada membro, para reaproveitá-la depois de reiniciar
+    await db.execute("""CREATE TABLE IF NOT EXISTS call_card_messages (
+        guild_id INTEGER, user_id INTEGER, channel_id INTEGER, message_id INTEGER,
+        PRIMARY KEY(guild_id, user_id))""")
+
+# --- v6: estado do bot (heartbeat) ---
+
+async def _v6_bot_state(db):
+    # Pares chave/valor do próprio bot; 'heartbeat' é o último epoch em que o bot gravou um checkpoint
+    await db.execute("""CREATE TABLE IF NOT EXISTS bot_state (
+        key TEXT PRIMARY KEY, value INTEGER)""")
+
+# --- v7: canais de voz que não contam tempo ---
+
+async def _v7_excluded_voice_channels(db):
+    await db.execute("""CREATE TABLE IF NOT EXISTS excluded_voice_channels (
+        guild_id INTEGER, channel_id INTEGER,
+        PRIMARY KEY(guild_id, channel_id))""")
+
+# --- v8: tempo de voz por hora, dia e semana ---
+
+_ACTIVITY_TABLES = (("voice_activity_hourly", "hour_start"),
+                    ("voice_activity_daily", "day_start"),
+                    ("voice_activity_weekly", "week_start"))
+
+async def _v8_voice_activity(db):
+    # Não são apagadas pelo reset semanal; os rankings de qualquer período saem daqui
+    for table, column in _ACTIVITY_TABLES:
+        await db.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+            guild_id INTEGER, user_id INTEGER, channel_id INTEGER, {column} INTEGER, seconds INTEGER,
+            PRIMARY KEY(guild_id, user_id, channel_id, {column}))""")
+        await db.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_guild_period ON {table} (guild_id, {column})")
+
+# --- v9: log de eventos de voz ---
+
+async def _v9_voice_events(db):
+    # Só recebe INSERT. kind: 'join', 'leave' (start_time = início da sessão) ou 'reset' (reset semanal da guilda)
+    await db.execute("""CREATE TABLE IF NOT EXISTS voice_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER, user_id INTEGER, channel_id INTEGER,
+        kind TEXT, at INTEGER, start_time INTEGER)""")
+
+# Lista ordenada de (versão, descrição, passo). Só acrescente no final.
+MIGRATIONS = [
+    (1, "tabelas base", _v1_base_tables),
+    (2, "goals.required_role_ids", _v2_goal_required_roles),
+    (3, "datas em epoch INTEGER", _v3_epoch_columns),
+    (4, "índices de ranking, sessões, sorteios, histórico e metas", _v4_indexes),
+    (5, "call_card_messages", _v5_call_card_messages),
+    (6, "bot_state", _v6_bot_state),
+    (7, "excluded_voice_channels", _v7_excluded_voice_channels),
+    (8, "tempo de voz por hora, dia e semana", _v8_voice_activity),
+    (9, "voice_events", _v9_voice_events),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# --- PostgreSQL ---
+# IDs do Discord não cabem em INTEGER (32 bits) no PostgreSQL, então tudo que é ID ou epoch é BIGINT.
+# O banco já nasce no formato final, então as versões 2 e 3 não têm o que fazer.
+
+async def _pg_v1_base_tables(db):
+    await db.execute("""CREATE TABLE IF NOT EXISTS sessions (
+        user_id BIGINT, guild_id BIGINT, channel_id BIGINT, start_time BIGINT,
+        PRIMARY KEY(user_id,guild_id) )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS total_times (
+        user_id BIGINT, guild_id BIGINT, total_seconds BIGINT,
+        PRIMARY KEY(user_id,guild_id) )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS log_channels (
+        guild_id BIGINT, channel_type TEXT, channel_id BIGINT,
+        PRIMARY KEY(guild_id,channel_type) )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS goals (
+        id BIGSERIAL PRIMARY KEY, guild_id BIGINT, name TEXT,
+        seconds_required BIGINT, role_id BIGINT, required_role_id BIGINT,
+        reset_on_weekly INTEGER DEFAULT 1, required_role_ids TEXT )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS awarded_goals (
+        user_id BIGINT, guild_id BIGINT, goal_id BIGINT, awarded_at BIGINT,
+        PRIMARY KEY(user_id,guild_id,goal_id) )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS weekly_reset_config (
+        guild_id BIGINT PRIMARY KEY, weekday INTEGER, hour INTEGER, minute INTEGER )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS reset_state (
+        guild_id BIGINT PRIMARY KEY, last_reset BIGINT )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS prohibited_channels (
+        guild_id BIGINT, channel_id BIGINT, PRIMARY KEY(guild_id, channel_id) )""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS weekly_time_history (
+        guild_id BIGINT, user_id BIGINT, total_seconds BIGINT, reset_date BIGINT, pinned INTEGER DEFAULT 0,
+        PRIMARY KEY(guild_id, user_id, reset_date))""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS history_config (
+        guild_id BIGINT PRIMARY KEY, post_channel_id BIGINT, retention_days INTEGER DEFAULT 90)""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS giveaways (
+        message_id BIGINT PRIMARY KEY, guild_id BIGINT NOT NULL, channel_id BIGINT NOT NULL, end_time BIGINT NOT NULL,
+        winner_count INTEGER NOT NULL, prize TEXT, required_roles TEXT)""")
+    await db.execute("""CREATE TABLE IF NOT EXISTS giveaway_participants (
+        message_id BIGINT, user_id BIGINT, PRIMARY KEY (message_id, user_id))""")
+
+async def _pg_nothing_to_do(db):
+    pass
+
+async def _pg_v5_call_card_messages(db):
+    await db.execute("""CREATE TABLE IF NOT EXISTS call_card_messages (
+        guild_id BIGINT, user_id BIGINT, channel_id BIGINT, message_id BIGINT,
+        PRIMARY KEY(guild_id, user_id))""")
+
+async def _pg_v6_bot_state(db):
+    await db.execute("""CREATE TABLE IF NOT EXISTS bot_state (
+        key TEXT PRIMARY KEY, value BIGINT)""")
+
+async def _pg_v7_excluded_voice_channels(db):
+    await db.execute("""CREATE TABLE IF NOT EXISTS excluded_voice_channels (
+        guild_id BIGINT, channel_id BIGINT,
+        PRIMARY KEY(guild_id, channel_id))""")
+
+async def _pg_v8_voice_activity(db):
+    for table, column in _ACTIVITY_TABLES:
+        await db.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+            guild_id BIGINT, user_id BIGINT, channel_id BIGINT, {column} BIGINT, seconds BIGINT,
+            PRIMARY KEY(guild_id, user_id, channel_id, {column}))""")
+        await db.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_guild_period ON {table} (guild_id, {column})")
+
+async def _pg_v9_voice_events(db):
+    await db.execute("""CREATE TABLE IF NOT EXISTS voice_events (
+        id BIGSERIAL PRIMARY KEY, guild_id BIGINT, user_id BIGINT, channel_id BIGINT,
+        kind TEXT, at BIGINT, start_time BIGINT)""")
+
+POSTGRES_MIGRATIONS = [
+    (1, "tabelas base", _pg_v1_base_tables),
+    (2, "goals.required_role_ids", _pg_nothing_to_do),
+    (3, "datas em epoch INTEGER", _pg_nothing_to_do),
+    (4, "índices de ranking, sessões, sorteios, histórico e metas", _v4_indexes),
+    (5, "call_card_messages", _pg_v5_call_card_messages),
+    (6, "bot_state", _pg_v6_bot_state),
+    (7, "excluded_voice_channels", _pg_v7_excluded_voice_channels),
+    (8, "tempo de voz por hora, dia e semana", _pg_v8_voice_activity),
+    (9, "voice_events", _pg_v9_voice_events),
+]
+
+_MIGRATIONS_BY_DIALECT = {"sqlite": MIGRATIONS, "postgres": POSTGRES_MIGRATIONS}
+
+# Consulta que diz se a tabela schema_version já existe, em cada dialeto
+_SCHEMA_TABLE_EXISTS = {
+    "sqlite": "SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_version'",
+    "postgres": "SELECT 1 FROM information_schema.tables WHERE table_schema=current_schema() AND table_name='schema_version'",
+}
+
+async def get_schema_version(db, dialect="sqlite"):
+    """Retorna a versão aplicada do esquema (0 para um banco sem a tabela schema_version)."""
+    cur = await db.execute(_SCHEMA_TABLE_EXISTS[dialect])
+    if not await cur.fetchone():
+        return 0
+    cur = await db.execute("SELECT MAX(version) FROM schema_version")
+    row = await cur.fetchone()
+    return int(row[0]) if row and row[0] is not None else 0
+
+async def apply_migrations(db, dialect="sqlite"):
+    """Aplica, em ordem, todos os passos com versão maior que a atual."""
+    migrations = _MIGRATIONS_BY_DIALECT[dialect]
+    current = await get_schema_version(db, dialect)
+    if current >= migrations[-1][0]:
+        return current
+
+    await db.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, applied_at BIGINT)")
+    await db.commit()
+    for version, description, step in migrations:
+        if version <= current:
+            continue
+        print(f"[db] Aplicando migração {version}: {description}")
+        # BEGIN explícito: no sqlite3 o DDL não abre transação sozinho
+        await db.execute("BEGIN")
+        try:
+            await step(db)
+            await db.execute("INSERT INTO schema_version (version, applied_at) VALUES (?, ?)", (version, now_epoch()))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        current = version
+    return current
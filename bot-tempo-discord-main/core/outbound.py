@@ -0,0 +1,125 @@
+import asyncio
+import heapq
+import itertools
+import time
+import traceback
+
+from config import OUTBOUND_CHANNEL_INTERVAL, OUTBOUND_MAX_CONCURRENCY
+
+# Prioridades (menor sai primeiro)
+PRIORITY_INTERACTIVE = 0  # respostas a quem acabou de clicar/usar um comando
+PRIORITY_NOTIFY = 1       # avisos de metas, reset, resultados de sorteio
+PRIORITY_BACKGROUND = 2   # atualização periódica dos cards de chamada
+
+class _Job:
+    __slots__ = ("action", "future", "coalesce_key", "priority", "started")
+
+    def __init__(self, action, future, coalesce_key, priority):
+        self.action = action
+        self.future = future
+        self.coalesce_key = coalesce_key
+        self.priority = priority
+        self.started = False
+
+class _Channel:
+    """Fila de um canal (o bucket de rate limit do Discord para envios/edições é por canal)."""
+    __slots__ = ("heap", "pending", "next_at", "worker")
+
+    def __init__(self):
+        self.heap = []          # (prioridade, ordem, job)
+        self.pending = {}       # coalesce_key -> job ainda não iniciado
+        self.next_at = 0.0      # quando a próxima chamada pode sair (time.monotonic)
+        self.worker = None
+
+class OutboundScheduler:
+    """
+    Fila central das chamadas à API do Discord que enviam ou editam mensagens.
+    - Cada canal tem sua fila, ordenada por prioridade (e por ordem de chegada dentro da mesma prioridade).
+    - Entre duas chamadas no mesmo canal há pelo menos 'channel_interval' segundos, no lugar dos sleeps soltos.
+    - Edições com a mesma 'coalesce_key' que ainda não saíram viram uma só e todos os que pediram recebem
+      o mesmo resultado. Vale a mais nova, desde que a prioridade dela seja igual ou mais urgente; senão a
+      nova é descartada (uma atualização de fundo nunca substitui uma edição mais importante na fila).
+    - No máximo 'max_concurrency' chamadas em andamento ao mesmo tempo, somando todos os canais.
+    """
+    def __init__(self, channel_interval: float, max_concurrency: int):
+        self.channel_interval = max(0.0, channel_interval)
+        self._channels = {}
+        self._order = itertools.count()
+        self._slots = None
+        self._max_concurrency = max(1, int(max_concurrency))
+
+    async def run(self, channel_id, action, *, priority=PRIORITY_BACKGROUND, coalesce_key=None):
+        """
+        Enfileira 'action' (função sem argumentos que retorna a corrotina da chamada, ex: lambda: ch.send(...))
+        no canal 'channel_id' e espera o resultado. Exceções da chamada (NotFound etc.) chegam a quem chamou.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_concurrency)
+        channel = self._channels.setdefault(channel_id, _Channel())
+
+        job = channel.pending.get(coalesce_key) if coalesce_key is not None else None
+        if job is not None and not job.started and not job.future.done():
+            # Junta com a edição que ainda está na fila: vale o conteúdo mais novo, a não ser que ele
+            # seja menos urgente (aí fica o que já estava na fila, e quem chamou recebe o resultado dele)
+            if priority <= job.priority:
+                job.action = action
+                if priority < job.priority:
+                    job.priority = priority
+                    heapq.heappush(channel.heap, (priority, next(self._order), job))
+        else:
+            job = _Job(action, asyncio.get_running_loop().create_future(), coalesce_key, priority)
+            if coalesce_key is not None:
+                channel.pending[coalesce_key] = job
+            heapq.heappush(channel.heap, (priority, next(self._order), job))
+
+        if channel.worker is None or channel.worker.done():
+            channel.worker = asyncio.get_running_loop().create_task(self._drain(channel_id, channel))
+        # shield: se quem chamou for cancelado, a chamada (que pode ter sido juntada com outras) continua
+        return await asyncio.shield(job.future)
+
+    async def _drain(self, channel_id, channel):
+        try:
+            while True:
+                if not channel.heap:
+                    # Segura o canal até o intervalo passar, para a próxima chamada também respeitar o ritmo
+                    wait = channel.next_at - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    if not channel.heap:
+                        break
+                _, _, job = heapq.heappop(channel.heap)
+                # Já executado (entrada repetida de um job juntado) ou ninguém mais espera
+                if job.started or job.future.done():
+                    continue
+                job.started = True
+                if job.coalesce_key is not None and channel.pending.get(job.coalesce_key) is job:
+                    del channel.pending[job.coalesce_key]
+
+                wait = channel.next_at - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                async with self._slots:
+                    try:
+                        result = await job.action()
+                    except Exception as e:
+                        job.future.set_exception(e)
+                    else:
+                        job.future.set_result(result)
+                channel.next_at = time.monotonic() + self.channel_interval
+        except Exception as e:
+            print(f"[outbound] Erro na fila do canal {channel_id}: {e}")
+            traceback.print_exc()
+        finally:
+            if not channel.heap and self._channels.get(channel_id) is channel:
+                del self._channels[channel_id]
+
+# Instância única usada pelos cogs e pelo agendador
+outbound = OutboundScheduler(OUTBOUND_CHANNEL_INTERVAL, OUTBOUND_MAX_CONCURRENCY)
+
+async def reply(ctx, *args, **kwargs):
+    """ctx.reply pela fila, com prioridade interativa: a resposta a um comando sai antes dos avisos e cards do canal."""
+    return await outbound.run(ctx.channel.id, lambda: ctx.reply(*args, **kwargs), priority=PRIORITY_INTERACTIVE)
+
+async def send(ctx, *args, **kwargs):
+    """ctx.send pela fila, com prioridade interativa (mesmo que reply, sem citar o comando)."""
+    return await outbound.run(ctx.channel.id, lambda: ctx.send(*args, **kwargs), priority=PRIORITY_INTERACTIVE)
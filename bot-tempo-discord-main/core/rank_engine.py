@@ -0,0 +1,80 @@
+import bisect
+from collections import OrderedDict
+
+from config import RANK_CACHE_MAX_GUILDS
+
+class GuildRankIndex:
+    """
+    Ranking em memória de uma guilda: uma lista ordenada de chaves (-total_seconds, user_id).
+    A posição de um usuário é encontrada com busca binária, sem ordenar nada de novo.
+    Em caso de empate no tempo, o menor user_id fica na frente (mesma regra da consulta SQL).
+    """
+    def __init__(self, totals: dict):
+        self._totals = {int(u): int(s or 0) for u, s in totals.items()}
+        self._keys = sorted((-s, u) for u, s in self._totals.items())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def rank(self, user_id):
+        """Posição (1 = primeiro) do usuário, ou None se ele não está no ranking."""
+        seconds = self._totals.get(user_id)
+        if seconds is None:
+            return None
+        return bisect.bisect_left(self._keys, (-seconds, user_id)) + 1
+
+    def total(self, user_id):
+        """Tempo total do usuário (0 se ele não está no ranking)."""
+        return self._totals.get(user_id, 0)
+
+    def add(self, user_id, delta: int):
+        """Soma 'delta' segundos ao usuário e reposiciona só a chave dele."""
+        old = self._totals.get(user_id)
+        if old is not None:
+            i = bisect.bisect_left(self._keys, (-old, user_id))
+            del self._keys[i]
+        new = (old or 0) + int(delta)
+        self._totals[user_id] = new
+        bisect.insort(self._keys, (-new, user_id))
+
+    def ordered(self):
+        """Lista (user_id, total_seconds) do maior tempo para o menor."""
+        return [(u, -s) for s, u in self._keys]
+
+class RankEngine:
+    """
+    Guarda um GuildRankIndex por guilda, carregado sob demanda e atualizado a cada end_session.
+    Só as guildas usadas mais recentemente ficam em memória.
+    """
+    def __init__(self, max_guilds: int):
+        self.max_guilds = max(1, int(max_guilds))
+        self._guilds = OrderedDict()
+
+    def get(self, guild_id):
+        """Retorna o índice carregado da guilda ou None."""
+        index = self._guilds.get(guild_id)
+        if index is not None:
+            self._guilds.move_to_end(guild_id)
+        return index
+
+    def install(self, guild_id, totals: dict):
+        """Substitui o índice da guilda a partir de um snapshot {user_id: total_seconds}."""
+        index = GuildRankIndex(totals)
+        self._guilds[guild_id] = index
+        self._guilds.move_to_end(guild_id)
+        while len(self._guilds) > self.max_guilds:
+            self._guilds.popitem(last=False)
+        return index
+
+    def apply_delta(self, guild_id, user_id, delta: int):
+        """Aplica um incremento de tempo se a guilda estiver carregada (senão o próximo carregamento já o verá)."""
+        index = self._guilds.get(guild_id)
+        if index is not None and delta > 0:
+            index.add(user_id, delta)
+
+    def invalidate(self, guild_id):
+        """Descarta o índice da guilda (ex: depois do reset semanal apagar os tempos)."""
+        self._guilds.pop(guild_id, None)
+
+# Instância única usada por core/database.py
+rank_engine = RankEngine(RANK_CACHE_MAX_GUILDS)
@@ -0,0 +1,79 @@
+import asyncio
+import traceback
+
+from config import RESYNC_GUILD_CONCURRENCY
+
+from utils.helpers import now_epoch
+from .database import list_excluded_voice_channels
+from .voice_accounting import voice_accountant, voice_slot
+from .session_store import session_store
+from .write_behind import session_journal
+
+def voice_members(guild, excluded_channels=()):
+    """{user_id: (channel_id, conta_tempo)} de quem está em call agora (sem bots), segundo o gateway."""
+    return {m.id: voice_slot(m.voice, guild, excluded_channels)
+            for vc in guild.voice_channels for m in vc.members if not m.bot}
+
+async def reconcile_guild_sessions(guild, closed_at: int, now: int, cut: bool = False):
+    """
+    Compara as sessões registradas da guilda com quem está de fato em call, passando cada membro
+    pelo voice_accountant (os segmentos em memória continuam batendo com as sessões).
+    Só muda quem está diferente do que foi registrado:
+      - sessão de quem saiu (ou foi para outro canal, ou ficou ocioso): fechada em 'closed_at' (último momento conhecido)
+      - quem está em call contando tempo sem sessão naquele canal: sessão aberta em 'now'
+    Quem continua no mesmo canal contando tempo (ou continua ocioso) fica como está, sem nenhuma escrita.
+    Com 'cut', os eventos do intervalo se perderam de vez (bot fora do ar, sessão nova do gateway):
+    toda sessão aberta é fechada em 'closed_at' e reaberta em 'now', e o período sem eventos não conta.
+    As mudanças vão para a memória e são gravadas juntas, num único lote do journal.
+    Retorna (fechadas, abertas).
+    """
+    live = voice_members(guild, await list_excluded_voice_channels(guild.id))
+    tracked = session_store.for_guild(guild.id)
+    in_call = voice_accountant.tracked(guild.id)
+
+    closed = opened = 0
+    for user_id in set(tracked) | set(live) | in_call:
+        slot = live.get(user_id, (None, False))
+        session = tracked.get(user_id)
+        if session is not None:
+            unchanged = slot == (session[0], True)
+        else:
+            # Sem sessão: nada muda se continua fora da call, ou em call sem contar tempo
+            unchanged = not slot[1] and (slot[0] is not None) == (user_id in in_call)
+        if unchanged and (not cut or closed_at >= now):
+            continue
+        did_close, did_open = await voice_accountant.resync(guild.id, user_id, slot, closed_at, now)
+        closed += did_close
+        opened += did_open
+
+    if closed or opened:
+        # Uma transação por guilda
+        await session_journal.flush()
+    return closed, opened
+
+async def reconcile_all_guilds(bot, closed_at=None, cut=True):
+    """
+    Roda a reconciliação em todas as guildas, no máximo RESYNC_GUILD_CONCURRENCY ao mesmo tempo.
+    Sem 'closed_at', usa o último heartbeat gravado antes desta inicialização (ou, num banco sem
+    heartbeat, o início mais recente entre as sessões carregadas). Depois de uma reconexão,
+    'closed_at' é o momento em que a conexão caiu. 'cut' é repassado a reconcile_guild_sessions.
+    """
+    now = now_epoch()
+    if closed_at is None:
+        closed_at = session_store.last_heartbeat or session_store.latest_start() or now
+    closed_at = min(closed_at, now)
+
+    slots = asyncio.Semaphore(RESYNC_GUILD_CONCURRENCY)
+    async def run(guild):
+        async with slots:
+            try:
+                return await reconcile_guild_sessions(guild, closed_at, now, cut)
+            except Exception as e:
+                print(f"[reconcile] Erro ao reconciliar as sessões da guilda {guild.id}: {e}")
+                traceback.print_exc()
+                return 0, 0
+
+    results = await asyncio.gather(*(run(guild) for guild in bot.guilds))
+    total_closed = sum(closed for closed, _ in results)
+    total_opened = sum(opened for _, opened in results)
+    print(f"[reconcile] Sessões reconciliadas: {total_closed} fechada(s) em {closed_at}, {total_opened} aberta(s).")
@@ -0,0 +1,133 @@
+"""
+Reconstrói total_times, o histórico semanal e as tabelas de atividade a partir do log voice_events.
+Rode com o bot desligado, a partir da pasta do bot:
+
+    python -m core.replay                  # só mostra o que mudaria
+    python -m core.replay --apply          # grava
+    python -m core.replay --guild 123 --apply
+
+Só o tempo registrado no log é reconstruído: tempos acumulados antes de o log existir são perdidos com --apply.
+"""
+import argparse
+import asyncio
+
+from .db_pool import db_pool
+from .database import init_db
+from .activity_rollup import split_hours, rollup, HOURLY, DAILY, WEEKLY
+
+# Quantos eventos são lidos por vez (o log nunca é carregado inteiro na memória)
+READ_BATCH = 5000
+# Quantas horas de atividade se acumulam em memória antes de serem gravadas
+WRITE_BATCH = 20000
+
+class ReplayState:
+    """Estado acumulado ao percorrer o log em ordem."""
+    def __init__(self):
+        self.totals = {}        # (guild_id, user_id) -> segundos desde o último reset
+        self.activity = {}      # (guild_id, user_id, channel_id, hour_start) -> segundos ainda não gravados
+        self.history = []       # (guild_id, user_id, total_seconds, reset_date)
+        self.events = 0
+
+    def apply(self, guild_id, user_id, channel_id, kind, at, start_time):
+        self.events += 1
+        if kind == "leave" and start_time is not None:
+            duration = int(at) - int(start_time)
+            if duration <= 0:
+                return
+            key = (guild_id, user_id)
+            self.totals[key] = self.totals.get(key, 0) + duration
+            for hour_start, seconds in split_hours(start_time, at):
+                bucket = (guild_id, user_id, channel_id, hour_start)
+                self.activity[bucket] = self.activity.get(bucket, 0) + seconds
+        elif kind == "reset":
+            # Mesma ordem do reset semanal: arquiva os tempos da guilda e zera
+            for key in [k for k in self.totals if k[0] == guild_id]:
+                self.history.append((guild_id, key[1], self.totals.pop(key), int(at)))
+
+async def _stream_events(db, guild_id):
+    """Lê o log em ordem de id, em páginas (paginação por chave: cada página usa o índice da chave primária)."""
+    last_id = 0
+    scope = " AND guild_id=?" if guild_id is not None else ""
+    while True:
+        params = (last_id, guild_id) if guild_id is not None else (last_id,)
+        cur = await db.execute(
+            f"SELECT id, guild_id, user_id, channel_id, kind, at, start_time FROM voice_events "
+            f"WHERE id > ?{scope} ORDER BY id LIMIT {READ_BATCH}", params)
+        rows = await cur.fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+async def _write_activity(db, activity):
+    for (table, column), rows in zip((HOURLY, DAILY, WEEKLY), rollup(activity)):
+        await db.executemany(
+            f"INSERT INTO {table} (guild_id, user_id, channel_id, {column}, seconds) VALUES (?, ?, ?, ?, ?) "
+            f"ON CONFLICT(guild_id, user_id, channel_id, {column}) DO UPDATE SET seconds = {table}.seconds + excluded.seconds",
+            rows)
+
+async def replay_voice_events(guild_id=None, apply=False):
+    """
+    Percorre o log e reconstrói os tempos. Com apply=True, substitui (numa única transação)
+    total_times, as tabelas de atividade e os totais do histórico da guilda (ou de todas).
+    Retorna o ReplayState final.
+    """
+    state = ReplayState()
+    scope = " WHERE guild_id=?" if guild_id is not None else ""
+    scope_params = (guild_id,) if guild_id is not None else ()
+    async with db_pool.acquire() as db:
+        if apply:
+            await db.execute("BEGIN")
+            for table, _ in (HOURLY, DAILY, WEEKLY):
+                await db.execute(f"DELETE FROM {table}{scope}", scope_params)
+
+        async for rows in _stream_events(db, guild_id):
+            for _, *event in rows:
+                state.apply(*event)
+            if len(state.activity) >= WRITE_BATCH:
+                if apply:
+                    await _write_activity(db, state.activity)
+                state.activity = {}
+
+        if not apply:
+            return state
+
+        await _write_activity(db, state.activity)
+        state.activity = {}
+        await db.execute(f"DELETE FROM total_times{scope}", scope_params)
+        await db.executemany("INSERT INTO total_times (user_id, guild_id, total_seconds) VALUES (?, ?, ?)",
+                             [(u, g, s) for (g, u), s in state.totals.items()])
+        # Atualiza só o total: linhas fixadas continuam fixadas
+        await db.executemany(
+            "INSERT INTO weekly_time_history (guild_id, user_id, total_seconds, reset_date) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(guild_id, user_id, reset_date) DO UPDATE SET total_seconds = excluded.total_seconds",
+            state.history)
+        await db.commit()
+    return state
+
+async def _current_totals(guild_id):
+    scope = " WHERE guild_id=?" if guild_id is not None else ""
+    async with db_pool.acquire() as db:
+        cur = await db.execute(f"SELECT guild_id, user_id, total_seconds FROM total_times{scope}",
+                               (guild_id,) if guild_id is not None else ())
+        return {(g, u): int(s or 0) for g, u, s in await cur.fetchall()}
+
+async def _main(args):
+    await db_pool.open()
+    try:
+        await init_db()
+        before = await _current_totals(args.guild)
+        state = await replay_voice_events(args.guild, apply=args.apply)
+        changed = sum(1 for key in set(before) | set(state.totals) if before.get(key, 0) != state.totals.get(key, 0))
+        print(f"[replay] {state.events} evento(s) lido(s); {len(state.totals)} total(is) reconstruído(s), "
+              f"{changed} diferente(s) do banco; {len(state.history)} linha(s) de histórico.")
+        if not args.apply:
+            print("[replay] Nada foi gravado (use --apply para gravar).")
+    finally:
+        await db_pool.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstrói os tempos a partir do log voice_events.")
+    parser.add_argument("--guild", type=int, default=None, help="só esta guilda")
+    parser.add_argument("--apply", action="store_true", help="grava o resultado (sem isso é só simulação)")
+    asyncio.run(_main(parser.parse_args()))
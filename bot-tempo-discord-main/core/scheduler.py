@@ -2,13 +2,16 @@ import asyncio
 import traceback
 from datetime import datetime, timezone, timedelta
 import discord
-import aiosqlite
 
 # Importa as configurações e funções de banco de dados necessárias
-from config import DB_PATH, LOCAL_TZ
+from config import LOCAL_TZ
+from core.write_behind import session_journal
+from core.voice_accounting import voice_accountant
+from core.rank_engine import rank_engine
+from core.outbound import outbound, PRIORITY_NOTIFY
 from core.database import (get_reset_config, get_last_reset, set_last_reset, list_goals, get_log_channel, 
-archive_weekly_times, get_history_config, cleanup_old_history, get_weekly_history, get_active_sessions, end_session)
-from utils.image_generator import gerar_leaderboard_card
+archive_weekly_times, get_history_config, cleanup_old_history, get_weekly_history, get_active_sessions)
+from utils.image_generator import renderizar_leaderboard
 
 # Dicionário auxiliar para converter nomes de dias em números (0=Segunda, 6=Domingo)
 _DIAS = {"seg":0,"ter":1,"qua":2,"qui":3,"sex":4,"sab":5,"dom":6}
@@ -44,33 +47,32 @@ def _next_weekly_dt(now_utc: datetime, weekday: int, hour: int, minute: int):
 async def _weekly_reset_run_for_guild(guild: discord.Guild, bot_instance):
     try:
         now_utc = datetime.now(timezone.utc)
-<<<<<<< HEAD
-
-        # Finaliza as sessões ativas para garantir que todo o tempo seja contado
-        active_user_ids = await get_active_sessions(guild.id)
-        for user_id in active_user_ids:
-            await end_session(user_id, guild.id, now_utc.isoformat())
-
-        # Salva o ranking final da semana que acabou (substituindo o antigo)
-        await save_last_week_ranking(guild.id)
-
-        # Reseta os tempos para a nova semana
+        now_ts = int(now_utc.timestamp())
         rows_goals = await list_goals(guild.id)
-        async with aiosqlite.connect(DB_PATH) as db:
-            await db.execute("DELETE FROM total_times WHERE guild_id=?", (guild.id,))
-            resetable_goal_ids = [r[0] for r in rows_goals if r and r[5] == 1]
-=======
-        now_utc_iso = now_utc.isoformat()
+        resetable_goal_ids = [r[0] for r in rows_goals if r and int(r[5]) == 1]
 
-        # Busca todos os usuários que estão em uma sessão ativa.
-        active_user_ids = await get_active_sessions(guild.id)
+        async def close_week():
+            # Corta as sessões ativas no instante do reset: o tempo até aqui fica na semana que acabou
+            # e quem continua em call segue contando na semana nova
+            for user_id in await get_active_sessions(guild.id):
+                await voice_accountant.split(guild.id, user_id, now_ts)
 
-        # Finaliza a sessão de cada um para salvar o tempo deles na tabela principal.
-        for user_id in active_user_ids:
-            await end_session(user_id, guild.id, now_utc_iso)
+        async def archive_and_reset(db):
+            # Arquiva os tempos da semana (agora completos e corretos) e zera para a nova semana.
+            await archive_weekly_times(guild.id, now_ts, db)
+            await db.execute("DELETE FROM total_times WHERE guild_id=?", (guild.id,))
+            if resetable_goal_ids:
+                qmarks = ",".join("?" for _ in resetable_goal_ids)
+                await db.execute(f"DELETE FROM awarded_goals WHERE guild_id=? AND goal_id IN ({qmarks})", (guild.id, *resetable_goal_ids))
+            # Registra o reset no log de eventos, na mesma transação que zera os tempos
+            await db.execute("INSERT INTO voice_events (guild_id, kind, at) VALUES (?, ?, ?)",
+                             (guild.id, "reset", now_ts))
 
-        # Arquiva os tempos da semana (agora completos e corretos).
-        await archive_weekly_times(guild.id, now_utc_iso)
+        # A fila do journal, o arquivamento e o DELETE vão numa única transação, com os lotes parados:
+        # nada da semana que acabou é gravado depois do DELETE, e nada da semana nova é apagado por ele
+        await session_journal.cut(close_week, archive_and_reset)
+        # Os tempos foram zerados, então o ranking em memória da guilda é descartado
+        rank_engine.invalidate(guild.id)
 
         # Busca a configuração do histórico para esta guilda.
         config = await get_history_config(guild.id)
@@ -84,53 +86,33 @@ async def _weekly_reset_run_for_guild(guild: discord.Guild, bot_instance):
                 _, rows = await get_weekly_history(guild.id)
                 if rows:
                     try:
-                        loop = bot_instance.loop # Usar o loop do bot
-                        buf = await loop.run_in_executor(None, gerar_leaderboard_card, rows, guild, 1)
+                        buf = await renderizar_leaderboard(bot_instance.http_session, rows, guild, 1)
                         reset_date_obj = now_utc.strftime("%d/%m/%Y")
-                        await channel.send(
+                        await outbound.run(channel.id, lambda: channel.send(
                             content=f"## 🏆 Ranking Final da Semana - {reset_date_obj} 🏆",
                             file=discord.File(fp=buf, filename="ranking_semanal.png")
-                        )
+                        ), priority=PRIORITY_NOTIFY)
                     except Exception as e:
                         print(f"[scheduler] Erro ao gerar ou enviar a imagem de ranking para {guild.name}: {e}")
 
         # Limpa o histórico antigo (não fixado).
         await cleanup_old_history(guild.id, retention_days)
 
-        # Reseta os tempos para a nova semana.
-        rows_goals = await list_goals(guild.id)
-        async with aiosqlite.connect(DB_PATH) as db:
-            await db.execute("DELETE FROM total_times WHERE guild_id=?", (guild.id,))
-            resetable_goal_ids = [r[0] for r in rows_goals if r and int(r[5]) == 1]
->>>>>>> 25ef76a395daef396a31e04fbabb33c249b193da
-            if resetable_goal_ids:
-                qmarks = ",".join("?" for _ in resetable_goal_ids)
-                await db.execute(f"DELETE FROM awarded_goals WHERE guild_id=? AND goal_id IN ({qmarks})", (guild.id, *resetable_goal_ids))
-            await db.commit()
-<<<<<<< HEAD
-        
         # Envia a notificação de reset no canal configurado
         log_channel_id = await get_log_channel(guild.id, "resetlog")
         if log_channel_id:
             channel = guild.get_channel(log_channel_id)
             if channel:
-                await channel.send("🔁 **O ranking semanal de tempo em call foi resetado!**\nUse `!rankingsemanal` para ver os resultados finais da última semana.")
-
-        await set_last_reset(guild.id, now_utc)
-        print(f"[reset] Reset e arquivamento simplificado executados para a guilda {guild.id} ({guild.name}).")
-    except Exception as e:
-        print(f"[reset] Erro ao executar o reset para a guilda {getattr(guild,'id',None)}: {e}")
-=======
+                await outbound.run(channel.id, lambda: channel.send("🔁 **O ranking semanal de tempo em call foi resetado!**\nUse `!rankingsemanal` para ver os resultados finais da última semana."), priority=PRIORITY_NOTIFY)
 
         goallog_id = await get_log_channel(guild.id, "goallog")
         ch_log = guild.get_channel(goallog_id) if goallog_id else None
-        if ch_log: await ch_log.send("🔁 Reset semanal executado. O tempo de voz de todos os membros foi zerado.")
+        if ch_log: await outbound.run(ch_log.id, lambda: ch_log.send("🔁 Reset semanal executado. O tempo de voz de todos os membros foi zerado."), priority=PRIORITY_NOTIFY)
 
         await set_last_reset(guild.id, now_utc)
         print(f"[reset] Reset e arquivamento executados para guild {guild.id} ({guild.name}).")
     except Exception as e:
         print(f"[reset] Erro ao executar reset para guild {getattr(guild,'id',None)}: {e}")
->>>>>>> 25ef76a395daef396a31e04fbabb33c249b193da
         traceback.print_exc()
 
 async def weekly_reset_scheduler(bot):
@@ -160,6 +142,6 @@ async def weekly_reset_scheduler(bot):
                 # Condição para executar o reset:
                 # Se a hora atual já passou da hora alvo E (não houve reset anterior OU o último reset foi antes do alvo)
                 if now_utc >= target_utc and (not last or last < target_utc):
-                    await _weekly_reset_run_for_guild(guild)
+                    await _weekly_reset_run_for_guild(guild, bot)
             except Exception as e:
                 print(f"Erro no scheduler para a guilda {guild.id}: {e}")
\ No newline at end of file
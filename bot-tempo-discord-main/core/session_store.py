@@ -0,0 +1,83 @@
+from .db_pool import db_pool
+
+class SessionStore:
+    """
+    Registro em memória das sessões de voz ativas: guild_id -> {user_id: (channel_id, start_time)}.
+    É a fonte da verdade das sessões enquanto o bot roda; a tabela 'sessions' é só um checkpoint,
+    gravado em lote pelo journal (core/write_behind.py) e relido com load() na inicialização.
+    """
+    def __init__(self):
+        self._guilds = {}
+        # (user_id, guild_id) que mudaram desde o último checkpoint
+        self._dirty = set()
+        # Último heartbeat gravado antes desta inicialização (epoch ou None)
+        self.last_heartbeat = None
+
+    async def load(self):
+        """Carrega as sessões do último checkpoint. Deve rodar antes do bot começar a receber eventos."""
+        async with db_pool.acquire() as db:
+            cur = await db.execute("SELECT user_id, guild_id, channel_id, start_time FROM sessions")
+            rows = await cur.fetchall()
+            cur = await db.execute("SELECT value FROM bot_state WHERE key=?", ("heartbeat",))
+            heartbeat = await cur.fetchone()
+        self.last_heartbeat = int(heartbeat[0]) if heartbeat and heartbeat[0] is not None else None
+        self._guilds = {}
+        for user_id, guild_id, channel_id, start_time in rows:
+            if start_time is not None:
+                self._guilds.setdefault(guild_id, {})[user_id] = (channel_id, int(start_time))
+        self._dirty.clear()
+        print(f"[sessions] {len(rows)} sessão(ões) ativa(s) carregada(s) do banco.")
+
+    def start(self, user_id, guild_id, channel_id, start_time: int):
+        """Inicia (ou troca o canal de) uma sessão."""
+        self._guilds.setdefault(guild_id, {})[user_id] = (channel_id, start_time)
+        self._dirty.add((user_id, guild_id))
+
+    def end(self, user_id, guild_id):
+        """Remove a sessão e a retorna (channel_id, start_time), ou None se não havia sessão."""
+        sessions = self._guilds.get(guild_id)
+        session = sessions.pop(user_id, None) if sessions else None
+        if session is not None:
+            self._dirty.add((user_id, guild_id))
+        return session
+
+    def get(self, user_id, guild_id):
+        """Retorna (channel_id, start_time) da sessão ativa ou None."""
+        sessions = self._guilds.get(guild_id)
+        return sessions.get(user_id) if sessions else None
+
+    def latest_start(self):
+        """Início mais recente entre todas as sessões (epoch ou None)."""
+        return max((start for sessions in self._guilds.values() for _, start in sessions.values()), default=None)
+
+    def for_guild(self, guild_id):
+        """Cópia de {user_id: (channel_id, start_time)} das sessões ativas da guilda."""
+        return dict(self._guilds.get(guild_id, {}))
+
+    # --- Checkpoint ---
+
+    def has_changes(self):
+        return bool(self._dirty)
+
+    def take_changes(self):
+        """
+        Retorna e limpa as mudanças desde o último checkpoint:
+        (chaves encerradas [(user_id, guild_id)], sessões ativas [(user_id, guild_id, channel_id, start_time)]).
+        """
+        keys, self._dirty = self._dirty, set()
+        ended, started = [], []
+        for user_id, guild_id in keys:
+            session = self.get(user_id, guild_id)
+            if session is None:
+                ended.append((user_id, guild_id))
+            else:
+                started.append((user_id, guild_id, session[0], session[1]))
+        return ended, started
+
+    def restore_changes(self, ended, started):
+        """Devolve mudanças de um checkpoint que falhou (o estado atual da memória é que será gravado)."""
+        self._dirty.update(ended)
+        self._dirty.update((u, g) for u, g, _, _ in started)
+
+# Instância única usada por core/database.py e pelo journal
+session_store = SessionStore()
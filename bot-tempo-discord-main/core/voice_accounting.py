@@ -0,0 +1,139 @@
+from config import VOICE_IDLE_WHEN_DEAF, VOICE_IDLE_WHEN_MUTED
+from .database import start_session, end_session
+from .session_store import session_store
+
+def is_credited(state, guild, excluded_channels) -> bool:
+    """Se um estado de voz conta tempo: fora do canal AFK e dos canais excluídos, e sem estar surdo (ou mutado, se configurado)."""
+    channel = state.channel if state else None
+    if channel is None:
+        return False
+    if guild.afk_channel is not None and channel.id == guild.afk_channel.id:
+        return False
+    if channel.id in excluded_channels:
+        return False
+    if VOICE_IDLE_WHEN_DEAF and (state.self_deaf or state.deaf):
+        return False
+    if VOICE_IDLE_WHEN_MUTED and (state.self_mute or state.mute):
+        return False
+    return True
+
+def voice_slot(state, guild, excluded_channels):
+    """Resume um estado de voz em (channel_id ou None, conta_tempo)."""
+    channel = state.channel if state else None
+    if channel is None:
+        return (None, False)
+    return (channel.id, is_credited(state, guild, excluded_channels))
+
+class CallTally:
+    """Uma call de um membro, da entrada à saída: segundos creditados e ociosos até agora."""
+    __slots__ = ("joined_at", "segment_start", "credited", "idle")
+
+    def __init__(self, joined_at: int):
+        self.joined_at = joined_at
+        self.segment_start = joined_at
+        self.credited = 0
+        self.idle = 0
+
+class VoiceAccountant:
+    """
+    Contabiliza o tempo em call de cada membro como uma sequência de segmentos:
+    'creditados' (contam para o total) e 'ociosos' (surdo, canal AFK, canal excluído...).
+    Só um segmento creditado tem sessão aberta; ao fechar, a duração vai para o total em memória
+    (journal + ranking), que é gravado em lote. Nenhuma transição lê o banco.
+    """
+    def __init__(self):
+        # (guild_id, user_id) -> CallTally de quem está em call
+        self._calls = {}
+
+    def _tally(self, guild_id, user_id, now):
+        tally = self._calls.get((guild_id, user_id))
+        if tally is None:
+            # Call iniciada antes desta inicialização: o segmento atual começa na sessão ativa, se houver
+            session = session_store.get(user_id, guild_id)
+            tally = self._calls[(guild_id, user_id)] = CallTally(int(session[1]) if session else now)
+        return tally
+
+    async def apply(self, guild_id, user_id, before, after, now: int):
+        """
+        Passa o membro do estado 'before' para 'after' (ambos (channel_id, conta_tempo), ver voice_slot).
+        Retorna o CallTally da call quando o membro saiu da voz; senão None.
+        """
+        if before == after:
+            return None
+        before_channel, before_credited = before
+        after_channel, after_credited = after
+
+        tally = None
+        if before_channel is not None:
+            # Fecha o segmento atual
+            tally = self._tally(guild_id, user_id, now)
+            if before_credited:
+                start_ts = await end_session(user_id, guild_id, now)
+                if start_ts is not None:
+                    tally.credited += max(0, now - int(start_ts))
+            else:
+                tally.idle += max(0, now - tally.segment_start)
+
+        if after_channel is None:
+            self._calls.pop((guild_id, user_id), None)
+            return tally
+
+        # Abre o próximo segmento
+        if tally is None:
+            tally = self._calls[(guild_id, user_id)] = CallTally(now)
+        tally.segment_start = now
+        if after_credited:
+            await start_session(user_id, guild_id, after_channel, now)
+        return None
+
+    async def resync(self, guild_id, user_id, slot, closed_at: int, now: int):
+        """
+        Ressincroniza um membro depois de um período sem eventos (bot fora do ar, queda do gateway,
+        mudança na lista de canais excluídos). 'slot' é o estado atual segundo o gateway (ver voice_slot).
+        O segmento aberto é fechado em 'closed_at' (último momento conhecido) e, se o membro continua
+        em call, um novo segmento começa em 'now': o intervalo entre os dois não conta nem como ocioso.
+        Retorna (fechou_sessão, abriu_sessão).
+        """
+        key = (guild_id, user_id)
+        session = session_store.get(user_id, guild_id)
+        tally = self._calls.get(key)
+        if session is None and tally is None and slot[0] is None:
+            return False, False
+
+        if session is not None:
+            tally = self._tally(guild_id, user_id, now)
+            # Nunca fecha antes do início, então uma sessão aberta depois de 'closed_at' conta 0s
+            end_ts = max(int(session[1]), closed_at)
+            await end_session(user_id, guild_id, end_ts)
+            tally.credited += end_ts - int(session[1])
+        elif tally is not None:
+            tally.idle += max(0, closed_at - tally.segment_start)
+
+        channel_id, credited = slot
+        if channel_id is None:
+            self._calls.pop(key, None)
+            return session is not None, False
+        if tally is None:
+            tally = self._calls[key] = CallTally(now)
+        tally.segment_start = now
+        if credited:
+            await start_session(user_id, guild_id, channel_id, now)
+        return session is not None, credited
+
+    async def split(self, guild_id, user_id, at: int):
+        """Fecha a sessão aberta em 'at' e abre outra no mesmo canal no mesmo instante (corte do reset semanal)."""
+        session = session_store.get(user_id, guild_id)
+        if session is None:
+            return
+        tally = self._tally(guild_id, user_id, at)
+        await end_session(user_id, guild_id, at)
+        tally.credited += max(0, at - int(session[1]))
+        tally.segment_start = at
+        await start_session(user_id, guild_id, session[0], at)
+
+    def tracked(self, guild_id):
+        """Ids dos membros da guilda com uma call em andamento."""
+        return {user_id for gid, user_id in self._calls if gid == guild_id}
+
+# Instância única usada por cogs/listeners.py
+voice_accountant = VoiceAccountant()
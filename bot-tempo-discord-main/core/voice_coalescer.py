@@ -0,0 +1,66 @@
+import asyncio
+import traceback
+
+class VoiceEventCoalescer:
+    """
+    Junta as mudanças de estado de voz (canal, conta tempo ou não) de cada membro antes de processá-las.
+    Os eventos de um mesmo membro ficam acumulados até passar 'window_ms' sem evento novo;
+    então o handler roda uma única vez, do estado de ANTES do primeiro evento até o estado
+    de DEPOIS do último. Ex: sair e voltar rápido vira "nada mudou"; A->B->C vira uma troca A->C.
+    Cada membro tem no máximo um worker, então as transições dele nunca rodam em paralelo.
+    """
+    def __init__(self, window_ms: int, handler):
+        self.window = max(0, window_ms) / 1000
+        # handler(key, before_channel, after_channel, at, payload)
+        self._handler = handler
+        # key -> {'before', 'after', 'at', 'payload', 'version'}
+        self._pending = {}
+        self._workers = {}
+        # Quando ligado, os workers param de esperar a janela e processam na hora
+        self._flushing = asyncio.Event()
+
+    def submit(self, key, before_channel, after_channel, at: int, payload=None):
+        """Registra uma mudança de estado. 'at' é o epoch do evento; o primeiro do lote é o que vale."""
+        batch = self._pending.get(key)
+        if batch is None:
+            self._pending[key] = {'before': before_channel, 'after': after_channel, 'at': at, 'payload': payload, 'version': 0}
+        else:
+            batch['after'] = after_channel
+            batch['payload'] = payload
+            batch['version'] += 1
+        if key not in self._workers:
+            self._workers[key] = asyncio.get_running_loop().create_task(self._drain(key))
+
+    async def _wait_quiet(self, key):
+        """Espera até o membro ficar 'window' segundos sem mandar evento novo."""
+        while not self._flushing.is_set():
+            seen = self._pending[key]['version']
+            try:
+                await asyncio.wait_for(self._flushing.wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+            if self._pending[key]['version'] == seen:
+                return
+
+    async def _run_batch(self, key, batch):
+        try:
+            await self._handler(key, batch['before'], batch['after'], batch['at'], batch['payload'])
+        except Exception as e:
+            print(f"[voice] Erro ao processar eventos de voz de {key}: {e}")
+            traceback.print_exc()
+
+    async def _drain(self, key):
+        try:
+            while key in self._pending:
+                await self._wait_quiet(key)
+                await self._run_batch(key, self._pending.pop(key))
+        finally:
+            self._workers.pop(key, None)
+
+    async def flush(self):
+        """Processa na hora tudo o que está acumulado (usado ao descarregar o cog)."""
+        self._flushing.set()
+        try:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+        finally:
+            self._flushing.clear()
@@ -0,0 +1,187 @@
+import asyncio
+import traceback
+from contextlib import asynccontextmanager
+
+from config import SESSION_FLUSH_INTERVAL_MS, HEARTBEAT_INTERVAL
+from utils.helpers import now_epoch
+from .db_pool import db_pool
+from .session_store import session_store
+from .activity_rollup import split_hours, rollup, HOURLY, DAILY, WEEKLY
+
+class SessionJournal:
+    """
+    Fila write-behind para as escritas de sessões de voz.
+    Os incrementos de 'total_times' ficam em memória e são gravados juntos, numa única transação,
+    a cada poucas centenas de milissegundos, junto com o checkpoint das sessões ativas (core/session_store.py).
+    As leituras do mesmo processo consultam a fila antes do banco (read-your-writes).
+    A cada 'heartbeat_every' segundos o lote também grava o heartbeat do bot em 'bot_state'.
+    O tempo de cada sessão também é dividido por hora e canal; no lote, essas horas são somadas
+    nas tabelas de atividade por hora, dia e semana (core/activity_rollup.py).
+    Entradas e saídas também vão para o log 'voice_events' (só acrescenta), base do replay (core/replay.py).
+    """
+    def __init__(self, interval_ms: int, heartbeat_every: int):
+        self.interval = max(0.05, interval_ms / 1000)
+        self.heartbeat_every = max(1, int(heartbeat_every))
+        self._last_heartbeat = 0
+        # (user_id, guild_id) -> segundos a somar em total_times
+        self._deltas = {}
+        # Lote que está sendo gravado agora; continua visível para leitura até o commit
+        self._inflight_deltas = {}
+        # (guild_id, user_id, channel_id, hour_start) -> segundos a somar nas tabelas de atividade
+        self._activity = {}
+        self._inflight_activity = {}
+        # Linhas de voice_events na ordem em que aconteceram: (guild_id, user_id, channel_id, kind, at, start_time)
+        self._events = []
+        # Impede que um commit aconteça no meio de uma leitura que mescla banco + fila
+        self._commit_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    # --- Escritas (síncronas, só mexem na memória) ---
+
+    def record_end(self, user_id, guild_id, duration: int):
+        """Enfileira o tempo de uma sessão encerrada que deve ser somado ao total."""
+        if duration > 0:
+            key = (user_id, guild_id)
+            self._deltas[key] = self._deltas.get(key, 0) + duration
+
+    def record_event(self, guild_id, user_id, channel_id, kind: str, at: int, start_time=None):
+        """Enfileira um evento para o log voice_events ('join', ou 'leave' com o início da sessão)."""
+        self._events.append((guild_id, user_id, channel_id, kind, at, start_time))
+
+    def record_activity(self, user_id, guild_id, channel_id, start_ts: int, end_ts: int):
+        """Enfileira o intervalo de uma sessão encerrada, já dividido por hora, para as tabelas de atividade."""
+        for hour_start, seconds in split_hours(start_ts, end_ts):
+            key = (guild_id, user_id, channel_id, hour_start)
+            self._activity[key] = self._activity.get(key, 0) + seconds
+
+    # --- Leituras da fila ---
+
+    def pending_delta(self, user_id, guild_id):
+        """Segundos ainda não gravados em total_times para o usuário."""
+        key = (user_id, guild_id)
+        return self._deltas.get(key, 0) + self._inflight_deltas.get(key, 0)
+
+    def pending_deltas_for_guild(self, guild_id):
+        """Incrementos ainda não gravados de todos os usuários de uma guilda."""
+        merged = {}
+        for deltas in (self._inflight_deltas, self._deltas):
+            for (user_id, gid), seconds in deltas.items():
+                if gid == guild_id:
+                    merged[user_id] = merged.get(user_id, 0) + seconds
+        return merged
+
+    def pending_activity(self, guild_id, start_ts: int, end_ts: int):
+        """Horas ainda não gravadas da guilda dentro de [start_ts, end_ts): [(user_id, channel_id, hour_start, segundos)]."""
+        return [(u, c, h, seconds)
+                for activity in (self._inflight_activity, self._activity)
+                for (g, u, c, h), seconds in activity.items()
+                if g == guild_id and start_ts <= h < end_ts]
+
+    @asynccontextmanager
+    async def reading(self):
+        """
+        Envolve uma leitura do banco que será mesclada com a fila.
+        Pegue a conexão do pool ANTES de entrar aqui, para nunca esperar o pool segurando o lock.
+        """
+        async with self._commit_lock:
+            yield
+
+    # --- Gravação em lote ---
+
+    async def flush(self, heartbeat=False):
+        """Grava os incrementos da fila e o checkpoint das sessões numa única transação."""
+        async with self._flush_lock:
+            await self._write_batch(heartbeat)
+
+    async def cut(self, prepare, then):
+        """
+        Corte consistente da fila (reset semanal). Com os lotes parados, roda 'await prepare()'
+        (ex: fecha as sessões no instante do corte), grava a fila inteira e, na mesma transação,
+        'await then(db)' (ex: arquiva e zera os tempos). O que for enfileirado depois do corte só é
+        gravado no lote seguinte, depois do commit. Se a transação falhar, o erro é repassado.
+        """
+        async with self._flush_lock:
+            await prepare()
+            await self._write_batch(False, then)
+
+    async def _write_batch(self, heartbeat, then=None):
+        now = now_epoch()
+        heartbeat = heartbeat or now - self._last_heartbeat >= self.heartbeat_every
+        if then is None and not self._deltas and not self._activity and not self._events and not session_store.has_changes() and not heartbeat:
+            return
+        events, self._events = self._events, []
+        self._inflight_deltas, self._deltas = self._deltas, {}
+        self._inflight_activity, self._activity = self._activity, {}
+        deltas, activity = self._inflight_deltas, self._inflight_activity
+        ended, started = session_store.take_changes()
+        try:
+            async with db_pool.acquire() as db:
+                increments = [(u, g, s) for (u, g), s in deltas.items()]
+                if events:
+                    await db.executemany(
+                        "INSERT INTO voice_events (guild_id, user_id, channel_id, kind, at, start_time) VALUES (?, ?, ?, ?, ?, ?)",
+                        events)
+                if ended:
+                    await db.executemany("DELETE FROM sessions WHERE user_id=? AND guild_id=?", ended)
+                if started:
+                    await db.executemany("INSERT OR REPLACE INTO sessions (user_id, guild_id, channel_id, start_time) VALUES (?, ?, ?, ?)", started)
+                if increments:
+                    await db.executemany(
+                        "INSERT INTO total_times (user_id, guild_id, total_seconds) VALUES (?, ?, ?) "
+                        "ON CONFLICT(user_id, guild_id) DO UPDATE SET total_seconds = total_times.total_seconds + excluded.total_seconds",
+                        increments)
+                if activity:
+                    for (table, column), rows in zip((HOURLY, DAILY, WEEKLY), rollup(activity)):
+                        await db.executemany(
+                            f"INSERT INTO {table} (guild_id, user_id, channel_id, {column}, seconds) VALUES (?, ?, ?, ?, ?) "
+                            f"ON CONFLICT(guild_id, user_id, channel_id, {column}) DO UPDATE SET seconds = {table}.seconds + excluded.seconds",
+                            rows)
+                if heartbeat:
+                    await db.execute("INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)", ("heartbeat", now))
+                if then is not None:
+                    await then(db)
+                async with self._commit_lock:
+                    await db.commit()
+                    self._inflight_deltas = {}
+                    self._inflight_activity = {}
+                if heartbeat:
+                    self._last_heartbeat = now
+        except Exception as e:
+            print(f"[journal] Erro ao gravar lote de sessões, ele será tentado de novo: {e}")
+            traceback.print_exc()
+            # Devolve o lote para a fila sem sobrescrever o que chegou depois
+            session_store.restore_changes(ended, started)
+            self._events = events + self._events
+            for key, seconds in deltas.items():
+                self._deltas[key] = self._deltas.get(key, 0) + seconds
+            for key, seconds in activity.items():
+                self._activity[key] = self._activity.get(key, 0) + seconds
+            self._inflight_deltas = {}
+            self._inflight_activity = {}
+            if then is not None:
+                raise
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        """Inicia a tarefa que grava a fila periodicamente."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Para a tarefa periódica e grava o que restou na fila (usado no desligamento)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(heartbeat=True)
+
+# Instância única usada pelas funções de core/database.py
+session_journal = SessionJournal(SESSION_FLUSH_INTERVAL_MS, HEARTBEAT_INTERVAL)
@@ -3,7 +3,12 @@ import logging
 import aiohttp
 from config import TOKEN
 from core.database import init_db
+from core.db_pool import db_pool
+from core.write_behind import session_journal
+from core.session_store import session_store
 from core.bot_setup import BotInitializer
+from utils.image_generator import preparar_recursos
+from utils.render_pool import render
 
 #configura um log básico para ver os eventos do discord.py no console
 logging.basicConfig(level=logging.INFO)
@@ -13,17 +18,31 @@ async def main():
     função principal que inicializa o banco de dados e o bot
     """
 
-    #garante que as tabelas do banco de dados existam antes de tudo
-    await init_db()
+    #abre as conexões persistentes do banco antes de qualquer consulta
+    await db_pool.open()
+    try:
+        #garante que as tabelas do banco de dados existam antes de tudo
+        await init_db()
+        #carrega as sessões de voz ativas do último checkpoint para a memória
+        await session_store.load()
+        #começa a gravar em lote as escritas de sessões de voz
+        session_journal.start()
+        #decodifica os templates e carrega as fontes dos cards uma vez só, antes do primeiro card
+        await render(preparar_recursos)
 
-    #cria uma sessão aiohttp que será usada pelo bot para downloads
-    #o 'async with' garante que a sessão seja fechada corretamente no final
-    async with aiohttp.ClientSession() as session:
-        #cria a instância principal do bot, passando a sessão criada
-        bot_runner = BotInitializer(http_session=session)
+        #cria uma sessão aiohttp que será usada pelo bot para downloads
+        #o 'async with' garante que a sessão seja fechada corretamente no final
+        async with aiohttp.ClientSession() as session:
+            #cria a instância principal do bot, passando a sessão criada
+            bot_runner = BotInitializer(http_session=session)
 
-        #inicia o bot e lida com o desligamento 
-        await bot_runner.run()
+            #inicia o bot e lida com o desligamento 
+            await bot_runner.run()
+    finally:
+        #grava o que ainda está na fila e o checkpoint das sessões para não perder tempo de call no desligamento
+        await session_journal.stop()
+        #fecha as conexões do pool mesmo se o bot cair com erro
+        await db_pool.close()
 
 if __name__ == "__main__":
     # Executa a função principal do bot
@@ -0,0 +1,97 @@
+import asyncio
+import io
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# Os testes rodam a partir da pasta do bot, com um banco SQLite temporário (antes de importar config)
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bot-tempo-tests-"), "test.db")
+
+@pytest.fixture
+def run_db():
+    """Roda uma corrotina com o pool aberto e o esquema migrado; fecha o pool no fim."""
+    from core.db_pool import db_pool
+    from core.database import init_db
+
+    def run(scenario):
+        async def wrapper():
+            await db_pool.open()
+            try:
+                await init_db()
+                return await scenario()
+            finally:
+                await db_pool.close()
+        return asyncio.run(wrapper())
+    return run
+
+def _make_voice_guild(guild_id, channel_id, member_ids):
+    """Guilda falsa com um canal de voz e os membros dados em call (não surdos, não mutados)."""
+    channel = SimpleNamespace(id=channel_id, members=[])
+    channel.members = [
+        SimpleNamespace(id=uid, bot=False, voice=SimpleNamespace(
+            channel=channel, self_deaf=False, deaf=False, self_mute=False, mute=False))
+        for uid in member_ids]
+    return SimpleNamespace(id=guild_id, afk_channel=None, voice_channels=[channel])
+
+@pytest.fixture
+def voice_guild():
+    """Fábrica de guildas falsas para a reconciliação: voice_guild(guild_id, channel_id, [user_ids])."""
+    return _make_voice_guild
+
+@pytest.fixture
+def call_card(monkeypatch):
+    """
+    Cog de listeners com o card de chamada do membro 7 já registrado e as dependências trocadas por falsos.
+    - 'stats': fila dos resultados de get_user_stats, um por chamada
+    - 'renders' / 'edits': o que foi desenhado e editado
+    - 'before_run': chamada antes de cada ação da fila de saída (simula algo acontecendo enquanto ela espera)
+    """
+    import cogs.listeners as listeners
+    from core.card_state import CardStateTracker
+
+    fake = SimpleNamespace(stats=[], renders=[], edits=[], before_run=None)
+
+    async def get_user_stats(user_id, guild_id):
+        return fake.stats.pop(0)
+
+    async def get_log_channel(guild_id, kind):
+        return 5
+
+    async def render(fn, *args):
+        fake.renders.append(args)
+        return io.BytesIO(b"png")
+
+    async def outbound_run(channel_id, action, **kwargs):
+        if fake.before_run:
+            fake.before_run()
+        return await action()
+
+    async def avatar_get_for(session, member, size=None):
+        return None
+
+    monkeypatch.setattr(listeners, "get_user_stats", get_user_stats)
+    monkeypatch.setattr(listeners, "get_log_channel", get_log_channel)
+    monkeypatch.setattr(listeners, "render", render)
+    monkeypatch.setattr(listeners, "outbound", SimpleNamespace(run=outbound_run))
+    monkeypatch.setattr(listeners, "avatar_cache", SimpleNamespace(get_for=avatar_get_for))
+
+    async def edit(**kwargs):
+        fake.edits.append(kwargs)
+
+    message = SimpleNamespace(id=99, edit=edit)
+    channel = SimpleNamespace(id=5, get_partial_message=lambda message_id: message)
+    message.channel = channel
+    fake.guild = SimpleNamespace(id=1, get_channel=lambda _id: channel, get_channel_or_thread=lambda _id: channel)
+    fake.member = SimpleNamespace(id=7, guild=fake.guild, display_name="Ana", display_avatar=SimpleNamespace(url="url"))
+
+    fake.cog = listeners.Listeners.__new__(listeners.Listeners)
+    fake.cog.bot = SimpleNamespace(http_session=None)
+    fake.cog.active_call_messages = {fake.guild.id: {fake.member.id: (channel.id, message.id)}}
+    fake.cog.card_states = CardStateTracker(time_step=60, progress_step=1)
+    return fake
@@ -0,0 +1,61 @@
+import asyncio
+
+from core.card_state import CardStateTracker
+
+def _stats(current, total=7200, rank=3, progress=0.4, goal_id=1, awarded=False):
+    return {'total': total, 'current': current, 'rank': rank,
+            'goals': [{'id': goal_id, 'name': "Meta", 'required': 36000, 'awarded': awarded, 'progress': progress}]}
+
+def test_session_time_alone_does_not_change_the_signature():
+    tracker = CardStateTracker(time_step=60, progress_step=1)
+    first = tracker.signature("Ana", "url", _stats(current=600))
+    tracker.mark((1, 7), first)
+    # Uma rodada depois (CALLCARD_UPDATE_INTERVAL = 180s): só o contador da sessão andou
+    assert tracker.is_current((1, 7), tracker.signature("Ana", "url", _stats(current=780)))
+    # Campos visíveis que mudam de degrau forçam o redesenho
+    assert not tracker.is_current((1, 7), tracker.signature("Ana", "url", _stats(current=780, rank=2)))
+    assert not tracker.is_current((1, 7), tracker.signature("Ana", "url", _stats(current=780, progress=0.42)))
+    assert not tracker.is_current((1, 7), tracker.signature("Ana", "url", _stats(current=780, total=7260)))
+
+def test_changes_inside_a_step_do_not_change_the_signature():
+    tracker = CardStateTracker(time_step=300, progress_step=5)
+    tracker.mark((1, 7), tracker.signature("Ana", "url", _stats(current=0, total=7200, progress=0.40)))
+    # Menos de um degrau de tempo total (300s) e de progresso (5 pontos): o card continua o mesmo
+    assert tracker.is_current((1, 7), tracker.signature("Ana", "url", _stats(current=0, total=7499, progress=0.44)))
+    assert not tracker.is_current((1, 7), tracker.signature("Ana", "url", _stats(current=0, total=7500, progress=0.44)))
+    assert not tracker.is_current((1, 7), tracker.signature("Ana", "url", _stats(current=0, total=7200, progress=0.45)))
+
+def test_next_goal_name_and_avatar_are_part_of_the_signature():
+    tracker = CardStateTracker(time_step=60, progress_step=1)
+    tracker.mark((1, 7), tracker.signature("Ana", "url", _stats(current=0)))
+    # Meta ganha: a próxima meta passa a ser outra (ou nenhuma)
+    assert not tracker.is_current((1, 7), tracker.signature("Ana", "url", _stats(current=0, goal_id=2)))
+    assert not tracker.is_current((1, 7), tracker.signature("Ana", "url", _stats(current=0, awarded=True)))
+    assert not tracker.is_current((1, 7), tracker.signature("Bia", "url", _stats(current=0)))
+    assert not tracker.is_current((1, 7), tracker.signature("Ana", "url2", _stats(current=0)))
+    # Depois de esquecido (membro saiu), o card é desenhado de novo
+    tracker.forget((1, 7))
+    assert not tracker.is_current((1, 7), tracker.signature("Ana", "url", _stats(current=0)))
+
+def test_consecutive_ticks_without_visible_change_skip_the_edit(call_card):
+    call_card.stats = [_stats(current=600), _stats(current=780)]
+
+    async def two_ticks():
+        await call_card.cog._ensure_user_call_message(call_card.member)
+        await call_card.cog._ensure_user_call_message(call_card.member)
+
+    asyncio.run(two_ticks())
+    # A primeira rodada desenha e edita; a segunda só viu o contador da sessão andar e não faz nada
+    assert len(call_card.renders) == 1
+    assert len(call_card.edits) == 1
+
+def test_tick_with_a_visible_change_edits_again(call_card):
+    call_card.stats = [_stats(current=600), _stats(current=780, rank=2)]
+
+    async def two_ticks():
+        await call_card.cog._ensure_user_call_message(call_card.member)
+        await call_card.cog._ensure_user_call_message(call_card.member)
+
+    asyncio.run(two_ticks())
+    assert len(call_card.renders) == 2
+    assert len(call_card.edits) == 2
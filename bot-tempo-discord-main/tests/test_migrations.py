@@ -0,0 +1,105 @@
+import asyncio
+
+import aiosqlite
+import pytest
+
+import core.migrations as migrations
+from core.migrations import _v1_base_tables, _v3_epoch_columns, apply_migrations, get_schema_version, LATEST_VERSION
+
+class _RecordingDb:
+    """Repassa tudo para a conexão real e guarda o SQL executado."""
+    def __init__(self, db):
+        self._db = db
+        self.statements = []
+
+    async def execute(self, sql, *args):
+        self.statements.append(sql.strip().split()[0].upper())
+        return await self._db.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+def test_fresh_database_reaches_the_latest_version(tmp_path):
+    async def run():
+        async with aiosqlite.connect(tmp_path / "fresh.db") as db:
+            assert await get_schema_version(db) == 0
+            version = await apply_migrations(db)
+            cur = await db.execute("SELECT version FROM schema_version ORDER BY version")
+            return version, [r[0] for r in await cur.fetchall()]
+
+    version, applied = asyncio.run(run())
+    assert version == LATEST_VERSION
+    assert applied == list(range(1, LATEST_VERSION + 1))
+
+def test_current_schema_runs_no_ddl(tmp_path):
+    async def run():
+        async with aiosqlite.connect(tmp_path / "current.db") as db:
+            await apply_migrations(db)
+            # Segunda inicialização (ou o init_db repetido do on_ready): só a consulta da versão
+            recording = _RecordingDb(db)
+            version = await apply_migrations(recording)
+            return version, recording.statements
+
+    version, statements = asyncio.run(run())
+    assert version == LATEST_VERSION
+    assert set(statements) == {"SELECT"}
+
+def test_failed_step_is_rolled_back_and_not_recorded(tmp_path, monkeypatch):
+    async def create_table(db):
+        await db.execute("CREATE TABLE primeira (x INTEGER)")
+
+    async def broken(db):
+        await db.execute("CREATE TABLE segunda (x INTEGER)")
+        raise RuntimeError("falhou")
+
+    monkeypatch.setitem(migrations._MIGRATIONS_BY_DIALECT, "sqlite",
+                        [(1, "primeira", create_table), (2, "quebrada", broken)])
+
+    async def run():
+        async with aiosqlite.connect(tmp_path / "broken.db") as db:
+            with pytest.raises(RuntimeError):
+                await apply_migrations(db)
+            cur = await db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('primeira', 'segunda')")
+            return await get_schema_version(db), [r[0] for r in await cur.fetchall()]
+
+    version, tables = asyncio.run(run())
+    # A versão 1 ficou gravada; a 2 foi desfeita inteira e roda de novo na próxima inicialização
+    assert version == 1
+    assert tables == ["primeira"]
+
+def _migrate_v3(path, setup_sql):
+    """Cria um banco com o esquema antigo, roda as migrações 1 e 3 e devolve o histórico resultante."""
+    async def run():
+        async with aiosqlite.connect(path) as db:
+            for sql in setup_sql:
+                await db.execute(sql)
+            # A v1 só cria as tabelas que faltam; as antigas continuam como estavam
+            await _v1_base_tables(db)
+            await _v3_epoch_columns(db)
+            await db.commit()
+            cur = await db.execute("SELECT guild_id, user_id, total_seconds, reset_date, pinned FROM weekly_time_history ORDER BY guild_id, user_id")
+            return [tuple(r) for r in await cur.fetchall()]
+    return asyncio.run(run())
+
+def test_history_without_reset_date_is_backfilled(tmp_path):
+    rows = _migrate_v3(tmp_path / "old.db", [
+        # Esquema antigo: o histórico não tinha reset_date nem pinned
+        "CREATE TABLE reset_state (guild_id INTEGER PRIMARY KEY, last_reset TEXT)",
+        "INSERT INTO reset_state VALUES (1, '2025-09-01T03:00:00+00:00')",
+        "CREATE TABLE weekly_time_history (guild_id INTEGER, user_id INTEGER, total_seconds INTEGER)",
+        "INSERT INTO weekly_time_history VALUES (1, 10, 3600), (1, 11, 60), (2, 20, 120)",
+    ])
+    assert len(rows) == 3
+    # A guilda com reset registrado usa a data do último reset; a outra, o momento da migração
+    assert rows[0][3] == rows[1][3] == 1756695600
+    assert rows[2][3] > 1756695600
+    assert all(pinned == 0 for *_, pinned in rows)
+
+def test_history_with_iso_reset_date_is_converted(tmp_path):
+    rows = _migrate_v3(tmp_path / "iso.db", [
+        "CREATE TABLE weekly_time_history (guild_id INTEGER, user_id INTEGER, total_seconds INTEGER, reset_date TEXT, pinned INTEGER DEFAULT 0, PRIMARY KEY(guild_id, user_id, reset_date))",
+        "INSERT INTO weekly_time_history VALUES (1, 10, 3600, '2025-09-01T03:00:00+00:00', 1), (1, 11, 60, 'lixo', 0)",
+    ])
+    assert rows[0] == (1, 10, 3600, 1756695600, 1)
+    # Data ilegível: a linha continua no histórico, com a data da migração
+    assert rows[1][:3] == (1, 11, 60) and rows[1][3] > 1756695600
@@ -0,0 +1,116 @@
+import asyncio
+
+from core.outbound import OutboundScheduler, PRIORITY_INTERACTIVE, PRIORITY_NOTIFY, PRIORITY_BACKGROUND
+
+def _run_queued(jobs):
+    """
+    Segura o canal com uma chamada em andamento, enfileira 'jobs' [(nome, prioridade, chave)] nessa ordem
+    e solta o canal. Retorna (nomes na ordem em que as chamadas saíram, resultado recebido por cada job).
+    """
+    scheduler = OutboundScheduler(channel_interval=0, max_concurrency=4)
+    executed = []
+
+    def action(name):
+        async def call():
+            executed.append(name)
+            return name
+        return call
+
+    async def scenario():
+        release = asyncio.Event()
+        blocker = asyncio.ensure_future(scheduler.run(1, release.wait))
+        await asyncio.sleep(0)
+        waiting = [asyncio.ensure_future(scheduler.run(1, action(name), priority=priority, coalesce_key=key))
+                   for name, priority, key in jobs]
+        await asyncio.sleep(0)
+        release.set()
+        await blocker
+        return await asyncio.gather(*waiting)
+
+    results = asyncio.run(scenario())
+    return executed, results
+
+def test_same_key_edits_coalesce_into_the_newest():
+    executed, results = _run_queued([
+        ("count-1", PRIORITY_INTERACTIVE, ("edit", 10)),
+        ("count-2", PRIORITY_INTERACTIVE, ("edit", 10)),
+    ])
+    assert executed == ["count-2"]
+    assert results == ["count-2", "count-2"]
+
+def test_background_refresh_does_not_replace_a_pending_notify_edit():
+    # Um refresh de fundo que chega depois não substitui a edição mais urgente que já está na fila
+    executed, results = _run_queued([
+        ("exit-card", PRIORITY_NOTIFY, ("edit", 10)),
+        ("refresh", PRIORITY_BACKGROUND, ("edit", 10)),
+    ])
+    assert executed == ["exit-card"]
+    assert results == ["exit-card", "exit-card"]
+
+def test_more_urgent_edit_replaces_and_moves_ahead():
+    executed, results = _run_queued([
+        ("reply", PRIORITY_NOTIFY, None),
+        ("refresh", PRIORITY_BACKGROUND, ("edit", 10)),
+        ("exit-card", PRIORITY_NOTIFY, ("edit", 10)),
+    ])
+    assert executed == ["reply", "exit-card"]
+    assert results == ["reply", "exit-card", "exit-card"]
+
+def test_call_card_exit_edit_survives_a_late_refresh():
+    # Card de chamada: o card de saída tem chave própria, então um refresh que chega depois
+    # (renderizado antes de o membro sair) não o substitui; o card de saída sai primeiro
+    executed, results = _run_queued([
+        ("exit-card", PRIORITY_NOTIFY, ("exit", 10)),
+        ("refresh", PRIORITY_BACKGROUND, ("edit", 10)),
+    ])
+    assert executed == ["exit-card", "refresh"]
+    assert results == ["exit-card", "refresh"]
+
+def test_giveaway_end_edit_survives_a_late_participant_count():
+    # Sorteio: a contagem de participantes (interativa) chega depois do fim e tem chave própria;
+    # as duas edições saem, e o resultado do sorteio é a última
+    executed, results = _run_queued([
+        ("count", PRIORITY_INTERACTIVE, ("edit", 20)),
+        ("ended", PRIORITY_NOTIFY, ("end", 20)),
+        ("late-count", PRIORITY_INTERACTIVE, ("edit", 20)),
+    ])
+    assert executed == ["late-count", "ended"]
+    assert results == ["late-count", "ended", "late-count"]
+
+def test_queued_card_refresh_skips_a_card_that_already_exited(call_card):
+    call_card.stats = [{'total': 7200, 'current': 600, 'rank': 1, 'goals': []}]
+    registered = call_card.cog.active_call_messages[call_card.guild.id]
+    # O membro sai enquanto o refresh espera na fila: o registro do card some antes da chamada
+    call_card.before_run = lambda: registered.pop(call_card.member.id, None)
+
+    asyncio.run(call_card.cog._ensure_user_call_message(call_card.member))
+    assert len(call_card.renders) == 1
+    assert call_card.edits == []
+
+def test_command_reply_goes_ahead_of_queued_card_refreshes(monkeypatch):
+    from types import SimpleNamespace
+    import core.outbound as outbound_module
+
+    monkeypatch.setattr(outbound_module.outbound, "channel_interval", 0)
+    executed = []
+
+    async def refresh():
+        executed.append("refresh")
+
+    async def ctx_reply(content, **kwargs):
+        executed.append(content)
+
+    ctx = SimpleNamespace(channel=SimpleNamespace(id=30), reply=ctx_reply)
+
+    async def scenario():
+        release = asyncio.Event()
+        blocker = asyncio.ensure_future(outbound_module.outbound.run(30, release.wait))
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(outbound_module.outbound.run(30, refresh, priority=PRIORITY_BACKGROUND))
+        answered = asyncio.ensure_future(outbound_module.reply(ctx, "pong", mention_author=True))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, queued, answered)
+
+    asyncio.run(scenario())
+    assert executed == ["pong", "refresh"]
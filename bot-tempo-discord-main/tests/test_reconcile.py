@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+
+from core.bot_setup import BotInitializer
+from core.database import total_time
+from core.db_pool import db_pool
+from core.session_store import session_store
+from core.voice_accounting import voice_accountant
+from core.write_behind import session_journal
+from utils.helpers import now_epoch
+
+def _reconnected_bot(guilds, disconnected_at):
+    """Só o estado que _resync_after_gap usa, sem conectar no Discord."""
+    setup = BotInitializer.__new__(BotInitializer)
+    setup.bot = SimpleNamespace(guilds=guilds)
+    setup._disconnected_at = disconnected_at
+    setup._resync_lock = asyncio.Lock()
+    return setup
+
+async def _voice_events(guild_id, user_id):
+    async with db_pool.acquire() as db:
+        async with db.execute("SELECT kind FROM voice_events WHERE guild_id=? AND user_id=? ORDER BY id",
+                              (guild_id, user_id)) as cur:
+            return [row[0] for row in await cur.fetchall()]
+
+def test_resume_leaves_unchanged_sessions_alone(run_db, voice_guild):
+    guild_id, user_id, channel_id = 9001, 501, 77
+    guild = voice_guild(guild_id, channel_id, [user_id])
+
+    async def scenario():
+        now = now_epoch()
+        joined_at = now - 3600
+        await voice_accountant.apply(guild_id, user_id, (None, False), (channel_id, True), joined_at)
+        await session_journal.flush()
+
+        # RESUME: o Discord reenvia os eventos perdidos; o membro continua no mesmo canal
+        await _reconnected_bot([guild], now - 3000)._resync_after_gap(cut=False)
+        await session_journal.flush()
+        session = session_store.get(user_id, guild_id)
+        events = await _voice_events(guild_id, user_id)
+
+        tally = await voice_accountant.apply(guild_id, user_id, (channel_id, True), (None, False), now + 60)
+        await session_journal.flush()
+        return session, events, tally, await total_time(user_id, guild_id)
+
+    session, events, tally, total = run_db(scenario)
+    # Sessão intacta e nenhuma escrita além da entrada original; a call inteira conta
+    assert session == (channel_id, tally.joined_at)
+    assert events == ["join"]
+    assert tally.credited == 3660
+    assert total == 3660
+
+def test_member_who_left_during_gap_is_closed_at_disconnect(run_db, voice_guild):
+    guild_id, user_id, channel_id = 9002, 502, 78
+    guild = voice_guild(guild_id, channel_id, [])
+
+    async def scenario():
+        now = now_epoch()
+        await voice_accountant.apply(guild_id, user_id, (None, False), (channel_id, True), now - 1000)
+        await _reconnected_bot([guild], now - 400)._resync_after_gap(cut=False)
+        await session_journal.flush()
+        return session_store.get(user_id, guild_id), await total_time(user_id, guild_id)
+
+    session, total = run_db(scenario)
+    assert session is None
+    assert total == 600
+
+def test_member_who_moved_during_gap_is_reopened_in_the_new_channel(run_db, voice_guild):
+    guild_id, user_id = 9003, 503
+    guild = voice_guild(guild_id, 80, [user_id])
+
+    async def scenario():
+        now = now_epoch()
+        await voice_accountant.apply(guild_id, user_id, (None, False), (79, True), now - 1000)
+        await _reconnected_bot([guild], now - 400)._resync_after_gap(cut=False)
+        await session_journal.flush()
+        return now, session_store.get(user_id, guild_id), await total_time(user_id, guild_id)
+
+    now, session, total = run_db(scenario)
+    assert session[0] == 80 and session[1] >= now
+    assert total == 600
+
+def test_fresh_identify_does_not_credit_the_gap(run_db, voice_guild):
+    guild_id, user_id, channel_id = 9004, 504, 81
+    guild = voice_guild(guild_id, channel_id, [user_id])
+
+    async def scenario():
+        now = now_epoch()
+        joined_at, disconnected_at = now - 3600, now - 3000
+        await voice_accountant.apply(guild_id, user_id, (None, False), (channel_id, True), joined_at)
+
+        # Sessão nova do gateway (on_ready de novo): os eventos do intervalo se perderam
+        await _reconnected_bot([guild], disconnected_at)._resync_after_gap(cut=True)
+        reopened_at = session_store.get(user_id, guild_id)[1]
+        assert reopened_at >= now
+
+        tally = await voice_accountant.apply(guild_id, user_id, (channel_id, True), (None, False), reopened_at + 60)
+        await session_journal.flush()
+        return tally, await total_time(user_id, guild_id)
+
+    tally, total = run_db(scenario)
+    # 600s antes da queda + 60s depois da volta; os 3000s sem conexão não contam
+    assert tally.credited == 660
+    assert tally.idle == 0
+    assert total == 660
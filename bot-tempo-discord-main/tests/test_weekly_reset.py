@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+from core.database import total_time, get_weekly_history, get_last_reset
+from core.db_pool import db_pool
+from core.scheduler import _weekly_reset_run_for_guild
+from core.session_store import session_store
+from core.voice_accounting import voice_accountant
+from core.write_behind import session_journal
+from utils.helpers import now_epoch
+
+def _guild(guild_id):
+    return SimpleNamespace(id=guild_id, name="teste", get_channel=lambda _id: None)
+
+def test_reset_splits_open_sessions_at_the_cut(run_db):
+    guild_id, user_id, channel_id = 9101, 601, 88
+
+    async def scenario():
+        await voice_accountant.apply(guild_id, user_id, (None, False), (channel_id, True), now_epoch() - 600)
+        await _weekly_reset_run_for_guild(_guild(guild_id), SimpleNamespace(http_session=None))
+        _, history = await get_weekly_history(guild_id)
+        session = session_store.get(user_id, guild_id)
+        after_reset = await total_time(user_id, guild_id)
+        tally = await voice_accountant.apply(guild_id, user_id, (channel_id, True), (None, False), session[1] + 60)
+        await session_journal.flush()
+        return history, after_reset, tally, await total_time(user_id, guild_id)
+
+    history, after_reset, tally, total = run_db(scenario)
+    # A semana que acabou ficou com o tempo até o reset; a nova começa do zero e continua contando
+    assert [tuple(r) for r in history] == [(user_id, 600)]
+    assert after_reset == 0
+    assert total == 60
+    assert tally.credited == 660
+
+def test_time_queued_during_the_cut_lands_after_the_delete(run_db):
+    guild_id, user_id = 9102, 602
+
+    async def scenario():
+        session_journal.record_end(user_id, guild_id, 100)
+
+        async def prepare():
+            pass
+
+        async def archive_and_reset(db):
+            await db.execute("DELETE FROM total_times WHERE guild_id=?", (guild_id,))
+            # Uma saída processada enquanto a transação do reset está aberta
+            session_journal.record_end(user_id, guild_id, 30)
+
+        await session_journal.cut(prepare, archive_and_reset)
+        await session_journal.flush()
+        return await total_time(user_id, guild_id)
+
+    # Os 100s da fila antiga foram apagados pelo reset; os 30s de depois do corte ficaram na semana nova
+    assert run_db(scenario) == 30
+
+def test_reset_is_recorded_in_epoch_seconds(run_db):
+    guild_id, user_id = 9103, 603
+
+    async def scenario():
+        session_journal.record_end(user_id, guild_id, 120)
+        before = now_epoch()
+        await _weekly_reset_run_for_guild(_guild(guild_id), SimpleNamespace(http_session=None))
+        async with db_pool.acquire() as db:
+            cur = await db.execute("SELECT last_reset, typeof(last_reset) FROM reset_state WHERE guild_id=?", (guild_id,))
+            state = tuple(await cur.fetchone())
+            cur = await db.execute("SELECT DISTINCT reset_date, typeof(reset_date) FROM weekly_time_history WHERE guild_id=?", (guild_id,))
+            archived = [tuple(r) for r in await cur.fetchall()]
+        reset_date, _ = await get_weekly_history(guild_id)
+        return before, state, archived, reset_date, await get_last_reset(guild_id)
+
+    before, state, archived, reset_date, last_reset = run_db(scenario)
+    # O corte é um único epoch INTEGER: o mesmo no histórico e no estado do reset
+    assert state[1] == "integer" and before <= state[0] <= before + 5
+    assert archived == [(state[0], "integer")]
+    assert reset_date == state[0]
+    assert int(last_reset.timestamp()) == state[0] and last_reset.tzinfo is not None
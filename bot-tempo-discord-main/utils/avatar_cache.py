@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config import (
+    AVATAR_CACHE_DIR, AVATAR_CACHE_MEMORY_ITEMS, AVATAR_CACHE_TTL_HOURS,
+    AVATAR_CACHE_MAX_MB, AVATAR_SIZE
+)
+from .helpers import fetch_avatar_bytes
+
+def avatar_key(member, size=AVATAR_SIZE):
+    """Chave do avatar: user_id + hash do avatar (o hash muda quando o membro troca de avatar) + tamanho."""
+    return f"{member.id}-{member.display_avatar.key}-{size}"
+
+def avatar_url(member, size=AVATAR_SIZE):
+    """URL do avatar em PNG estático no tamanho pedido (potência de 2; menos bytes que o original)."""
+    return str(member.display_avatar.replace(size=size, static_format="png").url)
+
+class AvatarCache:
+    """
+    Cache de avatares em dois níveis, compartilhado pelos cards de chamada, pelo !tempo e pelo ranking:
+      1) memória: LRU com os bytes dos avatares usados mais recentemente
+      2) disco: um arquivo por avatar (nome = sha1 da chave), com validade (TTL) e limite de tamanho total
+    Como a chave inclui o hash do avatar, um avatar em cache nunca fica desatualizado; a rede só é usada
+    na primeira vez que um avatar aparece.
+    """
+    def __init__(self, folder, memory_items: int, ttl_hours: float, max_mb: float):
+        self.folder = folder
+        self.memory_items = max(1, int(memory_items))
+        self.ttl = ttl_hours * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # Downloads em andamento: key -> Future (dois cards do mesmo membro baixam uma vez só)
+        self._inflight = {}
+        # Estimativa do tamanho da pasta; a limpeza só roda quando passa do limite
+        self._disk_bytes = None
+
+    # --- Memória ---
+
+    def _memory_get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            return data
+
+    def _memory_put(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    # --- Disco (chamado fora do loop) ---
+
+    def _path(self, key):
+        return os.path.join(self.folder, hashlib.sha1(key.encode()).hexdigest() + ".img")
+
+    def _disk_get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _disk_put(self, key, data):
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            print(f"[avatars] Não foi possível gravar o avatar em cache: {e}")
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data)
+            over = self._disk_bytes is None or self._disk_bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        """Apaga os arquivos vencidos e, se ainda passar do limite, os mais antigos."""
+        try:
+            entries = []
+            for entry in os.scandir(self.folder):
+                if entry.is_file() and entry.name.endswith(".img"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            return
+        now = time.time()
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if total <= self.max_bytes and now - mtime <= self.ttl:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    # --- Acesso ---
+
+    async def get(self, session, key, url):
+        """Bytes do avatar (memória -> disco -> rede), ou None se não foi possível baixar."""
+        data = self._memory_get(key)
+        if data is not None:
+            return data
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        loop = asyncio.get_running_loop()
+        pending = self._inflight[key] = loop.create_future()
+        try:
+            data = await loop.run_in_executor(None, self._disk_get, key)
+            if data is None:
+                data = await fetch_avatar_bytes(session, url)
+                if data:
+                    await loop.run_in_executor(None, self._disk_put, key, data)
+            if data:
+                self._memory_put(key, data)
+            pending.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            # Ninguém mais esperando: evita o aviso de exceção não lida do Future
+            if pending.done() and not pending.cancelled():
+                pending.exception()
+
+    async def get_for(self, session, member, size=AVATAR_SIZE):
+        """Atalho para um membro do Discord."""
+        return await self.get(session, avatar_key(member, size), avatar_url(member, size))
+
+# Instância única usada pelos cogs e pelo ranking (utils/image_generator.py)
+avatar_cache = AvatarCache(AVATAR_CACHE_DIR, AVATAR_CACHE_MEMORY_ITEMS, AVATAR_CACHE_TTL_HOURS, AVATAR_CACHE_MAX_MB)
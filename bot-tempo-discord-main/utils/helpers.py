@@ -1,11 +1,12 @@
 import os
+from functools import lru_cache
 from datetime import datetime, timezone, timedelta
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 from io import BytesIO
 import aiohttp
 
 #importa o diretório de assets do arquivo de configuração central
-from config import ASSETS_DIR
+from config import ASSETS_DIR, FONT_CACHE_SIZE
 
 def _font_path_in_assets(name):
     """Verifica se um arquivo de fonte existe na pasta fontes"""
@@ -13,11 +14,15 @@ def _font_path_in_assets(name):
     return path if os.path.exists(path) else None
 
 def _load_font_prefer(names, size):
-    """Tenta carregar uma fonte de uma lista, com fallbacks para fontes do sistema"""
+    """Tenta carregar uma fonte de uma lista, com fallbacks para fontes do sistema (cada (lista, tamanho) é carregado uma vez só)"""
+    return _load_font_cached(tuple(names), int(size))
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_font_cached(names, size):
     for name in names:
         font_path = _font_path_in_assets(name)
         if font_path:
-            try: return ImageFont.Truetype(font_path, size)
+            try: return ImageFont.truetype(font_path, size)
             except: pass
     #se não encontrar as fontes, tenta usar fontes padrão do sistema
     for fallback_font in ["arial.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"]:
@@ -41,6 +46,32 @@ def now_iso_utc():
     """Retorna a data e hora atual no formato ISO 8601 com fuso horário UTC"""
     return datetime.now(timezone.utc).isoformat()
 
+def now_epoch():
+    """Retorna a data e hora atual em segundos desde a época (UTC), formato usado no banco"""
+    return int(datetime.now(timezone.utc).timestamp())
+
+def to_epoch(value):
+    """Converte datetime, string ISO ou número para segundos desde a época (UTC). None continua None"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        text = str(value).strip()
+        if text.lstrip("-").isdigit():
+            return int(text)
+        dt = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        #datas sem fuso sempre foram gravadas em UTC
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def from_epoch(ts):
+    """Converte segundos desde a época para um datetime em UTC"""
+    return datetime.fromtimestamp(int(ts), timezone.utc) if ts is not None else None
+
 def _truncate(text, max_chars):
     """Corta um texto se ele for maior que 'max-chars', adicionado '...' no final"""
     if not text: return ""
@@ -86,6 +117,6 @@ def _resize_and_crop_square(img, size):
     #calcula as coordenadas para cortar a imagem pelo centro
     left, top = (w - side) // 2, (h - side) // 2
     #corta a imagem
-    img = img.crop((left, top, left + side, top |+ side))
+    img = img.crop((left, top, left + side, top + side))
     #redimensiona para o tamanho final com um filtro de alta qualidade (LANCZOS)
     return img.resize((size, size), Image.LANCZOS)
\ No newline at end of file
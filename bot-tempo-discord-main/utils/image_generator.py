@@ -1,14 +1,21 @@
 import os
+import asyncio
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 from io import BytesIO
-import requests
 
 #importa a variável de configuração e as funções auxiliares
-from config import ASSETS_DIR
+from config import ASSETS_DIR, AVATAR_PREFETCH_TIMEOUT
 from .helpers import (
     _load_font_prefer, fmt_hms, _truncate, 
-    human_hours_minutes, _resize_and_crop_square
+    human_hours_minutes
 )
+from .render_resources import templates, avatar_sprites, circle_mask
+from .avatar_cache import avatar_cache
+from .render_pool import render
+
+STATS_TEMPLATE = "BOTberengue.png"
+RANK_TEMPLATE = "BOTbereRank.png"
+RANK_PAGE_TEMPLATE = "BOTbereRank2.png"
 
 def gerar_stats_card(username, total_seconds, current_seconds, avatar_bytes=None, rank=None, goals=None):
     """Gera o cartão de estatísticas de tempo para um usuário."""
@@ -19,46 +26,62 @@ def gerar_stats_card(username, total_seconds, current_seconds, avatar_bytes=None
     GOAL_BAR_Y_REL = 0.75; GOAL_BAR_CENTER_X_REL = 0.63; GOAL_BAR_WIDTH_REL = 0.55; GOAL_BAR_HEIGHT_REL = 0.06; GOAL_FONT_REL = 0.019
     TEXT_COLOR = (255, 255, 255, 255); TITLE_COLOR = (200, 200, 200, 255); BAR_BG_COLOR = (40, 40, 45, 255); BAR_FG_COLOR = (255, 255, 255, 255)
 
+    bold_font_files = ["Poppins-Bold.ttf", "Inter-Bold.ttf", "arialbd.ttf"]
+    regular_font_files = ["Poppins-Regular.ttf", "Inter-Regular.ttf", "arial.ttf"]
+    next_goal = next((g for g in goals if not g.get('awarded')), None) if isinstance(goals, list) else None
+
+    #geometria da barra de progresso da próxima meta (depende só do tamanho do template)
+    def bar_geometry(w, h):
+        bar_width = int(w * GOAL_BAR_WIDTH_REL * 0.9)
+        bar_height = max(12, int (h * GOAL_BAR_HEIGHT_REL * 0.55))
+        bar_cx = int(w * GOAL_BAR_CENTER_X_REL)
+        bar_y = int(h * (GOAL_BAR_Y_REL - 0.045))
+        return bar_cx, bar_cx - bar_width // 2, bar_y, bar_width, bar_height, max(6, int(h * 0.03))
+
+    #partes fixas do card: o trilho da barra (com meta) ou o aviso de "nenhuma meta" (sem meta)
+    layout = "meta" if next_goal else "sem_meta"
+    def draw_static(img):
+        w, h = img.size
+        d = ImageDraw.Draw(img)
+        bar_cx, bar_x, bar_y, bar_width, bar_height, radius = bar_geometry(w, h)
+        if layout == "meta":
+            d.rounded_rectangle((bar_x, bar_y, bar_x + bar_width, bar_y + bar_height), radius=radius, fill= BAR_BG_COLOR)
+        else:
+            goal_font = _load_font_prefer(regular_font_files, int (w * GOAL_FONT_REL))
+            d.text((bar_cx, bar_y + bar_height // 2), "Nenhuma meta ativa", font=goal_font, fill=TITLE_COLOR, anchor="mm")
+
     try:
-        #busca o caminho na pasta assets/imgs/
-        template_path = os.path.join(ASSETS_DIR, "imgs", "BOTberengue.png")
-        base = Image.open(template_path).convert("RGBA")
+        #camada estática em cache: template + partes fixas do layout (refeita se o template mudar)
+        base = templates.layer(STATS_TEMPLATE, layout, draw_static)
     except FileNotFoundError:
 
         #se o template não for encontrado, cria uma imagem de fundo padrão
         base = Image.new("RGBA", (1000, 320), (60, 50, 40, 255))
+        draw_static(base)
 
     w, h = base.size
     draw = ImageDraw.Draw(base)
 
     #carrega as fontes que serão usadas para desenhar o texto
-    bold_font_files = ["Poppins-Bold.ttf", "Inter-Bold.ttf", "arialbd.ttf"]
-    regular_font_files = ["Poppins-Regular.ttf", "Inter-Regular.ttf", "arial.ttf"]
     name_font = _load_font_prefer(regular_font_files, int(w * NAME_FONT_REL))
     info_value_font = _load_font_prefer(regular_font_files, int(w * INFO_VALUE_FONT_REL))
     goal_font = _load_font_prefer(regular_font_files, int (w * GOAL_FONT_REL))
 
-    #processa e desenha o avatar do usuário
+    #avatar do usuário já recortado em círculo (sprite em cache por avatar e diâmetro)
     avatar_diam = int(w * AVATAR_DIAMETER_REL)
-    try:
-        if not avatar_bytes: raise ValueError("Bytes do avata não foram fornecidos.")
-        av_img = Image.open(BytesIO(avatar_bytes)).convert("RGBA")
-        av = _resize_and_crop_square(av_img, avatar_diam)
-    except Exception:
+    av = avatar_sprites.get(avatar_bytes, avatar_diam) if avatar_bytes else None
+    if av is None:
         #se não tiver avatar, cria um círculo cinza com as inciais do nome
         av = Image.new("RGBA", (avatar_diam, avatar_diam), (200, 200, 200, 255))
         ad = ImageDraw.Draw(av)
         initials = "".join([p[0] for p in (username or "U").split()[:2]]).upper()
         fbig = _load_font_prefer(bold_font_files, avatar_diam // 2)
         ad.text((avatar_diam/2, avatar_diam/2), initials, font=fbig, fill=(60,60,65,255), anchor="mm")
+        av.putalpha(circle_mask(avatar_diam))
 
-    #cria uma mascará circular para o avatar e a cola na imagem base
     avatar_cx, avatar_cy = int(w * AVATAR_CENTER_REL[0]), int(h * AVATAR_CENTER_REL[1])
     avatar_x, avatar_y = avatar_cx - avatar_diam // 2, avatar_cy - avatar_diam // 2
-    mask = Image.new("L", (avatar_diam, avatar_diam), 0)
-    md = ImageDraw.Draw(mask)
-    md.ellipse((0, 0, avatar_diam, avatar_diam), fill=255)
-    base.paste(av, (avatar_x, avatar_y), mask)
+    base.alpha_composite(av, (avatar_x, avatar_y))
 
     #função interna para simplificar o desenho de texto centralizado
     def draw_centered_text(coords_rel, text, font, fill=TEXT_COLOR):
@@ -71,18 +94,9 @@ def gerar_stats_card(username, total_seconds, current_seconds, avatar_bytes=None
     draw_centered_text((INFO_COL2_X_REL, INFO_VALUE_Y_REL), f"#{rank}" if rank else "-", info_value_font)
     draw_centered_text((INFO_COL3_X_REL, INFO_VALUE_Y_REL), fmt_hms(total_seconds or 0), info_value_font)
 
-    #lógica pra desenhar a barra de progresso da próxima meta
-    next_goal = next((g for g in goals if not g.get('awarded')), None) if isinstance(goals, list) else None
-    bar_width = int(w * GOAL_BAR_WIDTH_REL * 0.9)
-    bar_height = max(12, int (h * GOAL_BAR_HEIGHT_REL * 0.55))
-    bar_cx = int(w * GOAL_BAR_CENTER_X_REL)
-    bar_y = int(h * (GOAL_BAR_Y_REL - 0.045))
-    bar_x = bar_cx - bar_width // 2
-    radius = max(6, int(h * 0.03))
-
-    if not next_goal:
-        draw.text((bar_cx, bar_y + bar_height // 2), "Nenhuma meta ativa", font=goal_font, fill=TITLE_COLOR, anchor="mm")
-    else:
+    #lógica pra desenhar a meta e o progresso por cima do trilho da camada estática
+    bar_cx, bar_x, bar_y, bar_width, bar_height, radius = bar_geometry(w, h)
+    if next_goal:
         goal_name_raw = str(next_goal.get('name', 'Meta'))
         goal_req_secs = next_goal.get('required', 0)
         goal_time_str = f"({human_hours_minutes(goal_req_secs)})"
@@ -113,7 +127,6 @@ def gerar_stats_card(username, total_seconds, current_seconds, avatar_bytes=None
         draw.rounded_rectangle((btn_x, btn_y, btn_x + btn_w, btn_y + btn_h), radius=btn_radius, fill=BAR_BG_COLOR)
         draw.text((btn_x + btn_w / 2, btn_y + btn_h / 2), display_text, font=btn_font, fill=TEXT_COLOR, anchor="mm")
 
-        draw.rounded_rectangle((bar_x, bar_y, bar_x + bar_width, bar_y + bar_height), radius=radius, fill= BAR_BG_COLOR)
         progress = float(next_goal.get('progress', 0.0))
         progress = max(0.0, min(1.0, progress))
 
@@ -135,8 +148,58 @@ def gerar_stats_card(username, total_seconds, current_seconds, avatar_bytes=None
     buf.seek(0)
     return buf
 
-def gerar_leaderboard_card(rows, guild= None, page: int = 1):
-    """gera o cartão de ranking (leaderboard) com as melhores pontuações"""
+# Layout das páginas do ranking: a 1ª tem o pódio (3) + 6 na lista; as outras têm 20 cada
+LEADERBOARD_FIRST_PAGE = 9
+LEADERBOARD_PER_PAGE = 20
+# Tamanho (px) pedido ao discord para os avatares do pódio e das listas (potências de 2, >= tamanho desenhado)
+PODIUM_AVATAR_SIZE = 256
+LIST_AVATAR_SIZE = 64
+
+def leaderboard_page_slots(rows, page: int):
+    """Linhas da página 'page' do ranking, com o tamanho de avatar de cada uma: [(user_id, tamanho), ...]."""
+    if page == 1:
+        return [(k, PODIUM_AVATAR_SIZE if i < 3 else LIST_AVATAR_SIZE) for i, (k, _) in enumerate(rows[:LEADERBOARD_FIRST_PAGE])]
+    start = LEADERBOARD_FIRST_PAGE + (page - 2) * LEADERBOARD_PER_PAGE
+    return [(k, LIST_AVATAR_SIZE) for k, _ in rows[start:start + LEADERBOARD_PER_PAGE]]
+
+def _discard_result(task):
+    """Lê o resultado de um download que ninguém espera (evita o aviso 'Task exception was never retrieved')."""
+    if not task.cancelled():
+        task.exception()
+
+async def prefetch_leaderboard_avatars(session, rows, guild, page: int):
+    """
+    Baixa ao mesmo tempo (pelo cache de avatares) os avatares de todos os membros da página.
+    Espera no máximo AVATAR_PREFETCH_TIMEOUT segundos: quem não chegou a tempo aparece com as iniciais
+    (o download continua, sem ninguém esperando, e fica em cache para a próxima vez; um erro nele é descartado). Retorna {user_id: bytes}.
+    """
+    if guild is None:
+        return {}
+    tasks = {}
+    for key, size in leaderboard_page_slots(rows, page):
+        member = guild.get_member(int(key)) if str(key).isdigit() else None
+        if member:
+            tasks[member.id] = asyncio.ensure_future(avatar_cache.get_for(session, member, size))
+    if not tasks:
+        return {}
+    _, pending = await asyncio.wait(tasks.values(), timeout=AVATAR_PREFETCH_TIMEOUT)
+    for task in pending:
+        # Ninguém vai esperar esses downloads: o resultado (ou erro) é consumido quando terminarem
+        task.add_done_callback(_discard_result)
+    return {user_id: task.result() for user_id, task in tasks.items()
+            if task.done() and not task.cancelled() and task.exception() is None and task.result()}
+
+async def renderizar_leaderboard(session, rows, guild=None, page: int = 1):
+    """Baixa os avatares da página e desenha o ranking no executor de renderização."""
+    avatars = await prefetch_leaderboard_avatars(session, rows, guild, page)
+    return await render(gerar_leaderboard_card, rows, guild, page, avatars)
+
+def gerar_leaderboard_card(rows, guild= None, page: int = 1, avatars=None):
+    """
+    gera o cartão de ranking (leaderboard) com as melhores pontuações.
+    Não acessa a rede: os avatares vêm prontos em 'avatars' ({user_id: bytes}, ver renderizar_leaderboard)
+    """
+    avatars = avatars or {}
     def fmt_hms_long(sec):
         s = int(sec or 0)
         d, s = divmod(s, 86400)
@@ -147,34 +210,25 @@ def gerar_leaderboard_card(rows, guild= None, page: int = 1):
         return f"{m}m {s}s"
     
     def resolve(key):
-        name, avatar_url = str(key), None
+        name, avatar = str(key), None
         if guild and (isinstance(key, int) or (isinstance(key, str) and key.isdigit())):
             m = guild.get_member(int(key))
-            if m: name, avatar_url = m.display_name, str(getattr(m, "display_avatar", m).url)
-        return name, avatar_url
-    
-    def paste_avatar(canvas, cx, cy, sz, url, initials=""):
+            if m: name, avatar = m.display_name, avatars.get(m.id)
+        return name, avatar
+
+    def paste_avatar(canvas, cx, cy, sz, av_bytes, initials=""):
         avatar_inner_sz = int(sz * 0.96)
         x0_avatar, y0_avatar = int(cx - avatar_inner_sz / 2), int(cy - avatar_inner_sz / 2)
-        try:
-            av_bytes = requests.get(url, timeout=4).content if url else None
-        except:
-            av_bytes = None
-
-        circ = Image.new("RGBA", (avatar_inner_sz, avatar_inner_sz))
-        if av_bytes:
-            im = Image.open(BytesIO(av_bytes)).convert("RGBA")
-            im = _resize_and_crop_square(im, avatar_inner_sz)
-            mask = Image.new("L", (avatar_inner_sz, avatar_inner_sz), 0)
-            ImageDraw.Draw(mask).ellipse((0, 0, avatar_inner_sz, avatar_inner_sz), fill=255)
-            circ.paste(im, (0,0), mask)
-        else:
-            d = ImageDraw.Draw(circ)
-            d.ellipse((0, 0, avatar_inner_sz, avatar_inner_sz), fill=(100,100,100,255))
+
+        #sprite circular já pronto (cache por avatar e diâmetro): um único alpha_composite por posição
+        circ = avatar_sprites.get(av_bytes, avatar_inner_sz) if av_bytes else None
+        if circ is None:
+            circ = Image.new("RGBA", (avatar_inner_sz, avatar_inner_sz), (100,100,100,255))
             if initials:
                 f = _load_font_prefer(["Inter-Bold.ttf", "arialbd.ttf"], max(12, int(avatar_inner_sz * 0.4)))
-                d.text((avatar_inner_sz/2, avatar_inner_sz/2), initials, font=f, fill=(200,200,200,255), anchor="mm")
-        canvas.paste(circ, (x0_avatar, y0_avatar), circ)
+                ImageDraw.Draw(circ).text((avatar_inner_sz/2, avatar_inner_sz/2), initials, font=f, fill=(200,200,200,255), anchor="mm")
+            circ.putalpha(circle_mask(avatar_inner_sz))
+        canvas.alpha_composite(circ, (x0_avatar, y0_avatar))
 
     podium_name_f = _load_font_prefer(["Inter-Bold.ttf", "arialbd.ttf"], 30)
     podium_time_f = _load_font_prefer(["Inter-Regular.ttf", "arial.ttf"], 24)
@@ -187,11 +241,10 @@ def gerar_leaderboard_card(rows, guild= None, page: int = 1):
     list_start_y = 675; list_y_step = 92
 
     list_page_avatar_sz = 60; list_page_start_y = 112; list_page_y_step = 91; list_page_avatar_x = [91, 566]; list_page_text_x  = [284, 764]
-    PER_COL = 10; PER_PAGE = PER_COL * 2
+    PER_COL = 10; PER_PAGE = LEADERBOARD_PER_PAGE
 
-    base_filename = "BOTbereRank.png" if page == 1 else "BotbereRank2.png"
-    template_path = os.path.join(ASSETS_DIR, "imgs", base_filename)
-    base = Image.open(template_path).convert("RGBA")
+    #os títulos e as molduras já fazem parte do template: a camada estática é o próprio template em cache
+    base = templates.get(RANK_TEMPLATE if page == 1 else RANK_PAGE_TEMPLATE)
     draw = ImageDraw.Draw(base)
 
     if page == 1:
@@ -200,37 +253,37 @@ def gerar_leaderboard_card(rows, guild= None, page: int = 1):
             rank_index_in_rows = podium_slots_mapping[i]
             if rank_index_in_rows < len(rows):
                 k, sec = rows[rank_index_in_rows]
-                name, url = resolve(k)
+                name, avatar = resolve(k)
                 init = "".join(p[0] for p in name.split()[:2]).upper()
                 cx, cy = podium_avatar_pos[i]; sz = podium_avatar_sz[i]
-                paste_avatar(base, cx, cy, sz, url, init)
+                paste_avatar(base, cx, cy, sz, avatar, init)
                 nm = _truncate(name, 15); draw.text(podium_name_pos[i], nm, font=podium_name_f, fill ="white", anchor="mm")
                 ts = fmt_hms_long(sec); draw.text(podium_time_pos[i], ts, font=podium_time_f, fill="white", anchor="mm")
 
         for i in range(3, 9):
             if i < len(rows):
                 k, sec = rows[i]
-                name, url = resolve(k)
+                name, avatar = resolve(k)
                 init = "".join(p[0] for p in name.split()[:2]).upper()
                 col = 0 if (i - 3) < 3 else 1
                 row_in_col = (i - 3) % 3
                 avatar_cx = list_avatar_left_cx if col == 0 else list_avatar_right_cx
                 text_cx = list_text_left_cx if col == 0 else list_text_right_cx
                 center_y = list_start_y + row_in_col * list_y_step
-                paste_avatar(base, avatar_cx, center_y, list_avatar_sz, url, init)
+                paste_avatar(base, avatar_cx, center_y, list_avatar_sz, avatar, init)
                 name_text = _truncate(name, 18); draw.text((text_cx, center_y - 12), name_text, font=list_name_f, fill="white", anchor="mm")
                 time_text = fmt_hms_long(sec); draw.text((text_cx, center_y + 12), time_text, font=list_time_f, fill="#cccccc", anchor="mm")
     else:
-        start_rank = 9 + (page - 2) * PER_PAGE
+        start_rank = LEADERBOARD_FIRST_PAGE + (page - 2) * PER_PAGE
         display = rows[start_rank : start_rank + PER_PAGE]
         for i, (k, sec) in enumerate(display):
-            name, url = resolve(k)
+            name, avatar = resolve(k)
             init = "".join(p[0] for p in name.split()[:2]).upper()
             col = i // PER_COL
             row_in_col = i % PER_COL
             avatar_cx = list_page_avatar_x[col]; text_cx = list_page_text_x[col]
             center_y = list_page_start_y + row_in_col * list_page_y_step
-            paste_avatar(base, avatar_cx, center_y, list_page_avatar_sz, url, init)
+            paste_avatar(base, avatar_cx, center_y, list_page_avatar_sz, avatar, init)
             rank_and_name = f"#{start_rank + i + 1} {_truncate(name, 18)}"
             draw.text((text_cx, center_y - 12), rank_and_name, font=list_name_f, fill="white", anchor="mm")
             time_text = fmt_hms_long(sec); draw.text((text_cx, center_y + 12), time_text, font=list_time_f, fill="#cccccc", anchor="mm")
@@ -238,4 +291,15 @@ def gerar_leaderboard_card(rows, guild= None, page: int = 1):
     out = BytesIO()
     base.save(out, format="PNG")
     out.seek(0)
-    return out
\ No newline at end of file
+    return out
+
+def preparar_recursos():
+    """
+    Decodifica os templates, monta as camadas estáticas e carrega as fontes de todos os cards antes do
+    primeiro uso (desenha um card de cada tipo e descarta), para a primeira renderização não pagar esse custo.
+    """
+    templates.preload(STATS_TEMPLATE, RANK_TEMPLATE, RANK_PAGE_TEMPLATE)
+    gerar_stats_card("Usuário", 0, 0, None, None, [{'name': "Meta", 'required': 3600, 'awarded': False, 'progress': 0.5}])
+    gerar_stats_card("Usuário", 0, 0, None, None, None)
+    gerar_leaderboard_card([("Usuário", 0)], None, 1)
+    gerar_leaderboard_card([], None, 2)
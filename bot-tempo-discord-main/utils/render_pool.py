@@ -0,0 +1,12 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from config import RENDER_WORKERS
+
+# Executor só para a geração de imagens (Pillow): limita quantos cards são desenhados ao mesmo tempo
+# e não disputa threads com o executor padrão do asyncio (usado pelo aiosqlite, DNS etc.)
+render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+
+async def render(fn, *args):
+    """Roda uma função de geração de imagem no executor de renderização e devolve o resultado."""
+    return await asyncio.get_running_loop().run_in_executor(render_executor, fn, *args)
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image, ImageChops, ImageDraw
+
+from config import ASSETS_DIR, AVATAR_SPRITE_CACHE_ITEMS
+from .helpers import _resize_and_crop_square
+
+class TemplateCache:
+    """
+    Templates PNG de assets/imgs decodificados uma única vez por processo, e as camadas estáticas
+    de cada layout (template + partes fixas já desenhadas). Cada geração de imagem recebe uma cópia,
+    então o original nunca é alterado. Se o arquivo muda no disco (mtime), o template e as camadas são refeitos.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        # nome do arquivo -> (mtime, Image RGBA já decodificada ou None se o arquivo não existe)
+        self._images = {}
+        # (nome do arquivo, layout) -> (mtime do template, Image RGBA com as partes fixas desenhadas)
+        self._layers = {}
+        # Vários threads do render_executor podem pedir o mesmo template ao mesmo tempo
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    def _load(self, name):
+        try:
+            mtime = os.stat(self._path(name)).st_mtime_ns
+        except OSError:
+            mtime = None
+        with self._lock:
+            cached = self._images.get(name)
+            if cached is None or cached[0] != mtime:
+                image = None
+                if mtime is not None:
+                    try:
+                        with Image.open(self._path(name)) as img:
+                            image = img.convert("RGBA")
+                    except FileNotFoundError:
+                        pass
+                cached = self._images[name] = (mtime, image)
+            return cached
+
+    def get(self, name):
+        """Retorna uma cópia do template, ou levanta FileNotFoundError se o arquivo não existe."""
+        _, image = self._load(name)
+        if image is None:
+            raise FileNotFoundError(self._path(name))
+        return image.copy()
+
+    def layer(self, name, layout, draw_static):
+        """
+        Cópia do template com as partes fixas do 'layout' já desenhadas. draw_static(image) desenha essas
+        partes e só roda na primeira vez (ou quando o arquivo do template muda). FileNotFoundError se não existe.
+        """
+        mtime, image = self._load(name)
+        if image is None:
+            raise FileNotFoundError(self._path(name))
+        key = (name, layout)
+        with self._lock:
+            cached = self._layers.get(key)
+        if cached is None or cached[0] != mtime:
+            static = image.copy()
+            draw_static(static)
+            cached = (mtime, static)
+            with self._lock:
+                self._layers[key] = cached
+        return cached[1].copy()
+
+    def preload(self, *names):
+        for name in names:
+            self._load(name)
+
+# Instância única usada por utils/image_generator.py
+templates = TemplateCache(os.path.join(ASSETS_DIR, "imgs"))
+
+# Máscaras são desenhadas 4x maiores e reduzidas: a borda do círculo fica suave (anti-aliasing)
+_MASK_SUPERSAMPLE = 4
+
+@lru_cache(maxsize=64)
+def circle_mask(diameter: int):
+    """Máscara circular 'L' com borda suave, compartilhada por todos os avatares do mesmo diâmetro (não altere)."""
+    big = diameter * _MASK_SUPERSAMPLE
+    mask = Image.new("L", (big, big), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, big - 1, big - 1), fill=255)
+    return mask.resize((diameter, diameter), Image.LANCZOS)
+
+class AvatarSprites:
+    """
+    Avatares já recortados em círculo, no diâmetro de cada lugar onde aparecem (card, pódio, listas).
+    Chave: (sha1 dos bytes do avatar, diâmetro). Um sprite pronto é colado com um único alpha_composite.
+    """
+    def __init__(self, max_items: int):
+        self.max_items = max(1, int(max_items))
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build(avatar_bytes, diameter):
+        with Image.open(BytesIO(avatar_bytes)) as img:
+            sprite = _resize_and_crop_square(img.convert("RGBA"), diameter)
+        # Mantém a transparência do próprio avatar dentro do círculo
+        sprite.putalpha(ImageChops.multiply(sprite.getchannel("A"), circle_mask(diameter)))
+        return sprite
+
+    def get(self, avatar_bytes, diameter: int):
+        """Sprite RGBA circular do avatar (não altere), ou None se os bytes não são uma imagem válida."""
+        key = (hashlib.sha1(avatar_bytes).digest(), diameter)
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self._sprites.move_to_end(key)
+                return sprite
+        try:
+            sprite = self._build(avatar_bytes, diameter)
+        except Exception:
+            return None
+        with self._lock:
+            self._sprites[key] = sprite
+            while len(self._sprites) > self.max_items:
+                self._sprites.popitem(last=False)
+        return sprite
+
+# Instância única usada por utils/image_generator.py
+avatar_sprites = AvatarSprites(AVATAR_SPRITE_CACHE_ITEMS)
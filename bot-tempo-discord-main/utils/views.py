@@ -2,7 +2,7 @@ import discord
 import asyncio
 
 # Importa a função que gera a imagem do ranking
-from .image_generator import gerar_leaderboard_card
+from .image_generator import renderizar_leaderboard
 
 class RankingView(discord.ui.View):
     """
@@ -28,10 +28,8 @@ class RankingView(discord.ui.View):
 
     async def update_message(self, interaction: discord.Interaction):
         """Gera a nova imagem do ranking e atualiza a mensagem original."""
-        loop = asyncio.get_running_loop()
-        # Executa a geração de imagem (que é síncrona e pode bloquear) em um executor
-        # para não travar o bot.
-        buf = await loop.run_in_executor(None, gerar_leaderboard_card, self.rows, self.ctx.guild, self.page)
+        # Baixa os avatares da página em paralelo e desenha a imagem no executor de renderização
+        buf = await renderizar_leaderboard(self.ctx.bot.http_session, self.rows, self.ctx.guild, self.page)
         f = discord.File(fp=buf, filename=f"ranking_pagina_{self.page}.png")
         # Edita a mensagem da interação com a nova imagem e a view atualizada
         await interaction.response.edit_message(attachments=[f], view=self)